@@ -0,0 +1,64 @@
+'''
+Business: Single deployable that serves every forum route through one dispatch table
+Args: event with route in the path (/topics, /api/posts, ...) or ?route=; everything else as the per-function handlers expect
+Returns: the routed handler's response; preflights are answered without loading the route
+'''
+import importlib.util
+import os
+import sys
+import threading
+from typing import Dict, Any, Callable, Optional
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed on its own, the router carries copies of shared and of every route
+# under routes/ (tools/vendor_shared.py); in the source tree it uses its siblings
+VENDORED = os.path.isdir(os.path.join(API_DIR, 'routes'))
+ROUTES_DIR = os.path.join(API_DIR, 'routes') if VENDORED else os.path.join(API_DIR, '..')
+sys.path.insert(0, API_DIR if VENDORED else os.path.join(API_DIR, '..'))
+
+from shared import http
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+_handlers: Dict[str, Handler] = {}
+_load_lock = threading.Lock()
+
+def load_handler(route: str) -> Handler:
+    handler_fn = _handlers.get(route)
+    if handler_fn is not None:
+        return handler_fn
+    with _load_lock:
+        if route not in _handlers:
+            spec = importlib.util.spec_from_file_location(
+                'forum_route_' + route, os.path.join(ROUTES_DIR, route, 'index.py')
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _handlers[route] = module.handler
+        return _handlers[route]
+
+def resolve_route(event: Dict[str, Any]) -> Optional[str]:
+    params = event.get('queryStringParameters') or {}
+    if params.get('route'):
+        return params['route'] if params['route'] in http.ROUTES else None
+    for segment in (event.get('path') or '').split('/'):
+        if segment in http.ROUTES:
+            return segment
+    return None
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    route = resolve_route(event)
+    if route is None:
+        return http.error(404, 'Unknown route')
+    
+    if event.get('httpMethod') == 'OPTIONS':
+        return http.preflight(route)
+    
+    params = event.get('queryStringParameters') or {}
+    if 'route' in params:
+        event = dict(event, queryStringParameters={k: v for k, v in params.items() if k != 'route'})
+    
+    try:
+        return load_handler(route)(event, context)
+    except Exception as e:
+        return http.error(500, str(e))
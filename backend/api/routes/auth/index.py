@@ -0,0 +1,152 @@
+'''
+Business: User authentication and registration
+Args: event with httpMethod POST, body with action (register, login, logout) and credentials
+Returns: HTTP response with user data and session token
+'''
+import json
+import os
+from typing import Dict, Any
+import sys
+
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
+
+from shared import db, encoding, http, passwords, ratelimit, sessions, tracing
+
+@tracing.traced('auth')
+@ratelimit.limited('auth')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return http.preflight('auth')
+    
+    if method != 'POST':
+        return http.error(405, 'Method not allowed')
+    
+    # Password hashing waits for a hashing slot and then burns CPU; no pool
+    # connection is held across it
+    try:
+        body_data = json.loads(event.get('body', '{}'))
+        action = body_data.get('action', 'login')
+        
+        if action == 'register':
+            username = body_data.get('username', '')
+            email = body_data.get('email', '')
+            password = body_data.get('password', '')
+            
+            if not all([username, email, password]):
+                return http.error(400, 'Missing required fields')
+            
+            password_hash = passwords.run_hashing(passwords.hash_password, password)
+            
+            conn = db.get_connection()
+            cur = conn.cursor()
+            cur.execute('''
+                INSERT INTO users (username, email, password_hash)
+                VALUES (%s, %s, %s)
+                RETURNING id, username, email, role, avatar_url, posts_count, created_at
+            ''', (username, email, password_hash))
+            
+            user = cur.fetchone()
+            session_token = sessions.create_session(cur, user['id'])
+            conn.commit()
+            
+            return {
+                'statusCode': 201,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': encoding.dumps({
+                    'user': user,
+                    'token': session_token
+                })
+            }
+        
+        elif action == 'login':
+            email = body_data.get('email', '')
+            password = body_data.get('password', '')
+            
+            if not all([email, password]):
+                return http.error(400, 'Missing email or password')
+            
+            conn = db.get_connection()
+            cur = conn.cursor()
+            cur.execute('''
+                SELECT id, username, email, role, avatar_url, posts_count, created_at, password_hash
+                FROM users
+                WHERE email = %s
+            ''', (email,))
+            
+            user = cur.fetchone()
+            conn.rollback()
+            cur.close()
+            db.release_connection(conn)
+            del cur, conn
+            
+            stored_hash = user.pop('password_hash') if user else None
+            valid, upgraded_hash = passwords.run_hashing(passwords.verify_and_upgrade, password, stored_hash)
+            
+            if not valid:
+                return http.error(401, 'Invalid credentials')
+            
+            conn = db.get_connection()
+            cur = conn.cursor()
+            if upgraded_hash:
+                cur.execute('''
+                    UPDATE users SET password_hash = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                ''', (upgraded_hash, user['id']))
+            
+            session_token = sessions.create_session(cur, user['id'])
+            conn.commit()
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': encoding.dumps({
+                    'user': user,
+                    'token': session_token
+                })
+            }
+        
+        elif action == 'logout':
+            token = sessions.token_from_event(event) or body_data.get('token')
+            
+            if token:
+                conn = db.get_connection()
+                cur = conn.cursor()
+                sessions.revoke(cur, token)
+                conn.commit()
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'ok': True})
+            }
+        
+        else:
+            return http.error(400, 'Invalid action')
+            
+    except passwords.HashingBusy:
+        return http.error(503, 'Server is busy, try again', {'Retry-After': '1'})
+    except Exception as e:
+        if 'conn' in locals():
+            conn.rollback()
+        return http.error(500, str(e))
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            db.release_connection(conn)
@@ -0,0 +1,107 @@
+'''
+Business: Manage forum categories (list, create, update)
+Args: event with httpMethod, body, queryStringParameters
+Returns: HTTP response with forum categories data
+'''
+import json
+import os
+from typing import Dict, Any
+import sys
+
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
+
+from shared import cache, conditional, db, encoding, http, tracing
+
+def list_categories(cur: Any) -> Dict[str, Any]:
+    cur.execute('''
+        SELECT 
+            fc.*,
+            COALESCE(cs.topics_count, 0) as topics_count,
+            COALESCE(cs.total_posts, 0) as total_posts,
+            cs.last_activity_at
+        FROM forum_categories fc
+        LEFT JOIN category_stats cs ON cs.category_id = fc.id
+        ORDER BY fc.sort_order, fc.id
+    ''')
+    categories = cur.fetchall()
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': False,
+        'body': encoding.dumps(categories)
+    }
+
+@tracing.traced('forums')
+@encoding.negotiated
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return http.preflight('forums')
+    
+    try:
+        if method == 'GET':
+            conn = db.get_read_connection(db.read_position(event))
+        else:
+            conn = db.get_connection()
+        cur = conn.cursor()
+        
+        if method == 'GET':
+            response = conditional.conditional_get(
+                event,
+                cur,
+                'forums:list',
+                {},
+                [cache.FORUMS_SCOPE],
+                lambda versions: list_categories(cur)
+            )
+            conn.commit()
+            
+            return response
+        
+        elif method == 'POST':
+            body_data = json.loads(event.get('body', '{}'))
+            name = body_data.get('name', '')
+            description = body_data.get('description', '')
+            icon = body_data.get('icon', 'MessageSquare')
+            gradient = body_data.get('gradient', 'gradient-purple-pink')
+            
+            if not name:
+                return http.error(400, 'Name is required')
+            
+            cur.execute('''
+                INSERT INTO forum_categories (name, description, icon, gradient)
+                VALUES (%s, %s, %s, %s)
+                RETURNING *
+            ''', (name, description, icon, gradient))
+            
+            category = cur.fetchone()
+            cache.invalidate(cur, [cache.FORUMS_SCOPE])
+            conn.commit()
+            
+            return {
+                'statusCode': 201,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': encoding.dumps(category)
+            }
+        
+        else:
+            return http.error(405, 'Method not allowed')
+            
+    except Exception as e:
+        return http.error(500, str(e))
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            db.release_connection(conn)
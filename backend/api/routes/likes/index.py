@@ -0,0 +1,174 @@
+'''
+Business: Toggle likes on posts and look up which posts a user liked
+Args: event with httpMethod POST (body with user_id and post_id) or GET (the session's user; post_ids or topic_id); LIKES_COUNTER_MODE env (sync or deferred)
+Returns: HTTP response with like status or the liked post ids
+'''
+import json
+import os
+from typing import Dict, Any
+import sys
+
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
+
+from shared import cache, db, http, likes, ratelimit, sessions, tracing
+
+LIKES_COUNTER = 'posts.likes_count'
+LIKES_COUNTER_MODE = os.environ.get('LIKES_COUNTER_MODE', 'sync')
+
+TOGGLE_LIKE_CTE = '''
+    WITH removed AS (
+        DELETE FROM likes WHERE user_id = %(user_id)s AND post_id = %(post_id)s
+        RETURNING post_id
+    ),
+    added AS (
+        INSERT INTO likes (user_id, post_id)
+        SELECT %(user_id)s, %(post_id)s
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (user_id, post_id) DO NOTHING
+        RETURNING post_id
+    ),
+    delta AS (
+        SELECT (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed) AS value
+    ),
+'''
+
+TOGGLE_LIKE_SQL = TOGGLE_LIKE_CTE + '''
+    updated AS (
+        UPDATE posts SET likes_count = likes_count + (SELECT value FROM delta)
+        WHERE id = %(post_id)s AND (SELECT value FROM delta) <> 0
+        RETURNING topic_id, likes_count
+    ),
+    bumped AS (
+        INSERT INTO cache_generations (scope, version, updated_at)
+        SELECT scope, 1, CURRENT_TIMESTAMP FROM (
+            SELECT %(scope_prefix)s || topic_id AS scope FROM updated
+            UNION ALL
+            SELECT %(user_scope)s WHERE (SELECT value FROM delta) <> 0
+        ) scopes
+        ON CONFLICT (scope) DO UPDATE SET
+            version = cache_generations.version + 1,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT
+        EXISTS (SELECT 1 FROM removed) AS unliked,
+        COALESCE(
+            (SELECT likes_count FROM updated),
+            (SELECT likes_count FROM posts WHERE id = %(post_id)s),
+            0
+        ) AS likes_count
+'''
+
+TOGGLE_LIKE_DEFERRED_SQL = TOGGLE_LIKE_CTE + '''
+    staged AS (
+        INSERT INTO counter_deltas (counter, entity_id, delta)
+        SELECT %(counter)s, %(post_id)s, value FROM delta WHERE value <> 0
+    ),
+    bumped AS (
+        INSERT INTO cache_generations (scope, version, updated_at)
+        SELECT %(user_scope)s, 1, CURRENT_TIMESTAMP WHERE (SELECT value FROM delta) <> 0
+        ON CONFLICT (scope) DO UPDATE SET
+            version = cache_generations.version + 1,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT
+        EXISTS (SELECT 1 FROM removed) AS unliked,
+        COALESCE((SELECT likes_count FROM posts WHERE id = %(post_id)s), 0)
+        + COALESCE((
+            SELECT SUM(delta) FROM counter_deltas
+            WHERE counter = %(counter)s AND entity_id = %(post_id)s
+        ), 0)
+        + (SELECT value FROM delta) AS likes_count
+'''
+
+@tracing.traced('likes')
+@ratelimit.limited('likes')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return http.preflight('likes')
+    
+    if method not in ('GET', 'POST'):
+        return http.error(405, 'Method not allowed')
+    
+    try:
+        conn = db.get_connection()
+        cur = conn.cursor()
+        
+        if method == 'GET':
+            params = event.get('queryStringParameters', {}) or {}
+            user_id, auth_error = sessions.authenticate(cur, event, params.get('user_id'))
+            topic_id = params.get('topic_id')
+            
+            if auth_error or not user_id:
+                return http.error(401, auth_error or 'Authentication required')
+            if params.get('user_id') and str(params['user_id']) != str(user_id):
+                return http.error(403, 'user_id does not match the session')
+            
+            try:
+                post_ids = likes.parse_post_ids(params.get('post_ids'))
+            except ValueError:
+                return http.error(400, 'Invalid post_ids')
+            
+            if not (post_ids or topic_id):
+                return http.error(400, 'Missing post_ids or topic_id')
+            
+            liked = likes.liked_post_ids(cur, user_id, post_ids=post_ids, topic_id=topic_id)
+            conn.commit()
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'liked': liked})
+            }
+        
+        body_data = json.loads(event.get('body', '{}'))
+        post_id = body_data.get('post_id')
+        user_id, auth_error = sessions.authenticate(cur, event, body_data.get('user_id'))
+        
+        if auth_error:
+            return http.error(401, auth_error)
+        
+        if not all([user_id, post_id]):
+            return http.error(400, 'Missing user_id or post_id')
+        
+        cur.execute(TOGGLE_LIKE_DEFERRED_SQL if LIKES_COUNTER_MODE == 'deferred' else TOGGLE_LIKE_SQL, {
+            'user_id': user_id,
+            'post_id': post_id,
+            'counter': LIKES_COUNTER,
+            'scope_prefix': cache.TOPIC_SCOPE_PREFIX,
+            'user_scope': cache.user_likes_scopes(user_id)[0]
+        })
+        
+        result = cur.fetchone()
+        action = 'unliked' if result['unliked'] else 'liked'
+        conn.commit()
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'isBase64Encoded': False,
+            'body': json.dumps({
+                'action': action,
+                'likes_count': result['likes_count']
+            })
+        }
+        
+    except Exception as e:
+        if 'conn' in locals():
+            conn.rollback()
+        return http.error(500, str(e))
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            db.release_connection(conn)
@@ -0,0 +1,114 @@
+'''
+Business: Scheduled maintenance jobs (apply buffered counters, rebuild aggregates, check counter drift, backfill search, expire rate-limit buckets, score hot topics)
+Args: timer trigger event with job names as payload, or HTTP POST with body {"jobs": [...]}
+Returns: HTTP response with per-job results
+'''
+import hmac
+import json
+import os
+from typing import Dict, Any, Callable, List
+import sys
+
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
+
+from shared import bulk, category_stats, counters, db, encoding, http, ratelimit, sessions, tracing, trending, views
+
+JOBS: Dict[str, Callable[[Any], Any]] = {
+    'flush_views': views.apply_staged_views,
+    'rebuild_category_stats': category_stats.rebuild,
+    'apply_counter_deltas': counters.apply_deltas,
+    'expire_sessions': sessions.expire_sessions,
+    'check_counters': counters.check_consistency,
+    'repair_counters': counters.repair_consistency,
+    'backfill_search_vectors': bulk.backfill_search_vectors,
+    'expire_rate_limits': ratelimit.expire_buckets,
+    'refresh_topic_scores': trending.refresh,
+    'rebuild_topic_scores': trending.rebuild,
+}
+
+# Full-table rebuilds and consistency checks only run when asked for by name
+DEFAULT_JOBS = [
+    'flush_views', 'apply_counter_deltas', 'expire_sessions', 'backfill_search_vectors',
+    'expire_rate_limits', 'refresh_topic_scores',
+]
+
+def get_requested_jobs(event: Dict[str, Any]) -> List[str]:
+    names: List[str] = []
+    for message in event.get('messages') or []:
+        payload = (message.get('details') or {}).get('payload') or ''
+        names.extend(n.strip() for n in payload.split(',') if n.strip())
+    
+    if event.get('httpMethod'):
+        params = event.get('queryStringParameters') or {}
+        if params.get('job'):
+            names.append(params['job'])
+        body_data = json.loads(event.get('body') or '{}')
+        names.extend(body_data.get('jobs', []))
+        if body_data.get('job'):
+            names.append(body_data['job'])
+    
+    return names or list(DEFAULT_JOBS)
+
+@tracing.traced('maintenance')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', '')
+    
+    if method == 'OPTIONS':
+        return http.preflight('maintenance')
+    
+    if method and method != 'POST':
+        return http.error(405, 'Method not allowed')
+    
+    # Timer triggers carry no httpMethod; HTTP callers (directly or through
+    # the api router) need the token, and without one configured nobody gets in
+    if method:
+        token = os.environ.get('MAINTENANCE_TOKEN', '')
+        headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        supplied = headers.get('x-maintenance-token', '')
+        if not token or not hmac.compare_digest(supplied.encode(), token.encode()):
+            return http.error(403, 'Forbidden')
+    
+    try:
+        job_names = get_requested_jobs(event)
+    except (ValueError, AttributeError, TypeError):
+        return http.error(400, 'Invalid job list')
+    
+    unknown = [name for name in job_names if name not in JOBS]
+    if unknown:
+        return http.error(400, 'Unknown jobs: ' + ', '.join(unknown))
+    
+    results: Dict[str, Any] = {}
+    failed = False
+    
+    try:
+        conn = db.get_connection()
+        cur = conn.cursor()
+        
+        for name in job_names:
+            try:
+                results[name] = {'ok': True, 'result': JOBS[name](cur)}
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                results[name] = {'ok': False, 'error': str(e)}
+                failed = True
+        
+        return {
+            'statusCode': 500 if failed else 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'isBase64Encoded': False,
+            'body': encoding.dumps(results)
+        }
+        
+    except Exception as e:
+        return http.error(500, str(e))
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            db.release_connection(conn)
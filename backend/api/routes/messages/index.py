@@ -0,0 +1,288 @@
+'''
+Business: Private messages: inbox, outbox and per-pair conversations with unread counts, sending, mark-as-read
+Args: event with httpMethod GET (?box=inbox|outbox|unread, ?with_user_id= for a conversation, ?id= for one message; cursor, limit), POST (to_user_id, subject, content) or PUT (ids, with_user_id or all); caller from the session token
+Returns: HTTP response with a page of messages (X-Next-Cursor, X-Unread-Count), one message, the unread count or mark-as-read result
+'''
+import json
+import os
+from typing import Dict, Any, List, Optional
+import sys
+
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
+
+from shared import db, encoding, http, pagination, ratelimit, sessions, tracing
+
+MESSAGES_PAGE_SIZE = 20
+MESSAGES_PAGE_SIZE_MAX = 100
+PREVIEW_CHARS = 200
+SUBJECT_MAX_CHARS = 255
+
+BOX_FILTERS = {
+    'inbox': 'm.to_user_id = %(user_id)s',
+    'outbox': 'm.from_user_id = %(user_id)s',
+    'conversation': '''
+        m.pair_low = LEAST(%(user_id)s, %(with_user_id)s)
+        AND m.pair_high = GREATEST(%(user_id)s, %(with_user_id)s)
+    ''',
+}
+
+# Display fields of both participants, joined straight into each message
+# query: a page names at most a handful of users, so the author cache would
+# only add a generation read and a lookup of its own
+PARTICIPANT_COLUMNS = '''
+    fu.username AS author_name, fu.avatar_url AS author_avatar, fu.role AS author_role,
+    tu.username AS recipient_name, tu.avatar_url AS recipient_avatar, tu.role AS recipient_role
+'''
+
+PARTICIPANT_JOINS = '''
+    LEFT JOIN users fu ON fu.id = {alias}.from_user_id
+    LEFT JOIN users tu ON tu.id = {alias}.to_user_id
+'''
+
+# The unread counter and the page come back in one statement: the counter row
+# drives the query and the page is joined laterally, so an empty page still
+# reports the count.
+LIST_MESSAGES_SQL = '''
+    SELECT c.unread_count, page.*, ''' + PARTICIPANT_COLUMNS + '''
+    FROM (
+        SELECT COALESCE(
+            (SELECT unread FROM message_unread_counts WHERE user_id = %(user_id)s), 0
+        ) AS unread_count
+    ) c
+    LEFT JOIN LATERAL (
+        SELECT
+            m.id, m.from_user_id, m.to_user_id, m.subject,
+            left(m.content, %(preview_chars)s) AS preview,
+            m.is_read, m.created_at
+        FROM messages m
+        WHERE {filter} {keyset}
+        ORDER BY m.created_at DESC, m.id DESC
+        LIMIT %(limit)s
+    ) page ON TRUE
+''' + PARTICIPANT_JOINS.format(alias='page') + '''
+    ORDER BY page.created_at DESC, page.id DESC
+'''
+
+GET_MESSAGE_SQL = '''
+    SELECT m.id, m.from_user_id, m.to_user_id, m.subject, m.content, m.is_read, m.created_at,
+        ''' + PARTICIPANT_COLUMNS + '''
+    FROM messages m
+''' + PARTICIPANT_JOINS.format(alias='m') + '''
+    WHERE m.id = %s AND (m.from_user_id = %s OR m.to_user_id = %s)
+'''
+
+MARK_READ_FILTERS = {
+    'ids': 'id = ANY(%(ids)s)',
+    'with_user_id': 'from_user_id = %(with_user_id)s',
+    'all': 'TRUE',
+}
+
+# One UPDATE whatever the number of messages; the statement-level trigger
+# folds it into message_unread_counts. The counter read here is the
+# pre-statement value, hence the subtraction.
+MARK_READ_SQL = '''
+    WITH marked AS (
+        UPDATE messages SET is_read = TRUE
+        WHERE to_user_id = %(user_id)s AND NOT is_read AND {filter}
+        RETURNING id
+    )
+    SELECT
+        COUNT(*) AS marked,
+        COALESCE((SELECT unread FROM message_unread_counts WHERE user_id = %(user_id)s), 0) - COUNT(*) AS unread_count
+    FROM marked
+'''
+
+SEND_MESSAGE_SQL = '''
+    WITH sent AS (
+        INSERT INTO messages (from_user_id, to_user_id, subject, content)
+        SELECT %(user_id)s, %(to_user_id)s, %(subject)s, %(content)s
+        WHERE EXISTS (SELECT 1 FROM users WHERE id = %(to_user_id)s)
+        RETURNING id, from_user_id, to_user_id, subject, content, is_read, created_at
+    )
+    SELECT sent.*, ''' + PARTICIPANT_COLUMNS + '''
+    FROM sent
+''' + PARTICIPANT_JOINS.format(alias='sent')
+
+def parse_user_id(value: Any) -> Optional[int]:
+    try:
+        user_id = int(value)
+    except (TypeError, ValueError):
+        return None
+    return user_id if user_id > 0 else None
+
+def list_messages(
+    cur: Any,
+    user_id: int,
+    box: str,
+    with_user_id: Optional[int],
+    cursor: Optional[List[Any]],
+    limit: int,
+) -> Dict[str, Any]:
+    keyset = 'AND (m.created_at, m.id) < (%(cursor_at)s, %(cursor_id)s)' if cursor else ''
+    cur.execute(LIST_MESSAGES_SQL.format(filter=BOX_FILTERS[box], keyset=keyset), {
+        'user_id': user_id,
+        'with_user_id': with_user_id,
+        'cursor_at': cursor[0] if cursor else None,
+        'cursor_id': cursor[1] if cursor else None,
+        'preview_chars': PREVIEW_CHARS,
+        'limit': limit + 1,
+    })
+    rows = cur.fetchall()
+    unread_count = rows[0]['unread_count']
+    page = [{k: v for k, v in row.items() if k != 'unread_count'} for row in rows if row['id'] is not None]
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor, X-Unread-Count',
+        'X-Unread-Count': str(unread_count)
+    }
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        headers['X-Next-Cursor'] = pagination.encode_cursor([last['created_at'], last['id']])
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'isBase64Encoded': False,
+        'body': encoding.dumps(page)
+    }
+
+def json_response(status: int, data: Any) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': False,
+        'body': encoding.dumps(data)
+    }
+
+@tracing.traced('messages')
+@ratelimit.limited('messages')
+@encoding.negotiated
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return http.preflight('messages')
+    
+    if method not in ('GET', 'POST', 'PUT'):
+        return http.error(405, 'Method not allowed')
+    
+    try:
+        conn = db.get_connection()
+        cur = conn.cursor()
+        params = event.get('queryStringParameters', {}) or {}
+        body_data = json.loads(event.get('body') or '{}') if method != 'GET' else {}
+        
+        claimed_user_id = params.get('user_id') if method == 'GET' else body_data.get('user_id')
+        user_id, auth_error = sessions.authenticate(cur, event, claimed_user_id)
+        if auth_error:
+            return http.error(401, auth_error)
+        user_id = parse_user_id(user_id)
+        if user_id is None:
+            return http.error(401, 'Authentication required')
+        
+        if method == 'GET':
+            if params.get('id'):
+                message_id = parse_user_id(params['id'])
+                cur.execute(GET_MESSAGE_SQL, (message_id, user_id, user_id))
+                message = cur.fetchone()
+                conn.commit()
+                if message is None:
+                    return http.error(404, 'Message not found')
+                return json_response(200, message)
+            
+            box = params.get('box', 'inbox')
+            if box == 'unread':
+                cur.execute('SELECT unread FROM message_unread_counts WHERE user_id = %s', (user_id,))
+                row = cur.fetchone()
+                conn.commit()
+                return json_response(200, {'unread_count': row['unread'] if row else 0})
+            
+            with_user_id = None
+            if params.get('with_user_id'):
+                with_user_id = parse_user_id(params['with_user_id'])
+                if with_user_id is None:
+                    return http.error(400, 'Invalid with_user_id')
+                box = 'conversation'
+            if box not in BOX_FILTERS or box == 'conversation' and with_user_id is None:
+                return http.error(400, 'box must be inbox, outbox or unread')
+            
+            try:
+                cursor = pagination.decode_cursor(
+                    params['cursor'], 2, (pagination.TIMESTAMP, pagination.INT)
+                ) if params.get('cursor') else None
+            except pagination.InvalidCursor:
+                return http.error(400, 'Invalid cursor')
+            limit = pagination.parse_limit(params.get('limit'), MESSAGES_PAGE_SIZE, MESSAGES_PAGE_SIZE_MAX)
+            
+            response = list_messages(cur, user_id, box, with_user_id, cursor, limit)
+            conn.commit()
+            return response
+        
+        elif method == 'POST':
+            to_user_id = parse_user_id(body_data.get('to_user_id'))
+            subject = (body_data.get('subject') or '').strip()
+            content = (body_data.get('content') or '').strip()
+            
+            if to_user_id is None or not content:
+                return http.error(400, 'Missing to_user_id or content')
+            if to_user_id == user_id:
+                return http.error(400, 'Cannot send a message to yourself')
+            if len(subject) > SUBJECT_MAX_CHARS:
+                return http.error(400, 'Subject is too long')
+            
+            cur.execute(SEND_MESSAGE_SQL, {
+                'user_id': user_id,
+                'to_user_id': to_user_id,
+                'subject': subject or None,
+                'content': content
+            })
+            message = cur.fetchone()
+            if message is None:
+                conn.rollback()
+                return http.error(404, 'Recipient not found')
+            conn.commit()
+            
+            return json_response(201, message)
+        
+        else:
+            if body_data.get('ids'):
+                ids = [parse_user_id(i) for i in body_data['ids']] if isinstance(body_data['ids'], list) else [None]
+                if None in ids:
+                    return http.error(400, 'Invalid ids')
+                selector = 'ids'
+            elif body_data.get('with_user_id'):
+                ids = []
+                selector = 'with_user_id'
+            elif body_data.get('all') is True:
+                ids = []
+                selector = 'all'
+            else:
+                return http.error(400, 'Specify ids, with_user_id or all')
+            
+            cur.execute(MARK_READ_SQL.format(filter=MARK_READ_FILTERS[selector]), {
+                'user_id': user_id,
+                'ids': ids,
+                'with_user_id': parse_user_id(body_data.get('with_user_id'))
+            })
+            result = cur.fetchone()
+            conn.commit()
+            
+            return json_response(200, {'marked': result['marked'], 'unread_count': result['unread_count']})
+            
+    except Exception as e:
+        if 'conn' in locals():
+            conn.rollback()
+        return http.error(500, str(e))
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            db.release_connection(conn)
@@ -0,0 +1,127 @@
+'''
+Business: Manage posts and replies in topics
+Args: event with httpMethod, body for creating posts; POST_COUNTERS_MODE env (sync or deferred)
+Returns: HTTP response with post data
+'''
+import json
+import os
+from typing import Dict, Any
+import sys
+
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
+
+from shared import authors, cache, counters, db, encoding, http, ratelimit, sessions, tracing
+
+INSERT_POST_SQL = '''
+    INSERT INTO posts (topic_id, user_id, content)
+    VALUES (%(topic_id)s, %(user_id)s, %(content)s)
+    RETURNING id, topic_id, user_id, content, likes_count, created_at, updated_at
+'''
+
+INSERT_POST_DEFERRED_SQL = '''
+    WITH post AS (''' + INSERT_POST_SQL + '''),
+    staged AS (
+        INSERT INTO counter_deltas (counter, entity_id, delta)
+        SELECT 'topics.replies_count', topic_id, 1 FROM post
+        UNION ALL
+        SELECT 'users.posts_count', user_id, 1 FROM post
+    )
+    SELECT * FROM post
+'''
+
+@tracing.traced('posts')
+@ratelimit.limited('posts')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return http.preflight('posts')
+    
+    try:
+        conn = db.get_connection()
+        cur = conn.cursor()
+        
+        if method == 'POST':
+            body_data = json.loads(event.get('body', '{}'))
+            topic_id = body_data.get('topic_id')
+            content = body_data.get('content', '')
+            attachments = body_data.get('attachments', [])
+            user_id, auth_error = sessions.authenticate(cur, event, body_data.get('user_id'))
+            
+            if auth_error:
+                return http.error(401, auth_error)
+            
+            if not all([topic_id, user_id, content]):
+                return http.error(400, 'Missing required fields')
+            
+            post_params = {'topic_id': topic_id, 'user_id': user_id, 'content': content}
+            if counters.post_counters_deferred():
+                cur.execute(counters.DEFER_TRIGGERS_SQL + INSERT_POST_DEFERRED_SQL, post_params)
+                post = cur.fetchone()
+            else:
+                cur.execute(INSERT_POST_SQL, post_params)
+                post = cur.fetchone()
+            post_id = post['id']
+            
+            saved_attachments = []
+            if attachments:
+                saved_attachments = db.execute_values(cur, '''
+                    INSERT INTO attachments (post_id, file_url, file_type, file_name, file_size)
+                    VALUES %s
+                    RETURNING id, file_url, file_type, file_name, file_size
+                ''', [
+                    (post_id, att.get('url'), att.get('type'), att.get('name'), att.get('size'))
+                    for att in attachments
+                ], fetch=True)
+            
+            if not counters.post_counters_deferred():
+                cur.execute('''
+                    UPDATE topics 
+                    SET replies_count = replies_count + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    RETURNING category_id
+                ''', (topic_id,))
+                topic = cur.fetchone()
+                category_id = topic['category_id'] if topic else None
+                
+                cur.execute('''
+                    UPDATE users SET posts_count = posts_count + 1
+                    WHERE id = %s
+                ''', (user_id,))
+            
+            conn.commit()
+            if counters.post_counters_deferred():
+                # Lists only change (replies_count, updated_at) when the staged
+                # deltas are applied, and apply_counter_deltas bumps them then
+                cache.invalidate_committed(conn, cache.topic_view_scopes(topic_id))
+            else:
+                cache.invalidate_committed(conn, cache.topic_write_scopes(topic_id, category_id))
+            authors.forget(user_id)
+            
+            headers = {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            }
+            headers.update(db.write_position(conn))
+            
+            return {
+                'statusCode': 201,
+                'headers': headers,
+                'isBase64Encoded': False,
+                'body': encoding.dumps(dict(post, attachments=saved_attachments))
+            }
+        
+        else:
+            return http.error(405, 'Method not allowed')
+            
+    except Exception as e:
+        if 'conn' in locals():
+            conn.rollback()
+        return http.error(500, str(e))
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            db.release_connection(conn)
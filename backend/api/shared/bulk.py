@@ -0,0 +1,241 @@
+'''
+Business: Bulk import/export of forum data with COPY, deferring triggers, indexes and counters to set-based passes
+Args: cursor inside a transaction; CSV streams (with header row) per table
+Returns: rows copied per table, and the index/constraint definitions deferred during a load
+'''
+import csv
+import io
+import os
+import time
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from shared import cache, category_stats, counters, trending
+
+CHUNK_BYTES = 8 * 1024 * 1024
+BACKFILL_BATCH_SIZE = int(os.environ.get('SEARCH_BACKFILL_BATCH_SIZE', '20000'))
+
+# Import order (parents first). Derived columns - counters, search vectors,
+# change txids - are not transferred: they are recomputed after a load.
+TABLES: Dict[str, List[str]] = {
+    'users': ['id', 'username', 'email', 'password_hash', 'avatar_url', 'role', 'created_at', 'updated_at'],
+    'forum_categories': ['id', 'name', 'description', 'icon', 'gradient', 'sort_order', 'created_at'],
+    'topics': [
+        'id', 'category_id', 'user_id', 'title', 'content', 'is_pinned', 'is_locked', 'views_count',
+        'created_at', 'updated_at',
+    ],
+    'posts': ['id', 'topic_id', 'user_id', 'content', 'created_at', 'updated_at'],
+    'likes': ['id', 'user_id', 'post_id', 'created_at'],
+    'attachments': ['id', 'post_id', 'file_url', 'file_type', 'file_name', 'file_size', 'created_at'],
+}
+
+# Rows in these tables are referenced by id from other files
+REQUIRED_ID = {'users', 'forum_categories', 'topics', 'posts'}
+
+# Aggregating triggers replaced by set-based passes after the load. The
+# search vector triggers stay on by default: they only look at the row
+# itself. Imported posts keep change txid 0, i.e. "before any since cursor".
+DEFERRED_TRIGGERS: List[Tuple[str, str]] = [
+    ('topics', 'trg_category_stats_topics'),
+    ('posts', 'trg_category_stats_posts'),
+    ('posts', 'trg_posts_change_stamp'),
+]
+
+# Optionally deferred too: to_tsvector dominates post load time, and
+# backfill_search_vectors() can fill the vectors in batches afterwards.
+SEARCH_TRIGGERS: List[Tuple[str, str]] = [
+    ('topics', 'trg_topics_search_vector'),
+    ('posts', 'trg_posts_search_vector'),
+]
+
+
+class TableResult(NamedTuple):
+    table: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class Deferred(NamedTuple):
+    indexes: List[str]
+    foreign_keys: List[Tuple[str, str, str]]
+    triggers: List[Tuple[str, str]]
+
+
+def export_table(cur: Any, table: str, out: BinaryIO) -> int:
+    cur.copy_expert(
+        'COPY (SELECT {columns} FROM {table} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)'.format(
+            columns=', '.join(TABLES[table]), table=table,
+        ),
+        out,
+    )
+    return cur.rowcount
+
+
+def read_header(stream: BinaryIO, table: str) -> List[str]:
+    columns = next(csv.reader([stream.readline().decode('utf-8')]), [])
+    unknown = [c for c in columns if c not in TABLES[table]]
+    if not columns or unknown:
+        raise ValueError('%s: unexpected columns %s' % (table, unknown or '(empty header)'))
+    if table in REQUIRED_ID and 'id' not in columns:
+        raise ValueError('%s: an id column is required' % table)
+    return columns
+
+
+def record_chunks(stream: BinaryIO, chunk_bytes: int = CHUNK_BYTES) -> Iterator[bytes]:
+    '''
+    Splits a CSV stream into blocks of whole records. A newline ends a record
+    only when it is outside quotes, i.e. after an even number of quote chars.
+    '''
+    pending = b''
+    while True:
+        block = stream.read(chunk_bytes)
+        if not block:
+            break
+        pending += block
+        end = len(pending)
+        while True:
+            end = pending.rfind(b'\n', 0, end)
+            if end < 0 or pending.count(b'"', 0, end) % 2 == 0:
+                break
+        if end >= 0:
+            yield pending[:end + 1]
+            pending = pending[end + 1:]
+    if pending.strip():
+        yield pending
+
+
+def import_table(
+    cur: Any,
+    table: str,
+    stream: BinaryIO,
+    chunk_bytes: int = CHUNK_BYTES,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> int:
+    columns = read_header(stream, table)
+    statement = 'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)'.format(
+        table=table, columns=', '.join(columns),
+    )
+    copied = 0
+    for chunk in record_chunks(stream, chunk_bytes):
+        cur.copy_expert(statement, io.BytesIO(chunk))
+        copied += cur.rowcount
+        if progress:
+            progress(table, copied)
+    return copied
+
+
+def ensure_empty(cur: Any, tables: List[str]) -> None:
+    for table in tables:
+        cur.execute('SELECT EXISTS (SELECT 1 FROM {table}) AS has_rows'.format(table=table))
+        if cur.fetchone()['has_rows']:
+            raise ValueError('%s already has rows: bulk import only loads into empty tables' % table)
+
+
+def defer_maintenance(cur: Any, tables: List[str], defer_search: bool = False) -> Deferred:
+    '''
+    Drops secondary indexes and foreign keys on the target tables and turns
+    off the aggregating (and optionally search vector) triggers;
+    restore_maintenance() brings them back. Constraint-backed indexes
+    (primary keys, unique) stay.
+    '''
+    cur.execute('''
+        SELECT i.indexrelid::regclass::text AS name, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        WHERE c.relname = ANY(%s)
+          AND c.relnamespace = 'public'::regnamespace
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint con WHERE con.conindid = i.indexrelid AND con.conrelid = c.oid)
+    ''', (tables,))
+    indexes = cur.fetchall()
+    cur.execute('''
+        SELECT con.conrelid::regclass::text AS table_name, con.conname AS name,
+               pg_get_constraintdef(con.oid) AS definition
+        FROM pg_constraint con
+        JOIN pg_class c ON c.oid = con.conrelid
+        WHERE con.contype = 'f' AND c.relname = ANY(%s) AND c.relnamespace = 'public'::regnamespace
+    ''', (tables,))
+    foreign_keys = cur.fetchall()
+
+    for fk in foreign_keys:
+        cur.execute('ALTER TABLE {table} DROP CONSTRAINT {name}'.format(table=fk['table_name'], name=fk['name']))
+    for index in indexes:
+        cur.execute('DROP INDEX {name}'.format(name=index['name']))
+    candidates = DEFERRED_TRIGGERS + (SEARCH_TRIGGERS if defer_search else [])
+    triggers = [(table, trigger) for table, trigger in candidates if table in tables]
+    for table, trigger in triggers:
+        cur.execute('ALTER TABLE {table} DISABLE TRIGGER {trigger}'.format(table=table, trigger=trigger))
+
+    return Deferred(
+        [index['definition'] for index in indexes],
+        [(fk['table_name'], fk['name'], fk['definition']) for fk in foreign_keys],
+        triggers,
+    )
+
+
+def restore_maintenance(cur: Any, deferred: Deferred) -> Dict[str, float]:
+    '''
+    Rebuilds indexes, then re-adds (and validates) foreign keys, each in one
+    pass per object. Run finish_import() first: its counter UPDATEs are much
+    cheaper without the indexes and triggers.
+    '''
+    timings: Dict[str, float] = {}
+    for table, trigger in deferred.triggers:
+        cur.execute('ALTER TABLE {table} ENABLE TRIGGER {trigger}'.format(table=table, trigger=trigger))
+
+    started = time.perf_counter()
+    for definition in deferred.indexes:
+        cur.execute(definition)
+    timings['indexes'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for table, name, definition in deferred.foreign_keys:
+        cur.execute('ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'.format(
+            table=table, name=name, definition=definition,
+        ))
+    timings['foreign_keys'] = time.perf_counter() - started
+    return timings
+
+
+def finish_import(cur: Any, tables: List[str]) -> Dict[str, float]:
+    '''Moves id sequences past the imported ids and recomputes derived data set-based'''
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    for table in tables:
+        cur.execute('''
+            SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table}
+        '''.format(table=table), (table,))
+    timings['sequences'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    counters.recompute(cur)
+    timings['counters'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    category_stats.rebuild(cur)
+    cache.invalidate(cur, [cache.FORUMS_SCOPE, cache.AUTHORS_SCOPE])
+    timings['category_stats'] = time.perf_counter() - started
+
+    # Imported history predates the incremental watermark
+    started = time.perf_counter()
+    trending.rebuild(cur)
+    timings['topic_scores'] = time.perf_counter() - started
+    return timings
+
+
+def backfill_search_vectors(cur: Any, batch_size: int = BACKFILL_BATCH_SIZE) -> Dict[str, int]:
+    '''
+    Fills search vectors left empty by an import with deferred search
+    triggers. Rewriting the text column fires the regular trigger, so the
+    vector definition lives only in the migration.
+    '''
+    filled: Dict[str, int] = {}
+    for table, column in (('topics', 'title'), ('posts', 'content')):
+        cur.execute('''
+            UPDATE {table} SET {column} = {column}
+            WHERE id IN (SELECT id FROM {table} WHERE search_vector IS NULL ORDER BY id LIMIT %s)
+        '''.format(table=table, column=column), (batch_size,))
+        filled[table] = cur.rowcount
+    return filled
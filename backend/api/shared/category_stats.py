@@ -0,0 +1,44 @@
+'''
+Business: Rebuild materialized per-category counters from topics and posts
+Args: cursor inside a transaction (used by the maintenance function)
+Returns: number of category_stats rows written
+'''
+from typing import Any
+
+from shared import cache
+
+
+def rebuild(cur: Any) -> int:
+    '''
+    Sets every category's counts from topics and posts. Deltas staged in
+    deferred mode are dropped in the same statement, so under its single
+    snapshot each write is counted exactly once. Writes that commit while it
+    runs are overwritten: run it on demand, not on a schedule.
+    '''
+    cur.execute('''
+        WITH dropped AS (
+            DELETE FROM counter_deltas
+            WHERE counter IN ('category_stats.topics_count', 'category_stats.total_posts')
+        )
+        INSERT INTO category_stats (category_id, topics_count, total_posts, last_activity_at)
+        SELECT
+            fc.id,
+            COUNT(t.id),
+            COALESCE(SUM(pc.posts), 0),
+            GREATEST(MAX(t.created_at), MAX(pc.last_post_at))
+        FROM forum_categories fc
+        LEFT JOIN topics t ON t.category_id = fc.id
+        LEFT JOIN (
+            SELECT topic_id, COUNT(*) AS posts, MAX(created_at) AS last_post_at
+            FROM posts
+            GROUP BY topic_id
+        ) pc ON pc.topic_id = t.id
+        GROUP BY fc.id
+        ON CONFLICT (category_id) DO UPDATE SET
+            topics_count = EXCLUDED.topics_count,
+            total_posts = EXCLUDED.total_posts,
+            last_activity_at = EXCLUDED.last_activity_at
+    ''')
+    rebuilt = cur.rowcount
+    cache.invalidate(cur, [cache.FORUMS_SCOPE])
+    return rebuilt
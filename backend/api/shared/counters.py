@@ -0,0 +1,203 @@
+'''
+Business: Deferred counter deltas folded into denormalized counters in bulk, plus drift checks
+Args: cursor inside a transaction; deltas staged in counter_deltas by write paths; POST_COUNTERS_MODE env
+Returns: number of target rows updated per counter, or drift found (and repaired) per counter
+'''
+import os
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from shared import cache
+
+POST_COUNTERS_MODE = os.environ.get('POST_COUNTERS_MODE', 'sync')
+DRIFT_SAMPLE_SIZE = 20
+
+
+class Counter(NamedTuple):
+    table: str
+    column: str
+    touch_column: Optional[str]
+    scope_columns: str
+    scopes_for: Callable[[Dict[str, Any]], List[str]]
+    source: str
+    key_column: str = 'id'
+
+
+COUNTERS: Dict[str, Counter] = {
+    'posts.likes_count': Counter(
+        'posts', 'likes_count', None, 't.topic_id',
+        lambda row: cache.topic_view_scopes(row['topic_id']),
+        'SELECT post_id AS entity_id, COUNT(*) AS value FROM likes GROUP BY post_id',
+    ),
+    'topics.replies_count': Counter(
+        'topics', 'replies_count', 'updated_at', 't.id, t.category_id',
+        lambda row: cache.topic_write_scopes(row['id'], row['category_id']),
+        'SELECT topic_id AS entity_id, COUNT(*) AS value FROM posts GROUP BY topic_id',
+    ),
+    'users.posts_count': Counter(
+        'users', 'posts_count', None, 't.id',
+        lambda row: [],
+        '''
+            SELECT user_id AS entity_id, COUNT(*) AS value FROM (
+                SELECT user_id FROM topics
+                UNION ALL
+                SELECT user_id FROM posts
+            ) authored
+            GROUP BY user_id
+        ''',
+    ),
+    # Staged by the category_stats trigger in deferred mode (V0019)
+    'category_stats.topics_count': Counter(
+        'category_stats', 'topics_count', 'last_activity_at', 't.category_id',
+        lambda row: [cache.FORUMS_SCOPE],
+        'SELECT category_id AS entity_id, COUNT(*) AS value FROM topics GROUP BY category_id',
+        'category_id',
+    ),
+    'category_stats.total_posts': Counter(
+        'category_stats', 'total_posts', 'last_activity_at', 't.category_id',
+        lambda row: [cache.FORUMS_SCOPE],
+        '''
+            SELECT t.category_id AS entity_id, COUNT(*) AS value
+            FROM posts p JOIN topics t ON t.id = p.topic_id
+            GROUP BY t.category_id
+        ''',
+        'category_id',
+    ),
+}
+
+# Prefixed to a deferred-mode write, in the same round trip: the category_stats
+# trigger then stages its increments instead of updating the category's row.
+DEFER_TRIGGERS_SQL = "SET LOCAL forum.counters_mode = 'deferred';"
+
+
+def post_counters_deferred() -> bool:
+    return POST_COUNTERS_MODE == 'deferred'
+
+
+def stage(cur: Any, counter: str, entity_id: Any, delta: int = 1) -> None:
+    cur.execute('''
+        INSERT INTO counter_deltas (counter, entity_id, delta)
+        VALUES (%s, %s, %s)
+    ''', (counter, entity_id, delta))
+
+
+def apply_deltas(cur: Any) -> Dict[str, int]:
+    applied: Dict[str, int] = {}
+    for name, counter in COUNTERS.items():
+        touch = ''
+        if counter.touch_column:
+            touch = ', {col} = GREATEST(t.{col}, totals.touched_at)'.format(col=counter.touch_column)
+        cur.execute('''
+            WITH drained AS (
+                DELETE FROM counter_deltas
+                WHERE counter = %s
+                RETURNING entity_id, delta, created_at
+            ),
+            totals AS (
+                SELECT entity_id, SUM(delta) AS delta, MAX(created_at) AS touched_at
+                FROM drained
+                GROUP BY entity_id
+                HAVING SUM(delta) <> 0
+            )
+            UPDATE {table} t
+            SET {column} = t.{column} + totals.delta{touch}
+            FROM totals
+            WHERE t.{key} = totals.entity_id
+            RETURNING {scope_columns}
+        '''.format(
+            table=counter.table,
+            column=counter.column,
+            touch=touch,
+            key=counter.key_column,
+            scope_columns=counter.scope_columns,
+        ), (name,))
+        rows = cur.fetchall()
+        scopes: List[str] = []
+        for row in rows:
+            scopes += counter.scopes_for(row)
+        cache.invalidate(cur, scopes)
+        applied[name] = len(rows)
+    return applied
+
+
+def check_consistency(cur: Any, repair: bool = False) -> Dict[str, Any]:
+    report: Dict[str, Any] = {}
+    for name, counter in COUNTERS.items():
+        drift_query = '''
+            WITH truth AS ({source}),
+            pending AS (
+                SELECT entity_id, SUM(delta) AS delta
+                FROM counter_deltas
+                WHERE counter = %s
+                GROUP BY entity_id
+            )
+            SELECT
+                t.{key} AS entity_id,
+                COALESCE(t.{column}, 0) AS stored,
+                COALESCE(p.delta, 0) AS pending,
+                COALESCE(tr.value, 0) AS actual
+            FROM {table} t
+            LEFT JOIN truth tr ON tr.entity_id = t.{key}
+            LEFT JOIN pending p ON p.entity_id = t.{key}
+            WHERE COALESCE(t.{column}, 0) + COALESCE(p.delta, 0) <> COALESCE(tr.value, 0)
+        '''.format(source=counter.source, table=counter.table, column=counter.column, key=counter.key_column)
+
+        if repair:
+            # Repair by the observed difference rather than an absolute value, so
+            # increments that commit while the check runs are not overwritten.
+            cur.execute('''
+                WITH drift AS ({drift_query})
+                UPDATE {table} t
+                SET {column} = COALESCE(t.{column}, 0) + (drift.actual - drift.stored - drift.pending)
+                FROM drift
+                WHERE t.{key} = drift.entity_id
+                RETURNING drift.entity_id, drift.stored, drift.pending, drift.actual, {scope_columns}
+            '''.format(
+                drift_query=drift_query,
+                table=counter.table,
+                column=counter.column,
+                key=counter.key_column,
+                scope_columns=counter.scope_columns,
+            ), (name,))
+        else:
+            cur.execute(drift_query, (name,))
+        rows = cur.fetchall()
+
+        if repair:
+            scopes: List[str] = []
+            for row in rows:
+                scopes += counter.scopes_for(row)
+            cache.invalidate(cur, scopes)
+
+        report[name] = {
+            'drifted': len(rows),
+            'repaired': len(rows) if repair else 0,
+            'sample': [
+                {key: row[key] for key in ('entity_id', 'stored', 'pending', 'actual')}
+                for row in rows[:DRIFT_SAMPLE_SIZE]
+            ],
+        }
+    return report
+
+
+def repair_consistency(cur: Any) -> Dict[str, Any]:
+    return check_consistency(cur, repair=True)
+
+
+def recompute(cur: Any) -> Dict[str, int]:
+    '''
+    Sets every counter from its source in one set-based pass and drops any
+    staged deltas. For offline bulk loads: no cache scopes are bumped and
+    concurrent writers are not accounted for (use repair_consistency online).
+    '''
+    updated: Dict[str, int] = {}
+    for name, counter in COUNTERS.items():
+        cur.execute('''
+            UPDATE {table} t
+            SET {column} = COALESCE(truth.value, 0)
+            FROM {table} src
+            LEFT JOIN ({source}) truth ON truth.entity_id = src.{key}
+            WHERE t.{key} = src.{key} AND t.{column} IS DISTINCT FROM COALESCE(truth.value, 0)
+        '''.format(table=counter.table, column=counter.column, source=counter.source, key=counter.key_column))
+        updated[name] = cur.rowcount
+        cur.execute('DELETE FROM counter_deltas WHERE counter = %s', (name,))
+    return updated
@@ -0,0 +1,136 @@
+'''
+Business: Salted, memory-hard password hashing with stored parameters and upgrades
+Args: PASSWORD_SCHEME, PASSWORD_SCRYPT_N/R/P, PASSWORD_PBKDF2_ITERATIONS, PASSWORD_HASH_WORKERS env
+Returns: self-describing hash strings, verification results and rehash decisions
+'''
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode().rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def scrypt_params(n: int, r: int, p: int) -> Dict[str, Any]:
+    return {'scheme': 'scrypt', 'n': n, 'r': r, 'p': p}
+
+
+def pbkdf2_params(iterations: int) -> Dict[str, Any]:
+    return {'scheme': 'pbkdf2_sha256', 'iterations': iterations}
+
+
+def default_params() -> Dict[str, Any]:
+    if os.environ.get('PASSWORD_SCHEME', 'scrypt') == 'pbkdf2_sha256':
+        return pbkdf2_params(int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', '600000')))
+    return scrypt_params(
+        int(os.environ.get('PASSWORD_SCRYPT_N', str(2 ** 14))),
+        int(os.environ.get('PASSWORD_SCRYPT_R', '8')),
+        int(os.environ.get('PASSWORD_SCRYPT_P', '1')),
+    )
+
+
+CURRENT_PARAMS = default_params()
+
+
+def _derive(password: str, salt: bytes, params: Dict[str, Any]) -> bytes:
+    if params['scheme'] == 'scrypt':
+        n, r, p = params['n'], params['r'], params['p']
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p,
+            maxmem=128 * n * r * (p + 1) + 1024 * 1024, dklen=32
+        )
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params['iterations'], dklen=32)
+
+
+def encode(params: Dict[str, Any], salt: bytes, digest: bytes) -> str:
+    if params['scheme'] == 'scrypt':
+        head = 'scrypt$%d$%d$%d' % (params['n'], params['r'], params['p'])
+    else:
+        head = 'pbkdf2_sha256$%d' % params['iterations']
+    return '%s$%s$%s' % (head, _b64encode(salt), _b64encode(digest))
+
+
+def decode(stored: str) -> Tuple[Dict[str, Any], bytes, bytes]:
+    parts = stored.split('$')
+    if parts[0] == 'scrypt' and len(parts) == 6:
+        params = scrypt_params(int(parts[1]), int(parts[2]), int(parts[3]))
+    elif parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+        params = pbkdf2_params(int(parts[1]))
+    elif len(stored) == 64:
+        return {'scheme': 'sha256'}, b'', bytes.fromhex(stored)
+    else:
+        raise ValueError('Unknown password hash format')
+    return params, _b64decode(parts[-2]), _b64decode(parts[-1])
+
+
+def hash_password(password: str, params: Optional[Dict[str, Any]] = None) -> str:
+    params = params or CURRENT_PARAMS
+    salt = os.urandom(16)
+    return encode(params, salt, _derive(password, salt, params))
+
+
+def verify_password(password: str, stored: str) -> bool:
+    try:
+        params, salt, expected = decode(stored)
+    except ValueError:
+        return False
+    if params['scheme'] == 'sha256':
+        actual = hashlib.sha256(password.encode()).digest()
+    else:
+        actual = _derive(password, salt, params)
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: str, params: Optional[Dict[str, Any]] = None) -> bool:
+    try:
+        return decode(stored)[0] != (params or CURRENT_PARAMS)
+    except ValueError:
+        return True
+
+
+def verify_and_upgrade(password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+    if stored is None:
+        verify_password(password, _dummy_hash())
+        return False, None
+    if not verify_password(password, stored):
+        return False, None
+    return True, hash_password(password) if needs_rehash(stored) else None
+
+
+_dummy: Optional[str] = None
+
+
+def _dummy_hash() -> str:
+    global _dummy
+    if _dummy is None:
+        _dummy = hash_password('dummy-password-for-timing')
+    return _dummy
+
+
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', '2'))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(HASH_WORKERS * 4)
+
+
+def run_hashing(fn: Callable[..., Any], *args: Any) -> Any:
+    if not _slots.acquire(timeout=HASH_QUEUE_TIMEOUT):
+        raise HashingBusy('Too many concurrent password operations')
+    try:
+        return _executor.submit(fn, *args).result()
+    finally:
+        _slots.release()
@@ -0,0 +1,117 @@
+'''
+Business: Buffered topic view counting (read path stays read-only on topics)
+Args: topic ids recorded by readers; VIEWS_FLUSH_INTERVAL / VIEWS_FLUSH_THRESHOLD env
+Returns: coalesced deltas staged in topic_view_deltas and applied in bulk by the flusher (and passed on to hot-topic scoring)
+'''
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from shared import cache, db
+
+# Views are counted in this instance's memory and staged in topic_view_deltas
+# by whichever request finds the buffer due. Up to FLUSH_THRESHOLD views, or
+# FLUSH_INTERVAL seconds of them, are lost when the platform recycles a warm
+# instance; view counts are approximate by design.
+FLUSH_INTERVAL = float(os.environ.get('VIEWS_FLUSH_INTERVAL', '10'))
+FLUSH_THRESHOLD = int(os.environ.get('VIEWS_FLUSH_THRESHOLD', '200'))
+
+_buffer: Dict[int, int] = {}
+_pending = 0
+_last_flush = time.monotonic()
+_lock = threading.Lock()
+
+
+def record_view(topic_id: int) -> None:
+    global _pending
+    with _lock:
+        _buffer[topic_id] = _buffer.get(topic_id, 0) + 1
+        _pending += 1
+
+
+def maybe_flush(conn: Optional[Any] = None) -> int:
+    '''
+    Flushes when the buffer is due, on the caller's connection once its own
+    transaction is committed. A replica connection cannot write, so a primary
+    one is taken only if the pool has it free; otherwise the views wait for
+    the next request.
+    '''
+    with _lock:
+        due = _pending >= FLUSH_THRESHOLD or time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if not due:
+        return 0
+    own = conn is None or db.is_replica(conn)
+    try:
+        if own:
+            conn = db.get_connection(timeout=0)
+        else:
+            conn.readonly = None
+    except Exception:
+        return 0
+    try:
+        return flush_buffer(conn)
+    except Exception:
+        return 0
+    finally:
+        if own:
+            db.release_connection(conn)
+
+
+def flush_buffer(conn: Any) -> int:
+    global _buffer, _pending, _last_flush
+    with _lock:
+        drained, _buffer = _buffer, {}
+        _pending = 0
+        _last_flush = time.monotonic()
+    if not drained:
+        return 0
+    try:
+        cur = conn.cursor()
+        db.execute_values(
+            cur,
+            'INSERT INTO topic_view_deltas (topic_id, views) VALUES %s',
+            list(drained.items())
+        )
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        with _lock:
+            for topic_id, views in drained.items():
+                _buffer[topic_id] = _buffer.get(topic_id, 0) + views
+                _pending += views
+        raise
+    return len(drained)
+
+
+def apply_staged_views(cur: Any) -> int:
+    cur.execute('''
+        WITH drained AS (
+            DELETE FROM topic_view_deltas
+            RETURNING topic_id, views
+        ),
+        totals AS (
+            SELECT topic_id, SUM(views) AS views
+            FROM drained
+            GROUP BY topic_id
+        ),
+        scored AS (
+            INSERT INTO topic_score_views (topic_id, views)
+            SELECT topic_id, views FROM totals
+        )
+        UPDATE topics t
+        SET views_count = t.views_count + totals.views
+        FROM totals
+        WHERE t.id = totals.topic_id
+        RETURNING t.id
+    ''')
+    updated = cur.fetchall()
+    # Only the topic pages: lists show views_count too, but bumping them on
+    # every flush would keep topics:all permanently cold. They pick the new
+    # counts up with the next post or topic in their scope.
+    scopes: List[str] = []
+    for row in updated:
+        scopes += cache.topic_view_scopes(row['id'])
+    cache.invalidate(cur, scopes)
+    return len(updated)
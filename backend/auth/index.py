@@ -1,49 +1,33 @@
 '''
 Business: User authentication and registration
-Args: event with httpMethod POST, body with email/password or username/email/password
+Args: event with httpMethod POST, body with action (register, login, logout) and credentials
 Returns: HTTP response with user data and session token
 '''
 import json
 import os
 from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import hashlib
-import uuid
+import sys
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+from shared import db, encoding, http, passwords, ratelimit, sessions, tracing
 
+@tracing.traced('auth')
+@ratelimit.limited('auth')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return http.preflight('auth')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return http.error(405, 'Method not allowed')
     
+    # Password hashing waits for a hashing slot and then burns CPU; no pool
+    # connection is held across it
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
         body_data = json.loads(event.get('body', '{}'))
         action = body_data.get('action', 'login')
         
@@ -53,14 +37,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             password = body_data.get('password', '')
             
             if not all([username, email, password]):
-                return {
-                    'statusCode': 400,
-                    'headers': {'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Missing required fields'})
-                }
+                return http.error(400, 'Missing required fields')
             
-            password_hash = hash_password(password)
+            password_hash = passwords.run_hashing(passwords.hash_password, password)
             
+            conn = db.get_connection()
+            cur = conn.cursor()
             cur.execute('''
                 INSERT INTO users (username, email, password_hash)
                 VALUES (%s, %s, %s)
@@ -68,10 +50,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             ''', (username, email, password_hash))
             
             user = cur.fetchone()
+            session_token = sessions.create_session(cur, user['id'])
             conn.commit()
             
-            session_token = str(uuid.uuid4())
-            
             return {
                 'statusCode': 201,
                 'headers': {
@@ -79,10 +60,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Access-Control-Allow-Origin': '*'
                 },
                 'isBase64Encoded': False,
-                'body': json.dumps({
-                    'user': dict(user),
+                'body': encoding.dumps({
+                    'user': user,
                     'token': session_token
-                }, default=str)
+                })
             }
         
         elif action == 'login':
@@ -90,30 +71,38 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             password = body_data.get('password', '')
             
             if not all([email, password]):
-                return {
-                    'statusCode': 400,
-                    'headers': {'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Missing email or password'})
-                }
-            
-            password_hash = hash_password(password)
+                return http.error(400, 'Missing email or password')
             
+            conn = db.get_connection()
+            cur = conn.cursor()
             cur.execute('''
-                SELECT id, username, email, role, avatar_url, posts_count, created_at
+                SELECT id, username, email, role, avatar_url, posts_count, created_at, password_hash
                 FROM users
-                WHERE email = %s AND password_hash = %s
-            ''', (email, password_hash))
+                WHERE email = %s
+            ''', (email,))
             
             user = cur.fetchone()
+            conn.rollback()
+            cur.close()
+            db.release_connection(conn)
+            del cur, conn
             
-            if not user:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Invalid credentials'})
-                }
+            stored_hash = user.pop('password_hash') if user else None
+            valid, upgraded_hash = passwords.run_hashing(passwords.verify_and_upgrade, password, stored_hash)
             
-            session_token = str(uuid.uuid4())
+            if not valid:
+                return http.error(401, 'Invalid credentials')
+            
+            conn = db.get_connection()
+            cur = conn.cursor()
+            if upgraded_hash:
+                cur.execute('''
+                    UPDATE users SET password_hash = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                ''', (upgraded_hash, user['id']))
+            
+            session_token = sessions.create_session(cur, user['id'])
+            conn.commit()
             
             return {
                 'statusCode': 200,
@@ -122,29 +111,42 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Access-Control-Allow-Origin': '*'
                 },
                 'isBase64Encoded': False,
-                'body': json.dumps({
-                    'user': dict(user),
+                'body': encoding.dumps({
+                    'user': user,
                     'token': session_token
-                }, default=str)
+                })
             }
         
-        else:
+        elif action == 'logout':
+            token = sessions.token_from_event(event) or body_data.get('token')
+            
+            if token:
+                conn = db.get_connection()
+                cur = conn.cursor()
+                sessions.revoke(cur, token)
+                conn.commit()
+            
             return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid action'})
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'ok': True})
             }
+        
+        else:
+            return http.error(400, 'Invalid action')
             
+    except passwords.HashingBusy:
+        return http.error(503, 'Server is busy, try again', {'Retry-After': '1'})
     except Exception as e:
         if 'conn' in locals():
             conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+        return http.error(500, str(e))
     finally:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            db.release_connection(conn)
@@ -0,0 +1,198 @@
+'''
+Business: Response encoding for handlers: fast JSON, streamed arrays, negotiated compression
+Args: row iterables (e.g. server-side or tuple cursors), JSON_BACKEND, COMPRESS_MIN_BYTES, COMPRESS_LEVEL env
+Returns: JSON text built chunk by chunk, and gzip/br bodies for clients that accept them
+'''
+import base64
+import functools
+import gzip
+import json
+import os
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from shared import tracing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))
+
+
+def _default(value: Any) -> Any:
+    # Same datetime rendering as orjson, so the payload does not depend on
+    # which backend is installed.
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def _orjson_dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+_dumps_bytes: Callable[[Any], bytes] = _json_dumps
+
+
+def use_backend(name: str) -> str:
+    global _dumps_bytes
+    if name in ('auto', 'orjson') and orjson is not None:
+        _dumps_bytes = _orjson_dumps
+        return 'orjson'
+    if name == 'orjson':
+        raise RuntimeError('orjson is not installed')
+    _dumps_bytes = _json_dumps
+    return 'json'
+
+
+BACKEND = use_backend(JSON_BACKEND)
+
+
+def dumps(value: Any) -> str:
+    with tracing.serializing():
+        return _dumps_bytes(value).decode()
+
+
+def named_rows(cur: Any) -> Iterator[Dict[str, Any]]:
+    '''
+    Iterates a plain tuple cursor as dicts keyed by column name. Cheaper than
+    RealDictCursor, which builds every row key by key in Python.
+    '''
+    columns: Optional[List[str]] = None
+    for row in cur:
+        if columns is None:
+            columns = [column.name for column in cur.description]
+        yield dict(zip(columns, row))
+
+
+def _array_chunks(rows: Iterable[Any], transform: Optional[Callable[[Any], Any]]) -> List[bytes]:
+    chunks = [b'[']
+    first = True
+    for row in rows:
+        if not first:
+            chunks.append(b',')
+        chunks.append(_dumps_bytes(transform(row) if transform else row))
+        first = False
+    chunks.append(b']')
+    return chunks
+
+
+def dumps_with_array(
+    obj: Dict[str, Any],
+    key: str,
+    rows: Iterable[Any],
+    transform: Optional[Callable[[Any], Any]] = None,
+) -> str:
+    with tracing.serializing():
+        head = _dumps_bytes(obj)
+        chunks = [head[:-1] + b',' if len(obj) else b'{', _dumps_bytes(key), b':']
+        chunks += _array_chunks(rows, transform)
+        chunks.append(b'}')
+        return b''.join(chunks).decode()
+
+
+def append_field(body: str, key: str, value: Any) -> str:
+    return '%s,%s:%s}' % (body[:-1], dumps(key), dumps(value))
+
+
+def accepted_encodings(event: Dict[str, Any]) -> Dict[str, float]:
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    accepted: Dict[str, float] = {}
+    for part in headers.get('accept-encoding', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(event: Dict[str, Any]) -> Optional[str]:
+    accepted = accepted_encodings(event)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = None
+    for name in candidates:
+        quality = accepted.get(name, accepted.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (name, quality)
+    return best[0] if best else None
+
+
+def compress_body(body: str, encoding: str) -> bytes:
+    raw = body.encode()
+    if encoding == 'br':
+        return brotli.compress(raw, quality=min(COMPRESS_LEVEL, 11))
+    return gzip.compress(raw, compresslevel=COMPRESS_LEVEL)
+
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str) or len(body) < COMPRESS_MIN_BYTES:
+        return response
+    headers = response.setdefault('headers', {})
+    if 'Content-Encoding' in headers:
+        return response
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = choose_encoding(event)
+    if encoding is None:
+        return response
+    headers['Content-Encoding'] = encoding
+    response['body'] = base64.b64encode(compress_body(body, encoding)).decode()
+    response['isBase64Encoded'] = True
+    return response
+
+
+def negotiated(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    '''
+    Handler decorator: compresses large response bodies with the best
+    encoding the client accepts (br when the brotli module is available).
+    '''
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        return compress_response(event, handler(event, context))
+    return wrapper
+
+
+class PageWindow:
+    '''
+    Wraps a cursor fetched with LIMIT page_size + 1: yields at most page_size
+    rows and remembers the last yielded row and whether another page exists.
+    '''
+
+    def __init__(self, rows: Iterable[Any], page_size: int) -> None:
+        self.rows = rows
+        self.page_size = page_size
+        self.last: Any = None
+        self.has_more = False
+
+    def __iter__(self):
+        count = 0
+        for row in self.rows:
+            if count == self.page_size:
+                self.has_more = True
+                break
+            self.last = row
+            count += 1
+            yield row
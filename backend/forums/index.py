@@ -6,54 +6,64 @@ Returns: HTTP response with forum categories data
 import json
 import os
 from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import sys
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
 
+from shared import cache, conditional, db, encoding, http, tracing
+
+def list_categories(cur: Any) -> Dict[str, Any]:
+    cur.execute('''
+        SELECT 
+            fc.*,
+            COALESCE(cs.topics_count, 0) as topics_count,
+            COALESCE(cs.total_posts, 0) as total_posts,
+            cs.last_activity_at
+        FROM forum_categories fc
+        LEFT JOIN category_stats cs ON cs.category_id = fc.id
+        ORDER BY fc.sort_order, fc.id
+    ''')
+    categories = cur.fetchall()
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': False,
+        'body': encoding.dumps(categories)
+    }
+
+@tracing.traced('forums')
+@encoding.negotiated
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return http.preflight('forums')
     
     try:
-        conn = get_db_connection()
+        if method == 'GET':
+            conn = db.get_read_connection(db.read_position(event))
+        else:
+            conn = db.get_connection()
         cur = conn.cursor()
         
         if method == 'GET':
-            cur.execute('''
-                SELECT 
-                    fc.*,
-                    COUNT(DISTINCT t.id) as topics_count,
-                    COALESCE(SUM(t.replies_count), 0) as total_posts
-                FROM forum_categories fc
-                LEFT JOIN topics t ON t.category_id = fc.id
-                GROUP BY fc.id
-                ORDER BY fc.sort_order, fc.id
-            ''')
-            categories = cur.fetchall()
+            response = conditional.conditional_get(
+                event,
+                cur,
+                'forums:list',
+                {},
+                [cache.FORUMS_SCOPE],
+                lambda versions: list_categories(cur)
+            )
+            conn.commit()
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps([dict(cat) for cat in categories], default=str)
-            }
+            return response
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
@@ -63,11 +73,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             gradient = body_data.get('gradient', 'gradient-purple-pink')
             
             if not name:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Name is required'})
-                }
+                return http.error(400, 'Name is required')
             
             cur.execute('''
                 INSERT INTO forum_categories (name, description, icon, gradient)
@@ -76,6 +82,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             ''', (name, description, icon, gradient))
             
             category = cur.fetchone()
+            cache.invalidate(cur, [cache.FORUMS_SCOPE])
             conn.commit()
             
             return {
@@ -85,24 +92,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Access-Control-Allow-Origin': '*'
                 },
                 'isBase64Encoded': False,
-                'body': json.dumps(dict(category), default=str)
+                'body': encoding.dumps(category)
             }
         
         else:
-            return {
-                'statusCode': 405,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Method not allowed'})
-            }
+            return http.error(405, 'Method not allowed')
             
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+        return http.error(500, str(e))
     finally:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            db.release_connection(conn)
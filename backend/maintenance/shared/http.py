@@ -0,0 +1,55 @@
+'''
+Business: Shared HTTP plumbing for handlers: the route table, CORS preflight and error responses
+Args: route names as deployed (auth, forums, topics, posts, likes, search, messages, maintenance)
+Returns: ready-to-return response dicts with CORS headers
+'''
+import json
+from typing import Any, Dict, NamedTuple, Optional
+
+AUTH_HEADERS = 'Content-Type, X-User-Id, X-Auth-Token, Authorization'
+CONDITIONAL_HEADERS = 'If-None-Match, If-Modified-Since'
+# Read-your-writes position echoed back on reads that may go to a replica
+READ_AFTER_HEADERS = 'X-Read-After'
+PREFLIGHT_MAX_AGE = '86400'
+
+
+class Route(NamedTuple):
+    methods: str
+    allow_headers: str
+
+
+ROUTES: Dict[str, Route] = {
+    'auth': Route('POST, OPTIONS', AUTH_HEADERS),
+    'forums': Route('GET, POST, PUT, OPTIONS', AUTH_HEADERS + ', ' + CONDITIONAL_HEADERS + ', ' + READ_AFTER_HEADERS),
+    'topics': Route('GET, POST, PUT, OPTIONS', AUTH_HEADERS + ', ' + CONDITIONAL_HEADERS + ', ' + READ_AFTER_HEADERS),
+    'posts': Route('POST, PUT, OPTIONS', AUTH_HEADERS),
+    'likes': Route('GET, POST, OPTIONS', AUTH_HEADERS),
+    'search': Route('GET, OPTIONS', AUTH_HEADERS),
+    'messages': Route('GET, POST, PUT, OPTIONS', AUTH_HEADERS),
+    'maintenance': Route('POST, OPTIONS', 'Content-Type, X-Maintenance-Token'),
+}
+
+
+def preflight(route: str) -> Dict[str, Any]:
+    spec = ROUTES[route]
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': spec.methods,
+            'Access-Control-Allow-Headers': spec.allow_headers,
+            'Access-Control-Max-Age': PREFLIGHT_MAX_AGE
+        },
+        'body': ''
+    }
+
+
+def error(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    response_headers = {'Access-Control-Allow-Origin': '*'}
+    if headers:
+        response_headers.update(headers)
+    return {
+        'statusCode': status,
+        'headers': response_headers,
+        'body': json.dumps({'error': message})
+    }
@@ -0,0 +1,165 @@
+'''
+Business: Hot-topic scores: exponentially decayed views, replies and likes, kept incrementally in topic_scores
+Args: cursor inside a transaction (maintenance jobs); TRENDING_HALF_LIFE_HOURS, TRENDING_SETTLE_SECONDS env
+Returns: number of topics rescored and pruned; SQL fragments for ranking by current score
+'''
+import math
+import os
+from typing import Any, Dict
+
+from shared import cache
+
+HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', '24'))
+# Activity younger than this is left for the next run: created_at is taken at
+# transaction start, so a row may commit after a later-stamped one was counted.
+SETTLE_SECONDS = float(os.environ.get('TRENDING_SETTLE_SECONDS', '60'))
+
+WEIGHTS: Dict[str, float] = {'topic': 4.0, 'reply': 4.0, 'like': 2.0, 'view': 1.0}
+
+# Rows whose decayed score fell below this are dropped from topic_scores
+PRUNE_BELOW = 0.05
+
+# Forward decay: an event of weight w at time t adds w * e^((t - EPOCH) / tau),
+# stored as a log-sum. Ranking by that is ranking by w * e^(-(now - t) / tau),
+# and rows without new activity never need rewriting.
+EPOCH = "TIMESTAMP '2020-01-01'"
+DECAY_SECONDS = HALF_LIFE_HOURS * 3600 / math.log(2)
+
+# exp() raises on underflow instead of returning 0
+MIN_EXPONENT = -700
+
+
+def position_sql(timestamp_sql: str) -> str:
+    '''Log-space offset of an event at the given time'''
+    return '(EXTRACT(EPOCH FROM %s - %s)::float8 / %r)' % (timestamp_sql, EPOCH, DECAY_SECONDS)
+
+
+def current_score_sql(score_log_sql: str) -> str:
+    '''A stored log score decayed to now, on the scale of the event weights'''
+    return 'exp(GREATEST(%s - %s, %d))' % (score_log_sql, position_sql('LOCALTIMESTAMP'), MIN_EXPONENT)
+
+
+def _event_sql(weight: str, timestamp_sql: str) -> str:
+    return 'ln(%s) + %s' % (weight, position_sql(timestamp_sql))
+
+
+# Activity since the last run. Views come from topic_score_views, which the
+# flush_views job fills with what it applies to topics.views_count.
+INCREMENTAL_EVENTS_SQL = '''
+    drained_views AS (
+        DELETE FROM topic_score_views WHERE created_at <= %(until)s
+        RETURNING topic_id, views, created_at
+    ),
+    events AS (
+        SELECT t.id AS topic_id, t.category_id, {topic} AS x
+        FROM topics t
+        WHERE t.created_at > %(since)s AND t.created_at <= %(until)s
+        UNION ALL
+        SELECT t.id, t.category_id, {reply}
+        FROM posts p JOIN topics t ON t.id = p.topic_id
+        WHERE p.created_at > %(since)s AND p.created_at <= %(until)s
+        UNION ALL
+        SELECT t.id, t.category_id, {like}
+        FROM likes l JOIN posts p ON p.id = l.post_id JOIN topics t ON t.id = p.topic_id
+        WHERE l.created_at > %(since)s AND l.created_at <= %(until)s
+        UNION ALL
+        SELECT t.id, t.category_id, {view}
+        FROM drained_views v JOIN topics t ON t.id = v.topic_id
+        WHERE v.views > 0
+    ),
+'''.format(
+    topic=_event_sql('%(w_topic)s', 't.created_at'),
+    reply=_event_sql('%(w_reply)s', 'p.created_at'),
+    like=_event_sql('%(w_like)s', 'l.created_at'),
+    view=_event_sql('%(w_view)s * v.views', 'v.created_at'),
+)
+
+# Full history. Total views have no timestamps: they count at the topic's
+# last activity. Staged view deltas are already in views_count.
+REBUILD_EVENTS_SQL = '''
+    drained_views AS (
+        DELETE FROM topic_score_views WHERE created_at <= %(until)s
+    ),
+    events AS (
+        SELECT t.id AS topic_id, t.category_id, {topic} AS x
+        FROM topics t
+        WHERE t.created_at <= %(until)s
+        UNION ALL
+        SELECT t.id, t.category_id, {reply}
+        FROM posts p JOIN topics t ON t.id = p.topic_id
+        WHERE p.created_at <= %(until)s
+        UNION ALL
+        SELECT t.id, t.category_id, {like}
+        FROM likes l JOIN posts p ON p.id = l.post_id JOIN topics t ON t.id = p.topic_id
+        WHERE l.created_at <= %(until)s
+        UNION ALL
+        SELECT t.id, t.category_id, {view}
+        FROM topics t
+        WHERE t.views_count > 0
+    ),
+'''.format(
+    topic=_event_sql('%(w_topic)s', 't.created_at'),
+    reply=_event_sql('%(w_reply)s', 'p.created_at'),
+    like=_event_sql('%(w_like)s', 'l.created_at'),
+    view=_event_sql('%(w_view)s * t.views_count', 'LEAST(t.updated_at, %(until)s)'),
+)
+
+# Log-sum-exp per topic, then merged into the stored log score the same way
+MERGE_SCORES_SQL = '''
+    scored AS (
+        SELECT topic_id, category_id, top + ln(SUM(exp(GREATEST(x - top, {min_exp})))) AS score_log
+        FROM (
+            SELECT topic_id, category_id, x, MAX(x) OVER (PARTITION BY topic_id) AS top
+            FROM events
+        ) e
+        GROUP BY topic_id, category_id, top
+    )
+    INSERT INTO topic_scores (topic_id, category_id, score_log, updated_at)
+    SELECT topic_id, category_id, score_log, LOCALTIMESTAMP FROM scored
+    ON CONFLICT (topic_id) DO UPDATE SET
+        score_log = GREATEST(topic_scores.score_log, EXCLUDED.score_log)
+            + ln(1 + exp(GREATEST(-abs(topic_scores.score_log - EXCLUDED.score_log), {min_exp}))),
+        category_id = EXCLUDED.category_id,
+        updated_at = EXCLUDED.updated_at
+'''.format(min_exp=MIN_EXPONENT)
+
+
+def refresh(cur: Any, rebuild: bool = False) -> Dict[str, int]:
+    '''
+    Folds activity since the last run into topic_scores; the first run (or
+    rebuild=True) scores the whole history. Untouched topics keep their rows.
+    '''
+    cur.execute('''
+        SELECT counted_until, LOCALTIMESTAMP - make_interval(secs => %s) AS until
+        FROM topic_scores_state WHERE id = 1
+        FOR UPDATE
+    ''', (SETTLE_SECONDS,))
+    state = cur.fetchone()
+    full = rebuild or state['counted_until'] is None
+    if full:
+        cur.execute('DELETE FROM topic_scores')
+
+    cur.execute('WITH ' + (REBUILD_EVENTS_SQL if full else INCREMENTAL_EVENTS_SQL) + MERGE_SCORES_SQL, {
+        'since': state['counted_until'],
+        'until': state['until'],
+        'w_topic': WEIGHTS['topic'],
+        'w_reply': WEIGHTS['reply'],
+        'w_like': WEIGHTS['like'],
+        'w_view': WEIGHTS['view'],
+    })
+    rescored = cur.rowcount
+
+    cur.execute('''
+        DELETE FROM topic_scores WHERE score_log < {now} + ln(%s)
+    '''.format(now=position_sql('LOCALTIMESTAMP')), (PRUNE_BELOW,))
+    pruned = cur.rowcount
+
+    cur.execute('UPDATE topic_scores_state SET counted_until = %s WHERE id = 1', (state['until'],))
+    if rescored or pruned:
+        cache.invalidate(cur, [cache.HOT_TOPICS_SCOPE])
+    return {'rescored': rescored, 'pruned': pruned, 'rebuilt': int(full)}
+
+
+def rebuild(cur: Any) -> Dict[str, int]:
+    '''Rescores from scratch, e.g. after changing TRENDING_HALF_LIFE_HOURS or the weights'''
+    return refresh(cur, rebuild=True)
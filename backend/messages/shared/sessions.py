@@ -0,0 +1,118 @@
+'''
+Business: Persistent session tokens with an in-process TTL cache for validation
+Args: SESSION_TTL_DAYS, SESSION_CACHE_TTL, SESSION_CACHE_MAX, SESSION_ALLOW_BODY_USER_ID env
+Returns: issued tokens and the user a token resolves to (one indexed lookup on cache miss)
+'''
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+SESSION_TTL_DAYS = int(os.environ.get('SESSION_TTL_DAYS', '30'))
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '60'))
+SESSION_CACHE_MAX = int(os.environ.get('SESSION_CACHE_MAX', '10000'))
+ALLOW_BODY_USER_ID = os.environ.get('SESSION_ALLOW_BODY_USER_ID', '0') == '1'
+EXPIRE_BATCH_SIZE = 10000
+
+_cache: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_from_event(event: Dict[str, Any]) -> Optional[str]:
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    auth = headers.get('authorization', '')
+    if auth.lower().startswith('bearer '):
+        return auth[7:].strip() or None
+    return headers.get('x-auth-token') or None
+
+
+def create_session(cur: Any, user_id: int) -> str:
+    token = secrets.token_urlsafe(32)
+    cur.execute('''
+        INSERT INTO sessions (token_hash, user_id, expires_at)
+        VALUES (%s, %s, CURRENT_TIMESTAMP + make_interval(days => %s))
+    ''', (_token_hash(token), user_id, SESSION_TTL_DAYS))
+    return token
+
+
+def _cache_get(key: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+
+def _cache_put(key: str, user: Dict[str, Any], expires_in: float) -> None:
+    with _lock:
+        _cache[key] = (time.monotonic() + min(SESSION_CACHE_TTL, expires_in), user)
+        _cache.move_to_end(key)
+        while len(_cache) > SESSION_CACHE_MAX:
+            _cache.popitem(last=False)
+
+
+def cached(token: str) -> Optional[Dict[str, Any]]:
+    '''The user a token resolved to recently, without touching the database'''
+    return _cache_get(_token_hash(token))
+
+
+def resolve(cur: Any, token: str) -> Optional[Dict[str, Any]]:
+    key = _token_hash(token)
+    user = _cache_get(key)
+    if user is not None:
+        return user
+    cur.execute('''
+        SELECT
+            user_id AS id,
+            EXTRACT(EPOCH FROM expires_at - CURRENT_TIMESTAMP) AS expires_in
+        FROM sessions
+        WHERE token_hash = %s AND expires_at > CURRENT_TIMESTAMP
+    ''', (key,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    user = {'id': row['id']}
+    _cache_put(key, user, float(row['expires_in']))
+    return user
+
+
+def revoke(cur: Any, token: str) -> None:
+    key = _token_hash(token)
+    with _lock:
+        _cache.pop(key, None)
+    cur.execute('DELETE FROM sessions WHERE token_hash = %s', (key,))
+
+
+def authenticate(cur: Any, event: Dict[str, Any], claimed_user_id: Any) -> Tuple[Optional[Any], Optional[str]]:
+    token = token_from_event(event)
+    if token:
+        user = resolve(cur, token)
+        if user is None:
+            return None, 'Invalid or expired session'
+        return user['id'], None
+    if claimed_user_id and not ALLOW_BODY_USER_ID:
+        return None, 'Authentication required'
+    return claimed_user_id, None
+
+
+def expire_sessions(cur: Any) -> int:
+    cur.execute('''
+        DELETE FROM sessions
+        WHERE token_hash IN (
+            SELECT token_hash FROM sessions
+            WHERE expires_at <= CURRENT_TIMESTAMP
+            LIMIT %s
+        )
+    ''', (EXPIRE_BATCH_SIZE,))
+    return cur.rowcount
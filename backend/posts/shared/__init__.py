@@ -0,0 +1,7 @@
+'''
+Shared helpers for forum cloud functions (database access and friends)
+
+Functions are deployed one directory at a time, so each carries a copy of
+the modules it uses in backend/<function>/shared. Edit them here, then run
+tools/vendor_shared.py; tools/vendor_shared.py --check fails on stale copies.
+'''
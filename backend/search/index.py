@@ -0,0 +1,155 @@
+'''
+Business: Full-text search over topics and posts with ranking and highlighted snippets
+Args: event with httpMethod GET, queryStringParameters q, category_id, type (all, topics, posts), cursor, limit
+Returns: HTTP response with ranked search hits; next page cursor in X-Next-Cursor
+'''
+import html
+import os
+from typing import Dict, Any, List, Optional
+import sys
+
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
+
+from shared import db, encoding, http, pagination, ratelimit, tracing
+
+SEARCH_CONFIG = 'russian'
+SEARCH_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE_MAX = 50
+SEARCH_TYPES = ('all', 'topics', 'posts')
+# Snippets are user content: ts_headline marks matches with private-use
+# characters (stripped from the content first), the rest is HTML-escaped and
+# only then are the markers turned into <mark> tags.
+MARK_START = '\ue000'
+MARK_STOP = '\ue001'
+HEADLINE_OPTIONS = 'MaxFragments=2, MaxWords=20, MinWords=5, StartSel=%s, StopSel=%s' % (MARK_START, MARK_STOP)
+
+def render_snippet(snippet: Optional[str]) -> Optional[str]:
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_STOP, '</mark>')
+
+def build_search_query(search_type: str, category_id: Optional[str], cursor: Optional[List[Any]]) -> str:
+    category_filter = ' AND t.category_id = %(category_id)s' if category_id else ''
+    branches = []
+    if search_type in ('all', 'topics'):
+        branches.append('''
+            SELECT 'topic' AS kind, t.id, t.id AS topic_id, t.category_id, t.title, t.created_at,
+                   ts_rank_cd(t.search_vector, q.query)::float8 AS rank
+            FROM topics t, q
+            WHERE t.search_vector @@ q.query''' + category_filter)
+    if search_type in ('all', 'posts'):
+        branches.append('''
+            SELECT 'post' AS kind, p.id, p.topic_id, t.category_id, t.title, p.created_at,
+                   ts_rank_cd(p.search_vector, q.query)::float8 AS rank
+            FROM posts p
+            JOIN topics t ON t.id = p.topic_id, q
+            WHERE p.search_vector @@ q.query''' + category_filter)
+    
+    keyset = 'WHERE (rank, kind, id) < (%(c_rank)s, %(c_kind)s, %(c_id)s)' if cursor else ''
+    
+    return '''
+        WITH q AS (
+            SELECT websearch_to_tsquery(%(config)s, %(q)s) AS query
+        ),
+        hits AS (''' + ' UNION ALL '.join(branches) + '''
+        ),
+        page AS (
+            SELECT * FROM hits
+            ''' + keyset + '''
+            ORDER BY rank DESC, kind DESC, id DESC
+            LIMIT %(limit)s
+        )
+        SELECT
+            page.kind, page.id, page.topic_id, page.category_id, page.title, page.created_at, page.rank,
+            ts_headline(
+                %(config)s,
+                translate(CASE WHEN page.kind = 'topic'
+                    THEN (SELECT content FROM topics WHERE id = page.id)
+                    ELSE (SELECT content FROM posts WHERE id = page.id)
+                END, %(markers)s, ''),
+                q.query,
+                %(headline)s
+            ) AS snippet
+        FROM page, q
+        ORDER BY page.rank DESC, page.kind DESC, page.id DESC
+    '''
+
+@tracing.traced('search')
+@ratelimit.limited('search')
+@encoding.negotiated
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return http.preflight('search')
+    
+    if method != 'GET':
+        return http.error(405, 'Method not allowed')
+    
+    params = event.get('queryStringParameters', {}) or {}
+    query_text = (params.get('q') or '').strip()
+    category_id = params.get('category_id')
+    search_type = params.get('type', 'all')
+    
+    if len(query_text) < 2:
+        return http.error(400, 'Query must be at least 2 characters')
+    
+    if search_type not in SEARCH_TYPES:
+        return http.error(400, 'Invalid type')
+    
+    try:
+        cursor = pagination.decode_cursor(
+            params['cursor'], 3, (pagination.NUMBER, pagination.TEXT, pagination.INT)
+        ) if params.get('cursor') else None
+    except pagination.InvalidCursor:
+        return http.error(400, 'Invalid cursor')
+    limit = pagination.parse_limit(params.get('limit'), SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE_MAX)
+    
+    try:
+        conn = db.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(build_search_query(search_type, category_id, cursor), {
+            'config': SEARCH_CONFIG,
+            'q': query_text,
+            'category_id': category_id,
+            'c_rank': cursor[0] if cursor else None,
+            'c_kind': cursor[1] if cursor else None,
+            'c_id': cursor[2] if cursor else None,
+            'limit': limit + 1,
+            'headline': HEADLINE_OPTIONS,
+            'markers': MARK_START + MARK_STOP
+        })
+        hits = cur.fetchall()
+        conn.commit()
+        for hit in hits:
+            hit['snippet'] = render_snippet(hit['snippet'])
+        
+        headers = {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'X-Next-Cursor'
+        }
+        if len(hits) > limit:
+            hits = hits[:limit]
+            last = hits[-1]
+            headers['X-Next-Cursor'] = pagination.encode_cursor([last['rank'], last['kind'], last['id']])
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'isBase64Encoded': False,
+            'body': encoding.dumps(hits)
+        }
+        
+    except Exception as e:
+        if 'conn' in locals():
+            conn.rollback()
+        return http.error(500, str(e))
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            db.release_connection(conn)
@@ -0,0 +1,426 @@
+'''
+Business: Warm-instance PostgreSQL connection pool shared by all handlers
+Args: DATABASE_URL, optional DATABASE_READ_URL (hot standby for GET paths), DB_POOL_* and DB_REPLICA_* environment variables
+Returns: pooled psycopg2 connections with RealDictCursor as default cursor; read-only ones from the replica when it is fresh enough
+'''
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, NamedTuple, Optional, Iterator
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+_cursor_classes: Dict[str, Any] = {}
+
+
+def set_cursor_classes(dict_cursor: Any = None, tuple_cursor: Any = None) -> None:
+    '''
+    Swaps in cursor subclasses (e.g. instrumented ones) for connections opened
+    from now on and for tuple_cursor(). None restores the psycopg2 default.
+    '''
+    _cursor_classes['dict'] = dict_cursor
+    _cursor_classes['tuple'] = tuple_cursor
+
+
+def _driver() -> Any:
+    # psycopg2 and psycopg2.extras are the bulk of a handler's import time;
+    # loading them on first connect keeps preflights and rejected requests cheap.
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.extras
+    return psycopg2
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class _PooledConnection:
+    __slots__ = ('conn', 'created_at', 'last_used_at')
+
+    def __init__(self, conn: Any) -> None:
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used_at = now
+
+
+class ConnectionPool:
+    '''
+    Bounded LIFO pool. Idle connections are health-checked with SELECT 1 before
+    reuse once they have been idle for healthcheck_after seconds, and are
+    recycled after max_lifetime seconds so server-side state never grows stale.
+    '''
+
+    def __init__(
+        self,
+        dsn: str,
+        max_size: int = 4,
+        max_lifetime: float = 1800.0,
+        healthcheck_after: float = 30.0,
+        acquire_timeout: float = 5.0,
+    ) -> None:
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.max_lifetime = max_lifetime
+        self.healthcheck_after = healthcheck_after
+        self.acquire_timeout = acquire_timeout
+        self._idle: List[_PooledConnection] = []
+        self._in_use: Dict[int, Optional[_PooledConnection]] = {}
+        self._cond = threading.Condition()
+        self._stats: Dict[str, float] = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time_ms': 0.0,
+            'recycled': 0,
+            'discarded': 0,
+            'healthcheck_failures': 0,
+        }
+
+    def _connect(self) -> _PooledConnection:
+        psycopg2 = _driver()
+        conn = psycopg2.connect(
+            self.dsn, cursor_factory=_cursor_classes.get('dict') or psycopg2.extras.RealDictCursor
+        )
+        return _PooledConnection(conn)
+
+    def _close(self, item: _PooledConnection) -> None:
+        try:
+            item.conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, item: _PooledConnection, now: float) -> bool:
+        if item.conn.closed:
+            self._stats['discarded'] += 1
+            return False
+        if now - item.created_at > self.max_lifetime:
+            self._stats['recycled'] += 1
+            return False
+        if now - item.last_used_at > self.healthcheck_after:
+            try:
+                cur = item.conn.cursor()
+                cur.execute('SELECT 1')
+                cur.close()
+                item.conn.rollback()
+            except Exception:
+                self._stats['healthcheck_failures'] += 1
+                return False
+        return True
+
+    def getconn(self, timeout: Optional[float] = None) -> Any:
+        started = time.monotonic()
+        deadline = started + (self.acquire_timeout if timeout is None else timeout)
+        waited = False
+        with self._cond:
+            while True:
+                while self._idle:
+                    item = self._idle.pop()
+                    if self._is_usable(item, time.monotonic()):
+                        self._stats['hits'] += 1
+                        self._in_use[id(item.conn)] = item
+                        self._record_wait(started, waited)
+                        return item.conn
+                    self._close(item)
+                if len(self._in_use) < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._record_wait(started, waited)
+                    raise PoolTimeout('Timed out waiting for a database connection')
+                waited = True
+                self._cond.wait(remaining)
+            self._stats['misses'] += 1
+            self._record_wait(started, waited)
+            placeholder = object()
+            self._in_use[id(placeholder)] = None
+        try:
+            item = self._connect()
+        except Exception:
+            with self._cond:
+                del self._in_use[id(placeholder)]
+                self._cond.notify()
+            raise
+        with self._cond:
+            del self._in_use[id(placeholder)]
+            self._in_use[id(item.conn)] = item
+        return item.conn
+
+    def _record_wait(self, started: float, waited: bool) -> None:
+        if waited:
+            self._stats['waits'] += 1
+        self._stats['wait_time_ms'] += (time.monotonic() - started) * 1000.0
+
+    def putconn(self, conn: Any, discard: bool = False) -> None:
+        with self._cond:
+            item = self._in_use.pop(id(conn), None)
+            self._cond.notify()
+        if item is None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+        if not discard and not conn.closed:
+            try:
+                idle = _driver().extensions.TRANSACTION_STATUS_IDLE
+                if conn.get_transaction_status() != idle:
+                    conn.rollback()
+                discard = conn.get_transaction_status() != idle
+            except Exception:
+                discard = True
+        if not discard and conn.readonly:
+            # Outside a transaction this only changes the next BEGIN
+            conn.readonly = None
+        if discard or conn.closed:
+            self._stats['discarded'] += 1
+            self._close(item)
+            return
+        item.last_used_at = time.monotonic()
+        with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        conn = self.getconn()
+        try:
+            yield conn
+        except Exception:
+            self.putconn(conn, discard=conn.closed)
+            raise
+        else:
+            self.putconn(conn)
+
+    def owns(self, conn: Any) -> bool:
+        with self._cond:
+            return id(conn) in self._in_use
+
+    def closeall(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for item in idle:
+            self._close(item)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            result: Dict[str, Any] = dict(self._stats)
+            result['idle'] = len(self._idle)
+            result['in_use'] = len(self._in_use)
+            result['max_size'] = self.max_size
+        return result
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL', ''),
+                    max_size=_env_int('DB_POOL_MAX_SIZE', 4),
+                    max_lifetime=_env_float('DB_POOL_MAX_LIFETIME', 1800.0),
+                    healthcheck_after=_env_float('DB_POOL_HEALTHCHECK_AFTER', 30.0),
+                    acquire_timeout=_env_float('DB_POOL_ACQUIRE_TIMEOUT', 5.0),
+                )
+    return _pool
+
+
+def get_connection(timeout: Optional[float] = None) -> Any:
+    '''A primary connection; timeout overrides DB_POOL_ACQUIRE_TIMEOUT (0 never waits)'''
+    return get_pool().getconn(timeout)
+
+
+def is_replica(conn: Any) -> bool:
+    return _replica_pool is not None and _replica_pool.owns(conn)
+
+
+def release_connection(conn: Any) -> None:
+    if is_replica(conn):
+        _replica_pool.putconn(conn)
+    else:
+        get_pool().putconn(conn)
+
+
+class ReplicaStatus(NamedTuple):
+    replay_lsn: int
+    lag_seconds: float
+    checked_at: float
+
+
+_replica_pool: Optional[ConnectionPool] = None
+_replica_status: Optional[ReplicaStatus] = None
+_replica_unavailable_until = 0.0
+_replica_stats: Dict[str, int] = {'replica': 0, 'primary_lag': 0, 'primary_position': 0, 'primary_error': 0}
+
+READ_AFTER_HEADER = 'X-Read-After'
+
+# Replay position and lag in one round trip. Pointed at a server that is not
+# in recovery (e.g. a local setup reusing the primary), it reports no lag.
+REPLICA_STATUS_SQL = '''
+    SELECT
+        (CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END)::text AS replay_lsn,
+        CASE
+            WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END AS lag_seconds
+'''
+
+
+def get_replica_pool() -> Optional[ConnectionPool]:
+    global _replica_pool
+    dsn = os.environ.get('DATABASE_READ_URL')
+    if not dsn:
+        return None
+    if _replica_pool is None:
+        with _pool_lock:
+            if _replica_pool is None:
+                _replica_pool = ConnectionPool(
+                    dsn,
+                    max_size=_env_int('DB_REPLICA_POOL_MAX_SIZE', _env_int('DB_POOL_MAX_SIZE', 4)),
+                    max_lifetime=_env_float('DB_POOL_MAX_LIFETIME', 1800.0),
+                    healthcheck_after=_env_float('DB_POOL_HEALTHCHECK_AFTER', 30.0),
+                    acquire_timeout=_env_float('DB_REPLICA_ACQUIRE_TIMEOUT', 1.0),
+                )
+    return _replica_pool
+
+
+def parse_lsn(value: Any) -> Optional[int]:
+    '''"16/B374D848" (pg_lsn text) to a comparable integer; None when malformed'''
+    high, sep, low = str(value or '').strip().partition('/')
+    try:
+        return (int(high, 16) << 32) + int(low, 16) if sep else None
+    except ValueError:
+        return None
+
+
+def read_position(event: Dict[str, Any]) -> Optional[int]:
+    '''The read-your-writes hint a client echoes back from an earlier write response'''
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    return parse_lsn(headers.get(READ_AFTER_HEADER.lower()))
+
+
+def write_position(conn: Any) -> Dict[str, str]:
+    '''
+    Response headers for a committed write: the primary's WAL position, which
+    the client sends back as X-Read-After so its next reads wait for (or skip)
+    the replica. Empty when no replica is configured.
+    '''
+    if get_replica_pool() is None:
+        return {}
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT pg_current_wal_lsn()::text AS lsn')
+        lsn = cur.fetchone()['lsn']
+        conn.commit()
+    finally:
+        cur.close()
+    return {READ_AFTER_HEADER: lsn, 'Access-Control-Expose-Headers': READ_AFTER_HEADER}
+
+
+def _check_replica(conn: Any) -> ReplicaStatus:
+    global _replica_status
+    cur = conn.cursor()
+    try:
+        cur.execute(REPLICA_STATUS_SQL)
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    _replica_status = ReplicaStatus(parse_lsn(row['replay_lsn']) or 0, float(row['lag_seconds']), time.monotonic())
+    return _replica_status
+
+
+def _primary_read_connection(reason: Optional[str]) -> Any:
+    if reason:
+        _replica_stats[reason] += 1
+    conn = get_connection()
+    conn.readonly = True
+    return conn
+
+
+def get_read_connection(min_position: Optional[int] = None) -> Any:
+    '''
+    A connection whose transactions begin READ ONLY, from the replica when one
+    is configured, reachable, within DB_REPLICA_MAX_LAG seconds and (given a
+    read-your-writes position) already replayed past min_position; from the
+    primary otherwise. Replica status is rechecked every
+    DB_REPLICA_CHECK_INTERVAL seconds, or sooner for a position beyond it.
+    '''
+    global _replica_unavailable_until
+    pool = get_replica_pool()
+    now = time.monotonic()
+    if pool is None:
+        return _primary_read_connection(None)
+    if now < _replica_unavailable_until:
+        return _primary_read_connection('primary_error')
+
+    max_lag = _env_float('DB_REPLICA_MAX_LAG', 5.0)
+    status = _replica_status
+    fresh = status is not None and now - status.checked_at < _env_float('DB_REPLICA_CHECK_INTERVAL', 1.0)
+    if fresh and status.lag_seconds > max_lag:
+        return _primary_read_connection('primary_lag')
+    if fresh and min_position is not None and status.replay_lsn < min_position:
+        fresh = False
+
+    try:
+        conn = pool.getconn()
+    except Exception:
+        _replica_unavailable_until = now + _env_float('DB_REPLICA_RETRY_AFTER', 10.0)
+        return _primary_read_connection('primary_error')
+    conn.readonly = True
+    if not fresh:
+        try:
+            status = _check_replica(conn)
+        except Exception:
+            pool.putconn(conn, discard=True)
+            _replica_unavailable_until = now + _env_float('DB_REPLICA_RETRY_AFTER', 10.0)
+            return _primary_read_connection('primary_error')
+        reason = None
+        if status.lag_seconds > max_lag:
+            reason = 'primary_lag'
+        elif min_position is not None and status.replay_lsn < min_position:
+            reason = 'primary_position'
+        if reason:
+            pool.putconn(conn)
+            return _primary_read_connection(reason)
+    _replica_stats['replica'] += 1
+    return conn
+
+
+def replica_stats() -> Dict[str, Any]:
+    result: Dict[str, Any] = dict(_replica_stats)
+    result['configured'] = get_replica_pool() is not None
+    if _replica_status is not None:
+        result['lag_seconds'] = _replica_status.lag_seconds
+    return result
+
+
+def pool_stats() -> Dict[str, Any]:
+    return get_pool().stats()
+
+
+def tuple_cursor(conn: Any, name: Optional[str] = None) -> Any:
+    return conn.cursor(name=name, cursor_factory=_cursor_classes.get('tuple') or _driver().extensions.cursor)
+
+
+def execute_values(cur: Any, sql: str, argslist: Any, **kwargs: Any) -> Any:
+    return _driver().extras.execute_values(cur, sql, argslist, **kwargs)
@@ -0,0 +1,85 @@
+'''
+Business: LISTEN/NOTIFY helpers for long-polling on per-topic change channels
+Args: topic id, LIVE_MAX_WAIT env (seconds)
+Returns: whether a change notification arrived before the timeout
+'''
+import contextlib
+import os
+import select
+import threading
+import time
+from typing import Any, Iterator
+
+from shared import db, tracing
+
+LIVE_MAX_WAIT = float(os.environ.get('LIVE_MAX_WAIT', '25'))
+
+_local = threading.local()
+
+
+def topic_channel(topic_id: Any) -> str:
+    return 'topic_changes_%d' % int(topic_id)
+
+
+def parse_wait(value: Any) -> float:
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return max(0.0, min(seconds, LIVE_MAX_WAIT))
+
+
+def _listen_connection(fresh: bool = False) -> Any:
+    # A waiter must not hold one of the few pooled connections for up to
+    # LIVE_MAX_WAIT: each thread of a warm instance keeps an autocommit
+    # connection of its own for LISTEN, outside the pool.
+    conn = getattr(_local, 'conn', None)
+    if fresh and conn is not None:
+        conn.close()
+    if fresh or conn is None or conn.closed:
+        conn = db._driver().connect(db.get_pool().dsn)
+        conn.autocommit = True
+        _local.conn = conn
+    return conn
+
+
+def _execute(conn: Any, sql: str) -> None:
+    cur = conn.cursor()
+    cur.execute(sql)
+    cur.close()
+
+
+@contextlib.contextmanager
+def listening(channel: str) -> Iterator[Any]:
+    '''LISTENs on channel for the duration of the block; yields the connection to wait() on'''
+    conn = _listen_connection()
+    try:
+        _execute(conn, 'LISTEN ' + channel)
+    except db._driver().OperationalError:
+        # The server dropped the idle connection since the last poll
+        conn = _listen_connection(fresh=True)
+        _execute(conn, 'LISTEN ' + channel)
+    try:
+        yield conn
+    finally:
+        try:
+            _execute(conn, 'UNLISTEN *')
+            del conn.notifies[:]
+        except Exception:
+            conn.close()
+
+
+def wait(conn: Any, channel: str, timeout: float) -> bool:
+    # The listening connection is in autocommit: an idle-in-transaction waiter
+    # would pin the snapshot xmin that change cursors are derived from.
+    deadline = time.monotonic() + timeout
+    while True:
+        conn.poll()
+        if any(n.channel == channel for n in conn.notifies):
+            del conn.notifies[:]
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        with tracing.idle():
+            select.select([conn], [], [], remaining)
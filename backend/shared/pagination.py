@@ -0,0 +1,76 @@
+'''
+Business: Opaque keyset-pagination cursors and page-size parsing
+Args: sort-key tuples taken from the last row of a page
+Returns: url-safe cursor strings and decoded sort-key lists
+'''
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+# Sort-key types for decode_cursor; bool is an int to isinstance, so ids exclude it
+INT = 'int'
+NUMBER = 'number'
+TIMESTAMP = 'timestamp'
+FLAG = 'flag'
+TEXT = 'text'
+
+
+def _has_type(value: Any, kind: str) -> bool:
+    if kind == INT:
+        return isinstance(value, int) and not isinstance(value, bool)
+    if kind == NUMBER:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if kind == TIMESTAMP:
+        return isinstance(value, datetime)
+    if kind == FLAG:
+        return isinstance(value, bool)
+    return isinstance(value, str)
+
+
+def decode_cursor(cursor: str, size: int, types: Optional[Sequence[str]] = None) -> List[Any]:
+    '''
+    Decodes a cursor of size values; with types, each value must also match
+    its sort key (cursors come from the client and go straight into SQL).
+    '''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(values, list) or len(values) != size:
+            raise InvalidCursor('Invalid cursor')
+        decoded = [_decode_value(v) for v in values]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+    if types and not all(_has_type(value, kind) for value, kind in zip(decoded, types)):
+        raise InvalidCursor('Invalid cursor')
+    return decoded
+
+
+def parse_limit(value: Optional[str], default: int, maximum: int) -> int:
+    try:
+        limit = int(value) if value else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
@@ -0,0 +1,291 @@
+'''
+Business: Token-bucket rate limiting per route and method, keyed on the signed-in user and the caller's IP
+Args: RATE_LIMIT_BACKEND (memory, postgres, redis, none), RATE_LIMITS, RATE_LIMIT_IP_FACTOR, RATE_LIMIT_MAX_KEYS, REDIS_URL env; handlers opt in with @ratelimit.limited(route)
+Returns: 429 with Retry-After before the handler touches the database, otherwise the handler's response
+'''
+import functools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from shared import db, http, sessions
+
+RATE_LIMIT_IP_FACTOR = float(os.environ.get('RATE_LIMIT_IP_FACTOR', '4'))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000'))
+# Idle buckets older than this are full again and can be dropped
+BUCKET_TTL_SECONDS = 3600
+EXPIRE_BATCH_SIZE = 10000
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+
+class Rule(NamedTuple):
+    capacity: float
+    period: float
+
+    @property
+    def rate(self) -> float:
+        '''Tokens refilled per second'''
+        return self.capacity / self.period
+
+
+# Writes that cost several round trips, logins, and search (the most
+# expensive read). Override with RATE_LIMITS="posts:POST=10/60,search:GET=off".
+DEFAULT_RULES: Dict[Tuple[str, str], Rule] = {
+    ('auth', 'POST'): Rule(10, 60),
+    ('topics', 'POST'): Rule(5, 60),
+    ('topics', 'PUT'): Rule(20, 60),
+    ('posts', 'POST'): Rule(10, 60),
+    ('posts', 'PUT'): Rule(20, 60),
+    ('likes', 'POST'): Rule(60, 60),
+    ('messages', 'POST'): Rule(20, 60),
+    ('messages', 'PUT'): Rule(60, 60),
+    ('search', 'GET'): Rule(30, 60),
+}
+
+
+def parse_rules(spec: str, defaults: Dict[Tuple[str, str], Rule]) -> Dict[Tuple[str, str], Rule]:
+    rules = dict(defaults)
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        target, _, value = item.partition('=')
+        route, _, method = target.strip().partition(':')
+        key = (route, method.upper())
+        if value.strip() == 'off':
+            rules.pop(key, None)
+            continue
+        capacity, _, period = value.partition('/')
+        rules[key] = Rule(float(capacity), float(period or 60))
+    return rules
+
+
+RULES = parse_rules(os.environ.get('RATE_LIMITS', ''), DEFAULT_RULES)
+
+
+class MemoryBackend:
+    '''Buckets of this warm instance; least recently used keys are dropped past max_keys'''
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: Rule) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (rule.capacity, now))
+            tokens = min(rule.capacity, tokens + (now - updated) * rule.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rule.rate
+            self._buckets[key] = (tokens - 1 if tokens >= 1 else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+# The bucket row is locked, refilled and charged in one statement; the
+# pre-charge level comes back so the caller can tell a refusal from a take.
+TAKE_TOKEN_SQL = '''
+    WITH prev AS (
+        SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = %(key)s FOR UPDATE
+    ),
+    state AS (
+        SELECT LEAST(
+            %(capacity)s,
+            COALESCE(
+                (SELECT tokens + %(rate)s * EXTRACT(EPOCH FROM now() - updated_at) FROM prev),
+                %(capacity)s
+            )
+        ) AS available
+    ),
+    saved AS (
+        INSERT INTO rate_limit_buckets (key, tokens, updated_at)
+        SELECT %(key)s, CASE WHEN available >= 1 THEN available - 1 ELSE available END, now()
+        FROM state
+        ON CONFLICT (key) DO UPDATE SET tokens = EXCLUDED.tokens, updated_at = EXCLUDED.updated_at
+    )
+    SELECT available FROM state
+'''
+
+
+class PostgresBackend:
+    '''
+    Buckets shared by all instances in an UNLOGGED table: one short statement
+    on a pooled connection, which the handler then reuses.
+    '''
+
+    def take(self, key: str, rule: Rule) -> float:
+        conn = db.get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(TAKE_TOKEN_SQL, {'key': key, 'capacity': rule.capacity, 'rate': rule.rate})
+            available = float(cur.fetchone()['available'])
+            cur.close()
+            conn.commit()
+        finally:
+            db.release_connection(conn)
+        return 0.0 if available >= 1 else (1 - available) / rule.rate
+
+
+# Same algorithm as MemoryBackend, atomically on the Redis server and on its clock
+TAKE_TOKEN_LUA = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+'''
+
+
+class RedisBackend:
+    def __init__(self, redis: Any, url: str) -> None:
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2)
+        self.script = self.client.register_script(TAKE_TOKEN_LUA)
+        self.error = redis.RedisError
+
+    def take(self, key: str, rule: Rule) -> float:
+        try:
+            return float(self.script(keys=['forum:ratelimit:' + key], args=[rule.capacity, rule.rate]))
+        except self.error:
+            return 0.0
+
+
+def _create_backend() -> Optional[Any]:
+    kind = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    if kind == 'none':
+        return None
+    if kind == 'postgres':
+        return PostgresBackend()
+    if kind == 'redis' and os.environ.get('REDIS_URL'):
+        try:
+            import redis
+        except ImportError:
+            return MemoryBackend(RATE_LIMIT_MAX_KEYS)
+        return RedisBackend(redis, os.environ['REDIS_URL'])
+    return MemoryBackend(RATE_LIMIT_MAX_KEYS)
+
+
+_backend = _create_backend()
+
+
+def client_ip(event: Dict[str, Any]) -> Optional[str]:
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    # Earlier hops are whatever the client sent; only the last one was
+    # appended by the gateway in front of us
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    forwarded = headers.get('x-forwarded-for', '').split(',')[-1].strip()
+    return forwarded or None
+
+
+def session_user_id(token: str) -> Optional[Any]:
+    '''
+    The user behind a session token, from the session cache or one lookup on
+    a pooled connection (which the handler then reuses, and whose resolve()
+    is a cache hit afterwards). None for unknown tokens and on errors.
+    '''
+    user = sessions.cached(token)
+    if user is None:
+        try:
+            conn = db.get_connection()
+        except Exception:
+            return None
+        try:
+            cur = conn.cursor()
+            user = sessions.resolve(cur, token)
+            cur.close()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+        finally:
+            db.release_connection(conn)
+    return user['id'] if user else None
+
+
+def caller_keys(event: Dict[str, Any]) -> List[Tuple[str, float]]:
+    '''
+    (bucket key, capacity factor) pairs. Signed-in callers are charged per
+    user, so signing in again does not refill their bucket; unknown tokens
+    get no user bucket, and the per-IP bucket applies to everyone, so
+    rotating made-up tokens does not escape it. Nothing else the client
+    sends names a bucket, or anyone could drain someone else's. Callers with
+    neither share one anonymous bucket.
+    '''
+    keys: List[Tuple[str, float]] = []
+    token = sessions.token_from_event(event)
+    user_id = session_user_id(token) if token else None
+    if user_id is not None:
+        keys.append(('user:%s' % user_id, 1.0))
+    ip = client_ip(event)
+    if ip:
+        keys.append(('ip:' + ip, RATE_LIMIT_IP_FACTOR))
+    if not keys:
+        keys.append(('anon', RATE_LIMIT_IP_FACTOR))
+    return keys
+
+
+def check(route: str, event: Dict[str, Any]) -> float:
+    '''
+    Seconds until the caller may retry; 0 when a token was taken from every
+    bucket. Buckets after the first refusal are not charged.
+    '''
+    method = event.get('httpMethod', 'GET')
+    rule = RULES.get((route, method))
+    if rule is None or _backend is None:
+        return 0.0
+    for identity, factor in caller_keys(event):
+        key = '%s:%s:%s' % (route, method, identity)
+        try:
+            wait = _backend.take(key, Rule(rule.capacity * factor, rule.period))
+        except Exception:
+            # Fail open: a broken limiter store must not take the forum down
+            continue
+        if wait > 0:
+            return wait
+    return 0.0
+
+
+def too_many_requests(wait: float) -> Dict[str, Any]:
+    return http.error(429, 'Too many requests', headers={
+        'Retry-After': str(max(1, math.ceil(wait))),
+        'Access-Control-Expose-Headers': 'Retry-After'
+    })
+
+
+def limited(route: str) -> Callable[[Handler], Handler]:
+    '''Handler decorator: answers 429 for callers over the route's budget without running the handler'''
+    def decorate(handler: Handler) -> Handler:
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            wait = check(route, event)
+            if wait > 0:
+                return too_many_requests(wait)
+            return handler(event, context)
+        return wrapper
+    return decorate
+
+
+def expire_buckets(cur: Any) -> int:
+    '''Drops idle rows of the shared (postgres) store; a missing bucket is a full one'''
+    cur.execute('''
+        DELETE FROM rate_limit_buckets
+        WHERE key IN (
+            SELECT key FROM rate_limit_buckets
+            WHERE updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            LIMIT %s
+        )
+    ''', (BUCKET_TTL_SECONDS, EXPIRE_BATCH_SIZE))
+    return cur.rowcount
@@ -1,177 +1,549 @@
 '''
 Business: Manage forum topics (list, create, update, view)
-Args: event with httpMethod, body, queryStringParameters
-Returns: HTTP response with topics data
+Args: event with httpMethod, body, queryStringParameters (category_id or id, cursor, limit, sort=hot for the trending feed, the session token for liked_post_ids; since and wait for incremental updates)
+Returns: HTTP response with topics data; topic views carry X-Changes-Cursor for the since feed
 '''
 import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from typing import Dict, Any, List, Optional, Tuple
+import sys
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+# Deployed functions carry their own copy of shared (tools/vendor_shared.py)
+sys.path.insert(0, FUNCTION_DIR if os.path.isdir(os.path.join(FUNCTION_DIR, 'shared')) else os.path.join(FUNCTION_DIR, '..'))
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'GET')
+from shared import authors, cache, conditional, counters, db, encoding, http, likes, live, pagination, ratelimit, sessions, tracing, trending, views
+
+TOPICS_PAGE_SIZE = 50
+TOPICS_PAGE_SIZE_MAX = 100
+POSTS_PAGE_SIZE = 100
+POSTS_PAGE_SIZE_MAX = 500
+POSTS_FETCH_BATCH = 100
+
+def get_topic(
+    conn: Any,
+    topic_id: str,
+    posts_cursor: Optional[List[Any]],
+    posts_limit: int,
+    viewer_id: Optional[Any] = None,
+    author_generation: Optional[int] = None
+) -> Dict[str, Any]:
+    page_query = '''
+        SELECT 
+            p.id, p.topic_id, p.user_id, p.content, p.likes_count,
+            p.created_at, p.updated_at
+        FROM posts p
+        WHERE p.topic_id = %s
+    '''
+    posts_params: list = [topic_id]
+    if posts_cursor:
+        page_query += ' AND (p.created_at, p.id) > (%s, %s)'
+        posts_params.extend(posts_cursor)
+    page_query += ' ORDER BY p.created_at ASC, p.id ASC LIMIT %s'
+    posts_params.append(posts_limit + 1)
     
-    if method == 'OPTIONS':
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT 
+            t.id, t.category_id, t.user_id, t.title, t.content,
+            t.is_pinned, t.is_locked, t.views_count, t.replies_count,
+            t.created_at, t.updated_at,
+            txid_snapshot_xmin(txid_current_snapshot()) as changes_txid
+        FROM topics t
+        WHERE t.id = %s
+    ''', (topic_id,))
+    topic = cur.fetchone()
+    
+    if not topic:
+        cur.close()
         return {
-            'statusCode': 200,
+            'statusCode': 404,
             'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             },
-            'body': ''
+            'isBase64Encoded': False,
+            'body': json.dumps(None)
         }
     
+    profiles = authors.lookup(cur, [topic['user_id']], author_generation)
+    authors.attach(topic, profiles)
+    
+    posts_query = '''
+        WITH page AS (''' + page_query + '''),
+        page_attachments AS (
+            SELECT 
+                a.post_id,
+                json_agg(json_build_object(
+                    'id', a.id,
+                    'file_url', a.file_url,
+                    'file_type', a.file_type,
+                    'file_name', a.file_name,
+                    'file_size', a.file_size
+                ) ORDER BY a.id) AS attachments
+            FROM attachments a
+            WHERE a.post_id IN (SELECT id FROM page)
+            GROUP BY a.post_id
+        )
+        SELECT page.*, COALESCE(pa.attachments, '[]'::json) AS attachments
+        FROM page
+        LEFT JOIN page_attachments pa ON pa.post_id = page.id
+        ORDER BY page.created_at ASC, page.id ASC
+    '''
+    
+    changes_cursor = pagination.encode_cursor([topic.pop('changes_txid'), 0])
+    
+    posts_cur = db.tuple_cursor(conn, 'topic_posts')
+    posts_cur.itersize = POSTS_FETCH_BATCH
+    posts_cur.execute(posts_query, posts_params)
+    window = encoding.PageWindow(
+        authors.attach_batched(
+            cur, encoding.named_rows(posts_cur), profiles, POSTS_FETCH_BATCH, generation=author_generation
+        ),
+        posts_limit
+    )
+    page_post_ids: List[int] = []
+    
+    def decorate_post(post: Dict[str, Any]) -> Dict[str, Any]:
+        page_post_ids.append(post['id'])
+        return post
+    
+    body = encoding.dumps_with_array(topic, 'posts', window, decorate_post)
+    posts_cur.close()
+    
+    if viewer_id:
+        liked = likes.liked_post_ids(cur, viewer_id, post_ids=page_post_ids)
+        body = encoding.append_field(body, 'liked_post_ids', liked)
+    cur.close()
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor, X-Changes-Cursor',
+        'X-Changes-Cursor': changes_cursor
+    }
+    if window.has_more:
+        headers['X-Next-Cursor'] = pagination.encode_cursor(
+            [window.last['created_at'], window.last['id']]
+        )
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'isBase64Encoded': False,
+        'body': body
+    }
+
+def get_topic_changes(cur: Any, topic_id: str, since: List[Any], limit: int) -> Tuple[Dict[str, Any], int]:
+    '''The since feed response and how many changes it carries'''
+    cur.execute('''
+        WITH snapshot AS (
+            SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin
+        ),
+        changed AS (
+            SELECT
+                p.id, p.topic_id, p.user_id, p.content, p.likes_count,
+                p.created_at, p.updated_at, p.created_txid, p.change_txid
+            FROM posts p
+            WHERE p.topic_id = %(topic_id)s
+              AND (p.change_txid, p.id) > (%(since_txid)s, %(since_id)s)
+            ORDER BY p.change_txid ASC, p.id ASC
+            LIMIT %(limit)s
+        ),
+        changed_attachments AS (
+            SELECT 
+                a.post_id,
+                json_agg(json_build_object(
+                    'id', a.id,
+                    'file_url', a.file_url,
+                    'file_type', a.file_type,
+                    'file_name', a.file_name,
+                    'file_size', a.file_size
+                ) ORDER BY a.id) AS attachments
+            FROM attachments a
+            WHERE a.post_id IN (SELECT id FROM changed WHERE created_txid >= %(since_txid)s)
+            GROUP BY a.post_id
+        )
+        SELECT 
+            c.*,
+            c.created_txid >= %(since_txid)s AS is_new,
+            COALESCE(ca.attachments, '[]'::json) AS attachments,
+            snapshot.xmin AS snapshot_xmin
+        FROM changed c
+        CROSS JOIN snapshot
+        LEFT JOIN changed_attachments ca ON ca.post_id = c.id
+        ORDER BY c.change_txid ASC, c.id ASC
+    ''', {
+        'topic_id': topic_id,
+        'since_txid': since[0],
+        'since_id': since[1],
+        'limit': limit + 1
+    })
+    rows = cur.fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        snapshot_xmin = rows[0]['snapshot_xmin']
+    else:
+        cur.execute('SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin')
+        snapshot_xmin = cur.fetchone()['xmin']
+    
+    # Transactions below the snapshot xmin have all finished, so nothing can
+    # still appear behind that mark; on the last page the cursor stops there
+    # and rows at or above it may be sent twice. A full page moves past its
+    # last row instead, or a batch wider than the page would never drain.
+    if has_more:
+        next_cursor = [rows[-1]['change_txid'], rows[-1]['id']]
+    else:
+        next_cursor = max(since, [snapshot_xmin, 0])
+    
+    profiles = authors.lookup(cur, [row['user_id'] for row in rows if row['is_new']])
+    posts = []
+    like_counts = []
+    for row in rows:
+        post = dict(row)
+        for key in ('is_new', 'snapshot_xmin', 'created_txid', 'change_txid'):
+            post.pop(key)
+        if row['is_new']:
+            posts.append(authors.attach(post, profiles))
+        else:
+            like_counts.append({'id': post['id'], 'likes_count': post['likes_count']})
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': False,
+        'body': encoding.dumps({
+            'posts': posts,
+            'likes': like_counts,
+            'cursor': pagination.encode_cursor(next_cursor),
+            'has_more': has_more
+        })
+    }, len(rows)
+
+def fetch_topic_changes(topic_id: str, since: List[Any], limit: int) -> Tuple[Dict[str, Any], int]:
+    # Long-polls must see the newest changes, so they read the primary
+    conn = db.get_connection()
     try:
-        conn = get_db_connection()
         cur = conn.cursor()
+        changes = get_topic_changes(cur, topic_id, since, limit)
+        cur.close()
+        conn.commit()
+        return changes
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db.release_connection(conn)
+
+def poll_topic_changes(topic_id: str, since: List[Any], limit: int, wait_seconds: float) -> Dict[str, Any]:
+    '''
+    Pooled connections are only held while querying: the wait happens on the
+    dedicated LISTEN connection, which is listening before the first query so
+    a change committed in between still wakes it.
+    '''
+    if wait_seconds <= 0:
+        return fetch_topic_changes(topic_id, since, limit)[0]
+    
+    channel = live.topic_channel(topic_id)
+    with live.listening(channel) as listener:
+        response, count = fetch_topic_changes(topic_id, since, limit)
+        if not count and live.wait(listener, channel, wait_seconds):
+            response, count = fetch_topic_changes(topic_id, since, limit)
+    return response
+
+def list_topics(
+    cur: Any,
+    category_id: Optional[str],
+    cursor: Optional[List[Any]],
+    limit: int,
+    author_generation: Optional[int] = None
+) -> Dict[str, Any]:
+    conditions = []
+    query_params: list = []
+    if category_id:
+        conditions.append('t.category_id = %s')
+        query_params.append(category_id)
+    if cursor:
+        conditions.append('(t.is_pinned, t.updated_at, t.id) < (%s, %s, %s)')
+        query_params.extend(cursor)
+    
+    query = '''
+        SELECT 
+            t.id, t.category_id, t.user_id, t.title,
+            t.is_pinned, t.is_locked, t.views_count, t.replies_count,
+            t.created_at, t.updated_at
+        FROM topics t
+    '''
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY t.is_pinned DESC, t.updated_at DESC, t.id DESC LIMIT %s'
+    query_params.append(limit + 1)
+    cur.execute(query, query_params)
+    
+    topics = cur.fetchall()
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor'
+    }
+    if len(topics) > limit:
+        topics = topics[:limit]
+        last = topics[-1]
+        headers['X-Next-Cursor'] = pagination.encode_cursor(
+            [last['is_pinned'], last['updated_at'], last['id']]
+        )
+    
+    profiles = authors.lookup(cur, [t['user_id'] for t in topics], author_generation)
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'isBase64Encoded': False,
+        'body': encoding.dumps([authors.attach(t, profiles, authors.LIST_AUTHOR_FIELDS) for t in topics])
+    }
+
+def list_hot_topics(
+    cur: Any,
+    category_id: Optional[str],
+    cursor: Optional[List[Any]],
+    limit: int,
+    author_generation: Optional[int] = None
+) -> Dict[str, Any]:
+    conditions = []
+    query_params: list = []
+    if category_id:
+        conditions.append('s.category_id = %s')
+        query_params.append(category_id)
+    if cursor:
+        conditions.append('(s.score_log, s.topic_id) < (%s, %s)')
+        query_params.extend(cursor)
+    
+    query = '''
+        SELECT 
+            t.id, t.category_id, t.user_id, t.title,
+            t.is_pinned, t.is_locked, t.views_count, t.replies_count,
+            t.created_at, t.updated_at,
+            s.score_log, ''' + trending.current_score_sql('s.score_log') + ''' AS hot_score
+        FROM topic_scores s
+        JOIN topics t ON t.id = s.topic_id
+    '''
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY s.score_log DESC, s.topic_id DESC LIMIT %s'
+    query_params.append(limit + 1)
+    cur.execute(query, query_params)
+    
+    topics = cur.fetchall()
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor'
+    }
+    if len(topics) > limit:
+        topics = topics[:limit]
+        last = topics[-1]
+        headers['X-Next-Cursor'] = pagination.encode_cursor([last['score_log'], last['id']])
+    for topic in topics:
+        del topic['score_log']
+    
+    profiles = authors.lookup(cur, [t['user_id'] for t in topics], author_generation)
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'isBase64Encoded': False,
+        'body': encoding.dumps([authors.attach(t, profiles, authors.LIST_AUTHOR_FIELDS) for t in topics])
+    }
+
+@tracing.traced('topics')
+@ratelimit.limited('topics')
+@encoding.negotiated
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return http.preflight('topics')
+    
+    try:
         params = event.get('queryStringParameters', {}) or {}
         
+        # The since feed takes its own connections (see poll_topic_changes)
+        if method == 'GET' and params.get('id') and params.get('since'):
+            topic_id = params['id']
+            if not topic_id.isdigit():
+                return http.error(400, 'Invalid topic id')
+            try:
+                since = pagination.decode_cursor(params['since'], 2, (pagination.INT, pagination.INT))
+            except pagination.InvalidCursor:
+                return http.error(400, 'Invalid since cursor')
+            limit = pagination.parse_limit(params.get('limit'), POSTS_PAGE_SIZE, POSTS_PAGE_SIZE_MAX)
+            
+            return poll_topic_changes(topic_id, since, limit, live.parse_wait(params.get('wait')))
+        
+        if method == 'GET':
+            conn = db.get_read_connection(db.read_position(event))
+        else:
+            conn = db.get_connection()
+        cur = conn.cursor()
+        
         if method == 'GET':
             topic_id = params.get('id')
             category_id = params.get('category_id')
             
             if topic_id:
-                cur.execute('''
-                    UPDATE topics SET views_count = views_count + 1 
-                    WHERE id = %s
-                ''', (topic_id,))
+                try:
+                    posts_cursor = pagination.decode_cursor(
+                        params['cursor'], 2, (pagination.TIMESTAMP, pagination.INT)
+                    ) if params.get('cursor') else None
+                except pagination.InvalidCursor:
+                    return http.error(400, 'Invalid cursor')
+                posts_limit = pagination.parse_limit(params.get('limit'), POSTS_PAGE_SIZE, POSTS_PAGE_SIZE_MAX)
                 
-                cur.execute('''
-                    SELECT 
-                        t.*,
-                        u.username as author_name,
-                        u.avatar_url as author_avatar,
-                        u.role as author_role,
-                        u.posts_count as author_posts
-                    FROM topics t
-                    LEFT JOIN users u ON t.user_id = u.id
-                    WHERE t.id = %s
-                ''', (topic_id,))
-                topic = cur.fetchone()
-                
-                cur.execute('''
-                    SELECT 
-                        p.*,
-                        u.username as author_name,
-                        u.avatar_url as author_avatar,
-                        u.role as author_role,
-                        u.posts_count as author_posts
-                    FROM posts p
-                    LEFT JOIN users u ON p.user_id = u.id
-                    WHERE p.topic_id = %s
-                    ORDER BY p.created_at ASC
-                ''', (topic_id,))
-                posts = cur.fetchall()
+                # Liked flags are private: the viewer comes from the session. A
+                # token the replica does not know yet just reads anonymously.
+                claimed_viewer_id = params.get('user_id')
+                token = sessions.token_from_event(event)
+                viewer = sessions.resolve(cur, token) if token else None
+                if viewer and claimed_viewer_id and str(claimed_viewer_id) != str(viewer['id']):
+                    return http.error(403, 'user_id does not match the session')
+                if viewer:
+                    viewer_id = viewer['id']
+                else:
+                    viewer_id = claimed_viewer_id if sessions.ALLOW_BODY_USER_ID else None
+                scopes = cache.topic_view_scopes(topic_id) + [cache.AUTHORS_SCOPE]
+                if viewer_id:
+                    scopes += cache.user_likes_scopes(viewer_id)
                 
+                response = conditional.conditional_get(
+                    event,
+                    cur,
+                    'topics:view',
+                    {'id': topic_id, 'cursor': params.get('cursor'), 'limit': posts_limit, 'user_id': viewer_id},
+                    scopes,
+                    lambda versions: get_topic(
+                        conn, topic_id, posts_cursor, posts_limit, viewer_id, versions[cache.AUTHORS_SCOPE]
+                    ),
+                    private=bool(viewer_id)
+                )
                 conn.commit()
                 
-                result = dict(topic) if topic else None
-                if result:
-                    result['posts'] = [dict(p) for p in posts]
+                if response['statusCode'] in (200, 304):
+                    views.record_view(int(topic_id))
+                    views.maybe_flush(conn)
                 
-                return {
-                    'statusCode': 200 if result else 404,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'isBase64Encoded': False,
-                    'body': json.dumps(result, default=str)
-                }
-            
-            query = '''
-                SELECT 
-                    t.*,
-                    u.username as author_name,
-                    u.avatar_url as author_avatar,
-                    u.role as author_role
-                FROM topics t
-                LEFT JOIN users u ON t.user_id = u.id
-            '''
-            
-            if category_id:
-                query += ' WHERE t.category_id = %s'
-                query += ' ORDER BY t.is_pinned DESC, t.updated_at DESC'
-                cur.execute(query, (category_id,))
-            else:
-                query += ' ORDER BY t.is_pinned DESC, t.updated_at DESC'
-                cur.execute(query)
+                return response
+            
+            if params.get('sort') == 'hot':
+                try:
+                    cursor = pagination.decode_cursor(
+                        params['cursor'], 2, (pagination.NUMBER, pagination.INT)
+                    ) if params.get('cursor') else None
+                except pagination.InvalidCursor:
+                    return http.error(400, 'Invalid cursor')
+                limit = pagination.parse_limit(params.get('limit'), TOPICS_PAGE_SIZE, TOPICS_PAGE_SIZE_MAX)
+                
+                response = conditional.conditional_get(
+                    event,
+                    cur,
+                    'topics:hot',
+                    {'category_id': category_id, 'cursor': params.get('cursor'), 'limit': limit},
+                    [cache.HOT_TOPICS_SCOPE] + cache.topic_list_scopes(category_id) + [cache.AUTHORS_SCOPE],
+                    lambda versions: list_hot_topics(cur, category_id, cursor, limit, versions[cache.AUTHORS_SCOPE])
+                )
+                conn.commit()
+                
+                return response
             
-            topics = cur.fetchall()
+            if params.get('sort') not in (None, '', 'recent'):
+                return http.error(400, 'sort must be hot or recent')
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps([dict(t) for t in topics], default=str)
-            }
+            try:
+                cursor = pagination.decode_cursor(
+                    params['cursor'], 3, (pagination.FLAG, pagination.TIMESTAMP, pagination.INT)
+                ) if params.get('cursor') else None
+            except pagination.InvalidCursor:
+                return http.error(400, 'Invalid cursor')
+            limit = pagination.parse_limit(params.get('limit'), TOPICS_PAGE_SIZE, TOPICS_PAGE_SIZE_MAX)
+            
+            response = conditional.conditional_get(
+                event,
+                cur,
+                'topics:list',
+                {'category_id': category_id, 'cursor': params.get('cursor'), 'limit': limit},
+                cache.topic_list_scopes(category_id) + [cache.AUTHORS_SCOPE],
+                lambda versions: list_topics(cur, category_id, cursor, limit, versions[cache.AUTHORS_SCOPE])
+            )
+            conn.commit()
+            
+            return response
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
-            user_id = body_data.get('user_id')
             category_id = body_data.get('category_id')
             title = body_data.get('title', '')
             content = body_data.get('content', '')
+            user_id, auth_error = sessions.authenticate(cur, event, body_data.get('user_id'))
+            
+            if auth_error:
+                return http.error(401, auth_error)
             
             if not all([user_id, category_id, title, content]):
-                return {
-                    'statusCode': 400,
-                    'headers': {'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Missing required fields'})
-                }
+                return http.error(400, 'Missing required fields')
             
-            cur.execute('''
+            cur.execute((counters.DEFER_TRIGGERS_SQL if counters.post_counters_deferred() else '') + '''
                 INSERT INTO topics (category_id, user_id, title, content)
                 VALUES (%s, %s, %s, %s)
-                RETURNING *
+                RETURNING id, category_id, user_id, title, content, is_pinned, is_locked, views_count, replies_count, created_at, updated_at
             ''', (category_id, user_id, title, content))
             
             topic = cur.fetchone()
             
-            cur.execute('''
-                UPDATE users SET posts_count = posts_count + 1
-                WHERE id = %s
-            ''', (user_id,))
+            if counters.post_counters_deferred():
+                counters.stage(cur, 'users.posts_count', user_id)
+            else:
+                cur.execute('''
+                    UPDATE users SET posts_count = posts_count + 1
+                    WHERE id = %s
+                ''', (user_id,))
             
             conn.commit()
+            if counters.post_counters_deferred():
+                # The new topic is listed right away; the forums counts follow
+                # when the staged category_stats deltas are applied
+                cache.invalidate_committed(conn, cache.topic_list_scopes(category_id) + cache.topic_list_scopes(None))
+            else:
+                cache.invalidate_committed(conn, cache.topic_write_scopes(topic['id'], category_id))
+            authors.forget(user_id)
+            
+            headers = {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            }
+            headers.update(db.write_position(conn))
             
             return {
                 'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'headers': headers,
                 'isBase64Encoded': False,
-                'body': json.dumps(dict(topic), default=str)
+                'body': encoding.dumps(topic)
             }
         
         else:
-            return {
-                'statusCode': 405,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Method not allowed'})
-            }
+            return http.error(405, 'Method not allowed')
             
     except Exception as e:
         if 'conn' in locals():
             conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+        return http.error(500, str(e))
     finally:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            db.release_connection(conn)
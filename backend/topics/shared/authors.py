@@ -0,0 +1,145 @@
+'''
+Business: In-process author profile cache attached to topic and post rows
+Args: cursor, user ids of the rows on a page, the authors cache generation when the caller already read it, AUTHOR_CACHE_TTL and AUTHOR_CACHE_MAX env
+Returns: author_* fields keyed by user id; misses resolved with one batched users lookup
+'''
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from shared import cache
+
+AUTHOR_CACHE_TTL = float(os.environ.get('AUTHOR_CACHE_TTL', '60'))
+AUTHOR_CACHE_MAX = int(os.environ.get('AUTHOR_CACHE_MAX', '10000'))
+AUTHOR_FIELDS = ('author_name', 'author_avatar', 'author_role', 'author_posts')
+LIST_AUTHOR_FIELDS = ('author_name', 'author_avatar', 'author_role')
+
+
+class _Entry(NamedTuple):
+    expires_at: float
+    profile: Dict[str, Any]
+
+
+_cache: 'OrderedDict[int, _Entry]' = OrderedDict()
+_generation: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _sync_generation(cur: Any, version: Optional[int]) -> None:
+    # Profile edits bump the authors generation (see the users trigger);
+    # posts_count drift is bounded by AUTHOR_CACHE_TTL instead. Cached
+    # handlers already hold it from their conditional GET and pass it in.
+    global _generation
+    if version is None:
+        version = cache.generations(cur, [cache.AUTHORS_SCOPE])[cache.AUTHORS_SCOPE]
+    with _lock:
+        if version != _generation:
+            _cache.clear()
+            _generation = version
+
+
+def _cached(user_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    now = time.monotonic()
+    found = {}
+    with _lock:
+        for user_id in user_ids:
+            entry = _cache.get(user_id)
+            if entry is None:
+                continue
+            if entry.expires_at < now:
+                del _cache[user_id]
+                continue
+            _cache.move_to_end(user_id)
+            found[user_id] = entry.profile
+    return found
+
+
+def _store(profiles: Dict[int, Dict[str, Any]]) -> None:
+    expires_at = time.monotonic() + AUTHOR_CACHE_TTL
+    with _lock:
+        for user_id, profile in profiles.items():
+            _cache[user_id] = _Entry(expires_at, profile)
+            _cache.move_to_end(user_id)
+        while len(_cache) > AUTHOR_CACHE_MAX:
+            _cache.popitem(last=False)
+
+
+def lookup(cur: Any, user_ids: Iterable[Any], generation: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+    wanted = {int(user_id) for user_id in user_ids if user_id is not None}
+    if not wanted:
+        return {}
+    _sync_generation(cur, generation)
+    profiles = _cached(wanted)
+    missing = sorted(wanted - set(profiles))
+    if missing:
+        cur.execute('''
+            SELECT
+                id,
+                username as author_name,
+                avatar_url as author_avatar,
+                role as author_role,
+                posts_count as author_posts
+            FROM users
+            WHERE id = ANY(%s)
+        ''', (missing,))
+        loaded = {row['id']: {field: row[field] for field in AUTHOR_FIELDS} for row in cur.fetchall()}
+        _store(loaded)
+        profiles.update(loaded)
+    return profiles
+
+
+def attach_batched(
+    cur: Any,
+    rows: Iterable[Dict[str, Any]],
+    profiles: Dict[int, Dict[str, Any]],
+    batch_size: int,
+    fields: Sequence[str] = AUTHOR_FIELDS,
+    generation: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    '''
+    attach() over a stream of rows: authors missing from profiles are looked
+    up once per batch_size rows, so a streamed page needs no separate pass
+    for its author ids. cur must not be the cursor the rows come from.
+    Pass the authors generation the request already read, or every batch
+    with a miss reads it again.
+    '''
+    batch: List[Dict[str, Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield from _attach_batch(cur, batch, profiles, fields, generation)
+            batch = []
+    yield from _attach_batch(cur, batch, profiles, fields, generation)
+
+
+def _attach_batch(
+    cur: Any,
+    batch: List[Dict[str, Any]],
+    profiles: Dict[int, Dict[str, Any]],
+    fields: Sequence[str],
+    generation: Optional[int],
+) -> List[Dict[str, Any]]:
+    missing = [row['user_id'] for row in batch if row['user_id'] not in profiles]
+    if missing:
+        profiles.update(lookup(cur, missing, generation))
+    return [attach(row, profiles, fields) for row in batch]
+
+
+def attach(
+    row: Dict[str, Any],
+    profiles: Dict[int, Dict[str, Any]],
+    fields: Sequence[str] = AUTHOR_FIELDS,
+    key: str = 'user_id',
+    prefix: str = 'author_',
+) -> Dict[str, Any]:
+    profile = profiles.get(row.get(key)) or {}
+    for field in fields:
+        row[prefix + field[len('author_'):]] = profile.get(field)
+    return row
+
+
+def forget(user_id: Any) -> None:
+    with _lock:
+        _cache.pop(int(user_id), None)
@@ -0,0 +1,222 @@
+'''
+Business: Read-through response cache with generation-based invalidation
+Args: CACHE_BACKEND (memory, redis, none), CACHE_TTL, CACHE_MAX_ENTRIES, REDIS_URL env
+Returns: cached handler responses keyed on handler name, query params and scope versions
+'''
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+
+CACHE_TTL = float(os.environ.get('CACHE_TTL', '60'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '512'))
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    def __init__(self, redis: Any, url: str) -> None:
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2)
+        self.error = redis.RedisError
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.client.get('forum:' + key)
+        except self.error:
+            return None
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        try:
+            self.client.set('forum:' + key, value, ex=max(1, int(ttl)))
+        except self.error:
+            pass
+
+    def clear(self) -> None:
+        pass
+
+
+def _create_backend() -> Optional[Any]:
+    kind = os.environ.get('CACHE_BACKEND', 'memory')
+    if kind == 'none':
+        return None
+    if kind == 'redis' and os.environ.get('REDIS_URL'):
+        try:
+            import redis
+        except ImportError:
+            return MemoryBackend(CACHE_MAX_ENTRIES)
+        return RedisBackend(redis, os.environ['REDIS_URL'])
+    return MemoryBackend(CACHE_MAX_ENTRIES)
+
+
+_backend = _create_backend()
+_stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'stores': 0, 'bypassed': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        result: Dict[str, Any] = dict(_stats)
+    result['backend'] = type(_backend).__name__ if _backend else 'none'
+    result['evictions'] = _backend.evictions if _backend else 0
+    return result
+
+
+FORUMS_SCOPE = 'forums'
+TOPIC_SCOPE_PREFIX = 'topic:'
+USER_LIKES_SCOPE_PREFIX = 'user_likes:'
+AUTHORS_SCOPE = 'authors'
+HOT_TOPICS_SCOPE = 'topics:hot'
+
+
+def topic_list_scopes(category_id: Optional[Any]) -> List[str]:
+    return ['topics:%s' % category_id] if category_id else ['topics:all']
+
+
+def topic_view_scopes(topic_id: Any) -> List[str]:
+    return ['%s%s' % (TOPIC_SCOPE_PREFIX, topic_id)]
+
+
+def user_likes_scopes(user_id: Any) -> List[str]:
+    return ['%s%s' % (USER_LIKES_SCOPE_PREFIX, user_id)]
+
+
+def topic_write_scopes(topic_id: Any, category_id: Optional[Any]) -> List[str]:
+    scopes = topic_view_scopes(topic_id) + topic_list_scopes(None) + [FORUMS_SCOPE]
+    if category_id:
+        scopes += topic_list_scopes(category_id)
+    return scopes
+
+
+def scope_state(cur: Any, scopes: List[str]) -> Tuple[Dict[str, int], Optional[datetime]]:
+    cur.execute('''
+        SELECT scope, version, updated_at FROM cache_generations WHERE scope = ANY(%s)
+    ''', (scopes,))
+    rows = cur.fetchall()
+    found = {row['scope']: row['version'] for row in rows}
+    stamps = [row['updated_at'] for row in rows if row['updated_at'] is not None]
+    return {scope: found.get(scope, 0) for scope in scopes}, max(stamps) if stamps else None
+
+
+def generations(cur: Any, scopes: List[str]) -> Dict[str, int]:
+    return scope_state(cur, scopes)[0]
+
+
+def invalidate(cur: Any, scopes: Iterable[str]) -> None:
+    unique = sorted(set(scopes))
+    if not unique:
+        return
+    cur.execute('''
+        INSERT INTO cache_generations (scope, version, updated_at)
+        SELECT unnest(%s::varchar[]), 1, CURRENT_TIMESTAMP
+        ON CONFLICT (scope) DO UPDATE SET
+            version = cache_generations.version + 1,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (unique,))
+
+
+def invalidate_committed(conn: Any, scopes: Iterable[str]) -> None:
+    '''
+    Bumps the scopes in a transaction of their own once the caller's data is
+    committed, so the shared generation rows (topics:all, forums) are locked
+    for one statement rather than for the whole write. Readers in between see
+    the new data under the old generations, which is only a cache miss. If
+    the bump fails, ETags stay stale until the next write to those scopes
+    and cached bodies for at most CACHE_TTL.
+    '''
+    cur = conn.cursor()
+    try:
+        invalidate(cur, scopes)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        cur.close()
+
+
+def make_key(name: str, params: Dict[str, Any], versions: Dict[str, int]) -> str:
+    query = urlencode(sorted((k, str(v)) for k, v in params.items() if v is not None))
+    version_part = ','.join('%s=%d' % (s, v) for s, v in sorted(versions.items()))
+    return '%s?%s#%s' % (name, query, version_part)
+
+
+def cached_response(
+    cur: Any,
+    name: str,
+    params: Dict[str, Any],
+    scopes: List[str],
+    build: Callable[[Dict[str, int]], Dict[str, Any]],
+    versions: Optional[Dict[str, int]] = None,
+) -> Dict[str, Any]:
+    '''build gets the scope versions, so it need not read them again (e.g. the authors generation)'''
+    if versions is None:
+        versions = generations(cur, scopes)
+    if _backend is None:
+        _count('bypassed')
+        return build(versions)
+
+    key = make_key(name, params, versions)
+    cached = _backend.get(key)
+    if cached is not None:
+        _count('hits')
+        entry = json.loads(cached)
+        headers = dict(entry['headers'])
+        headers['X-Cache'] = 'HIT'
+        return {
+            'statusCode': entry['statusCode'],
+            'headers': headers,
+            'isBase64Encoded': False,
+            'body': entry['body']
+        }
+
+    _count('misses')
+    response = build(versions)
+    if response.get('statusCode') == 200:
+        _backend.set(key, json.dumps({
+            'statusCode': response['statusCode'],
+            'headers': response.get('headers', {}),
+            'body': response['body']
+        }), CACHE_TTL)
+        _count('stores')
+    response.setdefault('headers', {})['X-Cache'] = 'MISS'
+    return response
@@ -0,0 +1,90 @@
+'''
+Business: Conditional GET (ETag / Last-Modified / 304) for cached read handlers
+Args: request event, cache scopes the response depends on, HTTP_MAX_AGE env
+Returns: 304 responses for fresh client copies, otherwise the (cached) full response with validators
+'''
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from shared import cache
+
+HTTP_MAX_AGE = int(os.environ.get('HTTP_MAX_AGE', '0'))
+
+
+def request_headers(event: Dict[str, Any]) -> Dict[str, str]:
+    return {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+
+
+def make_etag(name: str, params: Dict[str, Any], versions: Dict[str, int]) -> str:
+    digest = hashlib.sha1(cache.make_key(name, params, versions).encode()).hexdigest()
+    return '"%s"' % digest[:32]
+
+
+def cache_control(private: bool = False) -> str:
+    visibility = 'private' if private else 'public'
+    if HTTP_MAX_AGE > 0:
+        return '%s, max-age=%d, must-revalidate' % (visibility, HTTP_MAX_AGE)
+    return '%s, no-cache' % visibility
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header.split(',')]
+    return any(tag[2:] == etag if tag.startswith('W/') else tag == etag for tag in candidates)
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    from email.utils import parsedate_to_datetime
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def is_fresh(headers: Dict[str, str], etag: str, last_modified: Optional[datetime]) -> bool:
+    if 'if-none-match' in headers:
+        return _etag_matches(headers['if-none-match'], etag)
+    if 'if-modified-since' in headers and last_modified is not None:
+        return _not_modified_since(headers['if-modified-since'], last_modified)
+    return False
+
+
+def conditional_get(
+    event: Dict[str, Any],
+    cur: Any,
+    name: str,
+    params: Dict[str, Any],
+    scopes: List[str],
+    build: Callable[[Dict[str, int]], Dict[str, Any]],
+    private: bool = False,
+) -> Dict[str, Any]:
+    from email.utils import format_datetime
+    versions, last_modified = cache.scope_state(cur, scopes)
+    etag = make_etag(name, params, versions)
+    validators = {
+        'ETag': etag,
+        'Cache-Control': cache_control(private),
+    }
+    if last_modified is not None:
+        validators['Last-Modified'] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+    if is_fresh(request_headers(event), etag, last_modified):
+        headers = {'Access-Control-Allow-Origin': '*'}
+        headers.update(validators)
+        return {
+            'statusCode': 304,
+            'headers': headers,
+            'isBase64Encoded': False,
+            'body': ''
+        }
+
+    response = cache.cached_response(cur, name, params, scopes, build, versions=versions)
+    if response.get('statusCode') == 200:
+        response['headers'].update(validators)
+    return response
@@ -0,0 +1,42 @@
+'''
+Business: Batch lookup of which posts a user has liked
+Args: cursor, user id and either explicit post ids or a topic id
+Returns: sorted list of liked post ids resolved with one indexed query
+'''
+from typing import Any, List, Optional, Sequence
+
+MAX_POST_IDS = 1000
+
+
+def parse_post_ids(raw: Optional[str]) -> List[int]:
+    if not raw:
+        return []
+    ids = sorted({int(part) for part in raw.split(',') if part.strip()})
+    if len(ids) > MAX_POST_IDS:
+        raise ValueError('Too many post ids')
+    return ids
+
+
+def liked_post_ids(
+    cur: Any,
+    user_id: Any,
+    post_ids: Optional[Sequence[int]] = None,
+    topic_id: Optional[Any] = None,
+) -> List[int]:
+    if post_ids:
+        cur.execute('''
+            SELECT post_id FROM likes
+            WHERE user_id = %s AND post_id = ANY(%s)
+            ORDER BY post_id
+        ''', (user_id, list(post_ids)))
+    elif topic_id:
+        cur.execute('''
+            SELECT l.post_id
+            FROM likes l
+            JOIN posts p ON p.id = l.post_id
+            WHERE l.user_id = %s AND p.topic_id = %s
+            ORDER BY l.post_id
+        ''', (user_id, topic_id))
+    else:
+        return []
+    return [row['post_id'] for row in cur.fetchall()]
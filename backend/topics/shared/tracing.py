@@ -0,0 +1,316 @@
+'''
+Business: Per-request SQL tracing for handlers: statement count, timings, rows and serialization time
+Args: QUERY_TRACE, QUERY_TRACE_LOG, SLOW_REQUEST_MS, EXPLAIN_SLOW, EXPLAIN_INTERVAL, STATS_LOG_INTERVAL, SERVER_TIMING env; handlers opt in with @tracing.traced(route)
+Returns: one structured JSON log line per request (slow ones with statements and EXPLAIN plans, periodically the instance's pool and cache counters), optional Server-Timing
+'''
+import contextlib
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from shared import db
+
+QUERY_TRACE = os.environ.get('QUERY_TRACE', '1') == '1'
+QUERY_TRACE_LOG = os.environ.get('QUERY_TRACE_LOG', '1') == '1'
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '500'))
+# EXPLAIN runs before the slow response is returned, on a primary connection:
+# opt-in, never waits for the pool, and at most once per EXPLAIN_INTERVAL seconds
+EXPLAIN_SLOW = os.environ.get('EXPLAIN_SLOW', '0') == '1'
+EXPLAIN_INTERVAL = float(os.environ.get('EXPLAIN_INTERVAL', '60'))
+# Pool, replica and response-cache counters ride on the first request line of
+# a warm instance and then at most once per interval (0: on every line)
+STATS_LOG_INTERVAL = float(os.environ.get('STATS_LOG_INTERVAL', '60'))
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+MAX_STATEMENTS = 100
+EXPLAIN_MAX_STATEMENTS = 5
+LOGGED_SQL_MAX_CHARS = 2000
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'VALUES')
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+_interval_lock = threading.Lock()
+_last_explain = float('-inf')
+_last_stats = float('-inf')
+
+# Called with every finished Trace (e.g. by the load-test harness)
+listeners: List[Callable[['Trace'], None]] = []
+
+
+class Statement:
+    __slots__ = ('query', 'vars', 'ms', 'rows')
+
+    def __init__(self, query: Any, vars: Any, ms: float, rows: int) -> None:
+        self.query = query
+        self.vars = vars
+        self.ms = ms
+        self.rows = rows
+
+
+class Trace:
+    def __init__(self, route: str, method: Optional[str]) -> None:
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.statements: List[Statement] = []
+        self.count = 0
+        self.rows = 0
+        self.db_ms = 0.0
+        self.serialize_ms = 0.0
+        self.idle_ms = 0.0
+        self.total_ms = 0.0
+        self.status = 0
+        self._serializing = False
+
+    def record(self, query: Any, vars: Any, ms: float, rows: int) -> Optional[Statement]:
+        self.count += 1
+        self.db_ms += ms
+        self.rows += max(rows, 0)
+        if len(self.statements) >= MAX_STATEMENTS:
+            return None
+        statement = Statement(query, vars, ms, max(rows, 0))
+        self.statements.append(statement)
+        return statement
+
+    @property
+    def active_ms(self) -> float:
+        return self.total_ms - self.idle_ms
+
+    @property
+    def slow(self) -> bool:
+        return self.active_ms >= SLOW_REQUEST_MS
+
+
+def current() -> Optional[Trace]:
+    return getattr(_local, 'trace', None)
+
+
+def _timed_execute(cursor: Any, execute: Callable[[Any, Any], Any], query: Any, vars: Any) -> Any:
+    trace = current()
+    if trace is None:
+        return execute(query, vars)
+    started = time.perf_counter()
+    try:
+        return execute(query, vars)
+    finally:
+        cursor._trace_statement = trace.record(query, vars, (time.perf_counter() - started) * 1000, cursor.rowcount)
+
+
+def _build_cursor_classes() -> Tuple[Any, Any]:
+    psycopg2 = db._driver()
+
+    class TracedDictCursor(psycopg2.extras.RealDictCursor):
+        def execute(self, query: Any, vars: Any = None) -> Any:
+            return _timed_execute(self, super().execute, query, vars)
+
+    class TracedTupleCursor(psycopg2.extensions.cursor):
+        def execute(self, query: Any, vars: Any = None) -> Any:
+            return _timed_execute(self, super().execute, query, vars)
+
+        def __iter__(self) -> Iterator[Any]:
+            # Server-side cursors fetch while being iterated: charge those
+            # round trips to the statement, not to serialization.
+            statement = getattr(self, '_trace_statement', None) if self.name else None
+            trace = current()
+            while True:
+                started = time.perf_counter()
+                try:
+                    row = next(self)
+                except StopIteration:
+                    return
+                finally:
+                    if statement is not None and trace is not None:
+                        elapsed = (time.perf_counter() - started) * 1000
+                        statement.ms += elapsed
+                        trace.db_ms += elapsed
+                if statement is not None and trace is not None:
+                    statement.rows += 1
+                    trace.rows += 1
+                yield row
+
+    return TracedDictCursor, TracedTupleCursor
+
+
+def _install() -> None:
+    global _installed
+    with _install_lock:
+        if not _installed:
+            db.set_cursor_classes(*_build_cursor_classes())
+            _installed = True
+
+
+@contextlib.contextmanager
+def serializing() -> Iterator[None]:
+    '''Charges the enclosed time, minus any DB fetches inside it, to serialization'''
+    trace = current()
+    if trace is None or trace._serializing:
+        yield
+        return
+    trace._serializing = True
+    started = time.perf_counter()
+    db_before = trace.db_ms
+    try:
+        yield
+    finally:
+        trace._serializing = False
+        trace.serialize_ms += (time.perf_counter() - started) * 1000 - (trace.db_ms - db_before)
+
+
+@contextlib.contextmanager
+def idle() -> Iterator[None]:
+    '''Time spent deliberately waiting (long-poll) does not count towards the slow threshold'''
+    trace = current()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.idle_ms += (time.perf_counter() - started) * 1000
+
+
+def _sql_text(query: Any) -> str:
+    text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def explain(statements: List[Statement]) -> Dict[int, List[str]]:
+    '''Plain EXPLAIN (never ANALYZE: writes must not run twice) for the slowest statements'''
+    candidates = sorted(
+        (s for s in statements if _sql_text(s.query).split(' ', 1)[0].upper() in EXPLAINABLE),
+        key=lambda s: s.ms, reverse=True,
+    )[:EXPLAIN_MAX_STATEMENTS]
+    plans: Dict[int, List[str]] = {}
+    conn = db.get_connection(timeout=0)
+    try:
+        cur = conn.cursor(cursor_factory=db._driver().extensions.cursor)
+        for statement in candidates:
+            try:
+                cur.execute(b'EXPLAIN ' + _as_bytes(statement.query), statement.vars)
+                plans[id(statement)] = [row[0] for row in cur.fetchall()]
+            except Exception as e:
+                conn.rollback()
+                plans[id(statement)] = ['EXPLAIN failed: %s' % e]
+        cur.close()
+    finally:
+        conn.rollback()
+        db.release_connection(conn)
+    return plans
+
+
+def _as_bytes(query: Any) -> bytes:
+    return query if isinstance(query, bytes) else str(query).encode()
+
+
+def _explain_due() -> bool:
+    global _last_explain
+    now = time.monotonic()
+    with _interval_lock:
+        if now - _last_explain < EXPLAIN_INTERVAL:
+            return False
+        _last_explain = now
+    return True
+
+
+def _stats_due() -> bool:
+    global _last_stats
+    now = time.monotonic()
+    with _interval_lock:
+        if now - _last_stats < STATS_LOG_INTERVAL:
+            return False
+        _last_stats = now
+    return True
+
+
+def instance_stats() -> Dict[str, Any]:
+    '''Counters of this warm instance since it started'''
+    stats: Dict[str, Any] = {'pool': db.pool_stats(), 'replica': db.replica_stats()}
+    # Only handlers that cache responses load the cache module
+    cache = sys.modules.get('shared.cache')
+    if cache is not None:
+        stats['cache'] = cache.stats()
+    return stats
+
+
+def log_line(trace: Trace) -> Dict[str, Any]:
+    line: Dict[str, Any] = {
+        'type': 'request',
+        'route': trace.route,
+        'method': trace.method,
+        'status': trace.status,
+        'ms': round(trace.total_ms, 2),
+        'db_ms': round(trace.db_ms, 2),
+        'serialize_ms': round(trace.serialize_ms, 2),
+        'statements': trace.count,
+        'rows': trace.rows,
+    }
+    if trace.idle_ms:
+        line['idle_ms'] = round(trace.idle_ms, 2)
+    if _stats_due():
+        line['stats'] = instance_stats()
+    if not trace.slow:
+        return line
+
+    line['slow'] = True
+    plans: Dict[int, List[str]] = {}
+    if EXPLAIN_SLOW and trace.statements and _explain_due():
+        try:
+            plans = explain(trace.statements)
+        except db.PoolTimeout:
+            line['explain_error'] = 'skipped: no idle connection'
+        except Exception as e:
+            line['explain_error'] = str(e)
+    line['queries'] = [
+        dict(
+            {'sql': _sql_text(s.query)[:LOGGED_SQL_MAX_CHARS], 'ms': round(s.ms, 2), 'rows': s.rows},
+            **({'plan': plans[id(s)]} if id(s) in plans else {})
+        )
+        for s in trace.statements
+    ]
+    return line
+
+
+def server_timing(trace: Trace) -> str:
+    return 'db;dur=%.1f;desc="%d statements", serialize;dur=%.1f, total;dur=%.1f' % (
+        trace.db_ms, trace.count, trace.serialize_ms, trace.total_ms
+    )
+
+
+def traced(route: str) -> Callable[[Handler], Handler]:
+    '''
+    Handler decorator: records every statement the invocation runs through
+    pooled connections and logs a JSON summary line when it returns.
+    '''
+    def decorate(handler: Handler) -> Handler:
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            if not QUERY_TRACE or event.get('httpMethod') == 'OPTIONS':
+                return handler(event, context)
+            _install()
+            trace = Trace(route, event.get('httpMethod'))
+            _local.trace = trace
+            try:
+                response = handler(event, context)
+            finally:
+                _local.trace = None
+                trace.total_ms = (time.perf_counter() - trace.started) * 1000
+            trace.status = response.get('statusCode', 0)
+
+            if SERVER_TIMING:
+                headers = response.setdefault('headers', {})
+                headers['Server-Timing'] = server_timing(trace)
+                headers['Timing-Allow-Origin'] = '*'
+            if QUERY_TRACE_LOG:
+                sys.stdout.write(json.dumps(log_line(trace), default=str, ensure_ascii=False) + '\n')
+            for listener in listeners:
+                listener(trace)
+            return response
+        return wrapper
+    return decorate
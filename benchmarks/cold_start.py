@@ -0,0 +1,105 @@
+'''
+Business: Benchmark cold start of each function entry point: import time and first-request latency
+Args: --runs fresh interpreters per entry point, --ref git revision to compare against, --dsn (default DATABASE_URL) for first GETs
+Returns: table of median import, first-preflight and first-GET milliseconds per entry point (and per revision)
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from typing import Any, Dict, List, Optional
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENTRY_POINTS = ['auth', 'forums', 'topics', 'posts', 'likes', 'search', 'messages', 'maintenance', 'api']
+
+# First GET per entry point when a database is available; the api entry routes by path
+GET_REQUESTS: Dict[str, Dict[str, Any]] = {
+    'forums': {'path': '/', 'queryStringParameters': {}},
+    'topics': {'path': '/', 'queryStringParameters': {}},
+    'search': {'path': '/', 'queryStringParameters': {'q': 'forum'}},
+    'api': {'path': '/topics', 'queryStringParameters': {}},
+}
+
+PREFLIGHT_PATHS = {'api': '/topics'}
+
+# Runs in a fresh interpreter so every measurement is a real cold start
+CHILD = '''
+import importlib.util, json, sys, time
+backend, entry, get_event = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('entry', '%s/%s/index.py' % (backend, entry))
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+module.handler({'httpMethod': 'OPTIONS', 'path': sys.argv[4], 'headers': {}}, None)
+preflighted = time.perf_counter()
+result = {'import_ms': (imported - started) * 1000, 'preflight_ms': (preflighted - imported) * 1000}
+if get_event:
+    event = dict(get_event, httpMethod='GET', headers={})
+    before = time.perf_counter()
+    response = module.handler(event, None)
+    result['get_ms'] = (time.perf_counter() - before) * 1000
+    result['get_status'] = response['statusCode']
+print(json.dumps(result))
+'''
+
+
+def export_backend(ref: str, target: str) -> str:
+    archive = os.path.join(target, 'backend.tar')
+    subprocess.run(['git', '-C', REPO_DIR, 'archive', '-o', archive, ref, 'backend'], check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    return os.path.join(target, 'backend')
+
+
+def measure(backend: str, entry: str, runs: int, dsn: Optional[str]) -> Optional[Dict[str, float]]:
+    if not os.path.exists(os.path.join(backend, entry, 'index.py')):
+        return None
+    get_event = GET_REQUESTS.get(entry) if dsn else None
+    env = dict(os.environ)
+    if dsn:
+        env['DATABASE_URL'] = dsn
+    samples: List[Dict[str, float]] = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD, backend, entry, json.dumps(get_event), PREFLIGHT_PATHS.get(entry, '/')],
+            check=True, capture_output=True, text=True, env=env,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+
+
+def format_row(label: str, result: Optional[Dict[str, float]]) -> str:
+    if result is None:
+        return '%-26s %10s %14s %12s' % (label, '-', '-', '-')
+    get_ms = '%.1f' % result['get_ms'] if 'get_ms' in result else '-'
+    return '%-26s %10.1f %14.1f %12s' % (label, result['import_ms'], result['preflight_ms'], get_ms)
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--ref', help='git revision to measure alongside the working tree')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--entries', nargs='*', choices=ENTRY_POINTS, default=ENTRY_POINTS)
+    args = parser.parse_args(argv)
+
+    trees = [('worktree', os.path.join(REPO_DIR, 'backend'))]
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.ref:
+            trees.insert(0, (args.ref, export_backend(args.ref, tmp)))
+
+        print('median of %d cold starts%s' % (args.runs, '' if args.dsn else ' (no DSN: first GET skipped)'))
+        print('%-26s %10s %14s %12s' % ('entry point', 'import ms', 'preflight ms', 'first GET ms'))
+        for entry in args.entries:
+            for label, backend in trees:
+                name = entry if len(trees) == 1 else '%s @ %s' % (entry, label)
+                print(format_row(name, measure(backend, entry, args.runs, args.dsn)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
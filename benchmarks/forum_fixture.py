@@ -0,0 +1,239 @@
+'''
+Business: Disposable Postgres with a synthetic forum for benchmarks: local server, migrations and set-based seeding
+Args: PG_BIN (or initdb/pg_ctl on PATH) for a throwaway server, or an existing scratch DSN; Scale with the seed sizes
+Returns: DSN of a migrated, seeded database plus session tokens for authenticated requests
+'''
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from shared import category_stats, counters, sessions, trending
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MIGRATIONS_DIR = os.path.join(REPO_DIR, 'db_migrations')
+
+# Mixed Russian/English vocabulary so search hits both dictionaries
+WORDS = [
+    'форум', 'вопрос', 'ответ', 'обсуждение', 'проект', 'ошибка', 'решение', 'сервер', 'база', 'данные',
+    'запрос', 'индекс', 'скорость', 'память', 'настройка', 'обновление', 'версия', 'модуль', 'тест', 'релиз',
+    'python', 'postgres', 'react', 'docker', 'linux', 'cache', 'index', 'query', 'deploy', 'latency',
+    'design', 'release', 'feature', 'bug', 'review', 'thread', 'topic', 'reply', 'search', 'profile',
+]
+
+
+class Scale(NamedTuple):
+    categories: int = 8
+    users: int = 5000
+    topics: int = 20000
+    posts: int = 200000
+    likes: int = 400000
+    hot_skew: float = 3.0
+    sessions: int = 200
+
+
+class LocalPostgres:
+    '''
+    Throwaway Postgres cluster in a temp directory, reachable over a unix
+    socket only. initdb refuses to run as root, so run the benchmark as a
+    regular user (or pass --dsn to a scratch database instead).
+    '''
+
+    def __init__(self, bin_dir: Optional[str] = None, database: str = 'forum') -> None:
+        self.bin_dir = bin_dir or os.environ.get('PG_BIN') or os.path.dirname(shutil.which('initdb') or '')
+        if not self.bin_dir or not os.path.exists(os.path.join(self.bin_dir, 'initdb')):
+            raise RuntimeError('initdb not found: set PG_BIN or pass --dsn')
+        self.database = database
+        self.root = ''
+        self.port = 0
+
+    def _run(self, tool: str, *args: str) -> None:
+        subprocess.run([os.path.join(self.bin_dir, tool)] + list(args), check=True, capture_output=True)
+
+    @property
+    def dsn(self) -> str:
+        return 'postgresql://postgres@/%s?host=%s&port=%d' % (self.database, self.root, self.port)
+
+    def start(self) -> str:
+        self.root = tempfile.mkdtemp(prefix='forum-pg-')
+        data = os.path.join(self.root, 'data')
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        self._run('initdb', '-D', data, '-U', 'postgres', '--auth=trust', '-E', 'UTF8', '--no-sync')
+        options = "-p %d -k %s -c listen_addresses='' -c max_connections=200" % (self.port, self.root)
+        self._run('pg_ctl', '-D', data, '-o', options, '-l', os.path.join(self.root, 'server.log'), '-w', 'start')
+        self._run('createdb', '-h', self.root, '-p', str(self.port), '-U', 'postgres', self.database)
+        return self.dsn
+
+    def stop(self) -> None:
+        if not self.root:
+            return
+        try:
+            self._run('pg_ctl', '-D', os.path.join(self.root, 'data'), '-m', 'fast', '-w', 'stop')
+        finally:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = ''
+
+    def __enter__(self) -> 'LocalPostgres':
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def connect(dsn: str) -> Any:
+    import psycopg2
+    import psycopg2.extras
+    return psycopg2.connect(dsn, cursor_factory=psycopg2.extras.RealDictCursor)
+
+
+def apply_migrations(conn: Any) -> int:
+    files = sorted(glob.glob(os.path.join(MIGRATIONS_DIR, 'V*.sql')))
+    with conn.cursor() as cur:
+        for path in files:
+            with open(path, encoding='utf-8') as f:
+                cur.execute(f.read())
+    conn.commit()
+    return len(files)
+
+
+def _text_sql(min_words: int, spread: int) -> str:
+    # The correlation with g keeps Postgres from evaluating the subquery once
+    return '''array_to_string(ARRAY(
+        SELECT (%%(words)s::text[])[1 + floor(random() * %%(word_count)s)::int]
+        FROM generate_series(1, %d + (g %%%% %d))
+    ), ' ')''' % (min_words, spread)
+
+
+def seed(conn: Any, scale: Scale) -> Dict[str, float]:
+    '''
+    Fills an empty, migrated database set-based: per-row triggers are
+    disabled while loading, then counters, category stats and search vectors
+    are computed in bulk. Post and like targets follow a power law, so low
+    topic ids are the hot ones. Returns seconds spent per phase.
+    '''
+    timings: Dict[str, float] = {}
+    args = {
+        'categories': scale.categories, 'users': scale.users, 'topics': scale.topics,
+        'posts': scale.posts, 'likes': scale.likes, 'skew': scale.hot_skew,
+        'words': WORDS, 'word_count': len(WORDS),
+    }
+
+    def phase(name: str, statement: str) -> None:
+        started = time.perf_counter()
+        cur.execute(statement, args)
+        timings[name] = time.perf_counter() - started
+
+    with conn.cursor() as cur:
+        cur.execute('SELECT EXISTS (SELECT 1 FROM users) OR EXISTS (SELECT 1 FROM forum_categories) AS seeded')
+        if cur.fetchone()['seeded']:
+            raise RuntimeError('refusing to seed a database that already has forum data')
+
+        cur.execute('SET LOCAL synchronous_commit = off')
+        for table in ('users', 'topics', 'posts', 'likes'):
+            cur.execute('ALTER TABLE %s DISABLE TRIGGER USER' % table)
+
+        phase('categories', '''
+            INSERT INTO forum_categories (name, description, icon, gradient, sort_order)
+            SELECT 'Category ' || g, 'Synthetic category ' || g, 'MessageSquare', 'from-blue-500 to-cyan-500', g
+            FROM generate_series(1, %(categories)s) g
+        ''')
+        phase('users', '''
+            INSERT INTO users (username, email, password_hash, role)
+            SELECT 'user' || g, 'user' || g || '@example.test', 'seed-no-login',
+                   CASE WHEN g %% 500 = 0 THEN 'moderator' ELSE 'user' END
+            FROM generate_series(1, %(users)s) g
+        ''')
+        phase('topics', '''
+            INSERT INTO topics (category_id, user_id, title, content, is_pinned, created_at, updated_at, search_vector)
+            SELECT category_id, user_id, title, content, is_pinned, created_at, created_at,
+                   setweight(to_tsvector('russian', title), 'A') || setweight(to_tsvector('russian', content), 'B')
+            FROM (
+                SELECT
+                    1 + (g %% %(categories)s) AS category_id,
+                    1 + floor(random() * %(users)s)::int AS user_id,
+                    'Topic ' || g || ' ' || ''' + _text_sql(3, 5) + ''' AS title,
+                    ''' + _text_sql(20, 60) + ''' AS content,
+                    g %% 1000 = 0 AS is_pinned,
+                    CURRENT_TIMESTAMP - random() * INTERVAL '365 days' AS created_at
+                FROM generate_series(1, %(topics)s) g
+            ) generated
+        ''')
+        phase('posts', '''
+            INSERT INTO posts (topic_id, user_id, content, created_at, updated_at, search_vector)
+            SELECT topic_id, user_id, content, created_at, created_at, to_tsvector('russian', content)
+            FROM (
+                SELECT
+                    1 + floor(%(topics)s * power(random(), %(skew)s))::int AS topic_id,
+                    1 + floor(random() * %(users)s)::int AS user_id,
+                    ''' + _text_sql(8, 40) + ''' AS content,
+                    CURRENT_TIMESTAMP - random() * INTERVAL '180 days' AS created_at
+                FROM generate_series(1, %(posts)s) g
+            ) generated
+        ''')
+        phase('likes', '''
+            INSERT INTO likes (user_id, post_id)
+            SELECT 1 + floor(random() * %(users)s)::int, 1 + floor(%(posts)s * power(random(), %(skew)s))::int
+            FROM generate_series(1, %(likes)s) g
+            ON CONFLICT (user_id, post_id) DO NOTHING
+        ''')
+
+        started = time.perf_counter()
+        cur.execute('''
+            UPDATE topics t SET updated_at = latest.created_at
+            FROM (SELECT topic_id, MAX(created_at) AS created_at FROM posts GROUP BY topic_id) latest
+            WHERE latest.topic_id = t.id AND latest.created_at > t.updated_at
+        ''')
+        counters.recompute(cur)
+        category_stats.rebuild(cur)
+        trending.rebuild(cur)
+        timings['derived'] = time.perf_counter() - started
+
+        # Only now: the derived pass rewrites most rows, and the change-feed
+        # trigger would stamp and NOTIFY each of them
+        for table in ('users', 'topics', 'posts', 'likes'):
+            cur.execute('ALTER TABLE %s ENABLE TRIGGER USER' % table)
+    conn.commit()
+
+    started = time.perf_counter()
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute('VACUUM ANALYZE')
+    conn.autocommit = autocommit
+    timings['analyze'] = time.perf_counter() - started
+    return timings
+
+
+def create_sessions(conn: Any, count: int) -> List[str]:
+    '''Session tokens for the first users (uniformly spread, not just user 1)'''
+    with conn.cursor() as cur:
+        cur.execute('SELECT id FROM users ORDER BY id LIMIT %s', (count,))
+        tokens = [sessions.create_session(cur, row['id']) for row in cur.fetchall()]
+    conn.commit()
+    return tokens
+
+
+def describe(conn: Any) -> Dict[str, int]:
+    with conn.cursor() as cur:
+        cur.execute('''
+            SELECT
+                (SELECT COUNT(*) FROM forum_categories) AS categories,
+                (SELECT COUNT(*) FROM users) AS users,
+                (SELECT COUNT(*) FROM topics) AS topics,
+                (SELECT COUNT(*) FROM posts) AS posts,
+                (SELECT COUNT(*) FROM likes) AS likes,
+                (SELECT COALESCE(MAX(replies_count), 0) FROM topics) AS hottest_topic_posts
+        ''')
+        row = dict(cur.fetchone())
+    conn.commit()
+    return row
@@ -0,0 +1,353 @@
+'''
+Business: Load test the forum handlers against a seeded Postgres: realistic request mix at fixed concurrency
+Args: --dsn scratch database (default: throwaway local server via PG_BIN/initdb), seed sizes, --concurrency, --duration, --mix, --baseline
+Returns: per-endpoint throughput, p50/p95/p99 latency, queries, DB and serialization ms per request; exit code 1 when --baseline regresses
+'''
+import argparse
+import importlib.util
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+Event = Dict[str, Any]
+
+
+class Context(NamedTuple):
+    categories: int
+    topics: int
+    posts: int
+    skew: float
+    tokens: List[str]
+    # Latest X-Changes-Cursor per topic, filled by topic views for the since feed
+    changes_cursors: Dict[str, str]
+
+
+def hot_id(rng: random.Random, count: int, skew: float) -> int:
+    # Same power law as the seeder: low ids are the hot topics and posts
+    return 1 + int(count * rng.random() ** skew)
+
+
+def _get(params: Dict[str, Any]) -> Event:
+    return {'httpMethod': 'GET', 'path': '/', 'headers': {}, 'queryStringParameters': params}
+
+
+def _post(ctx: Context, rng: random.Random, body: Dict[str, Any]) -> Event:
+    headers = {'Authorization': 'Bearer ' + rng.choice(ctx.tokens)}
+    return {'httpMethod': 'POST', 'path': '/', 'headers': headers, 'queryStringParameters': {}, 'body': json.dumps(body)}
+
+
+def forums_list(ctx: Context, rng: random.Random) -> Tuple[str, Event]:
+    return 'forums:list', _get({})
+
+
+def topics_list(ctx: Context, rng: random.Random) -> Tuple[str, Event]:
+    return 'topics:list', _get({'category_id': str(rng.randint(1, ctx.categories))})
+
+
+def topics_hot(ctx: Context, rng: random.Random) -> Tuple[str, Event]:
+    params = {'sort': 'hot'}
+    if rng.random() < 0.5:
+        params['category_id'] = str(rng.randint(1, ctx.categories))
+    return 'topics:hot', _get(params)
+
+
+def topics_view(ctx: Context, rng: random.Random) -> Tuple[str, Event]:
+    return 'topics:view', _get({'id': str(hot_id(rng, ctx.topics, ctx.skew))})
+
+
+def topics_since(ctx: Context, rng: random.Random) -> Tuple[str, Event]:
+    topic_id = str(hot_id(rng, ctx.topics, ctx.skew))
+    since = ctx.changes_cursors.get(topic_id)
+    if since is None:
+        return topics_view(ctx, rng)
+    return 'topics:since', _get({'id': topic_id, 'since': since})
+
+
+def search(ctx: Context, rng: random.Random) -> Tuple[str, Event]:
+    return 'search', _get({'q': ' '.join(rng.sample(SEARCH_WORDS, rng.randint(1, 2)))})
+
+
+def posts_create(ctx: Context, rng: random.Random) -> Tuple[str, Event]:
+    body = {'topic_id': hot_id(rng, ctx.topics, ctx.skew), 'content': 'load test reply %d' % rng.randint(1, 10 ** 9)}
+    return 'posts:create', _post(ctx, rng, body)
+
+
+def likes_toggle(ctx: Context, rng: random.Random) -> Tuple[str, Event]:
+    return 'likes:toggle', _post(ctx, rng, {'post_id': hot_id(rng, ctx.posts, ctx.skew)})
+
+
+class Scenario(NamedTuple):
+    route: str
+    weight: int
+    build: Callable[[Context, random.Random], Tuple[str, Event]]
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    'forums:list': Scenario('forums', 10, forums_list),
+    'topics:list': Scenario('topics', 20, topics_list),
+    'topics:hot': Scenario('topics', 5, topics_hot),
+    'topics:view': Scenario('topics', 35, topics_view),
+    'topics:since': Scenario('topics', 10, topics_since),
+    'search': Scenario('search', 5, search),
+    'posts:create': Scenario('posts', 10, posts_create),
+    'likes:toggle': Scenario('likes', 10, likes_toggle),
+}
+
+# Subset of the seeder's vocabulary, so most searches match
+SEARCH_WORDS = ['форум', 'вопрос', 'сервер', 'индекс', 'python', 'postgres', 'cache', 'deploy', 'review', 'search']
+
+_last_trace = threading.local()
+
+
+def install_trace_listener() -> None:
+    '''Keeps each worker thread's latest request trace (statements, DB and serialization time)'''
+    from shared import tracing
+
+    tracing.listeners.append(lambda trace: setattr(_last_trace, 'trace', trace))
+
+
+def load_handlers(routes: List[str]) -> Dict[str, Callable[[Event, Any], Dict[str, Any]]]:
+    handlers = {}
+    for route in routes:
+        spec = importlib.util.spec_from_file_location('load_test_' + route, os.path.join(BACKEND_DIR, route, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        handlers[route] = module.handler
+    return handlers
+
+
+class Sample(NamedTuple):
+    seconds: float
+    status: int
+    statements: int
+    db_ms: float
+    serialize_ms: float
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[Sample]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, sample: 'Sample') -> None:
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(sample)
+
+
+def run_phase(
+    ctx: Context,
+    handlers: Dict[str, Callable[[Event, Any], Dict[str, Any]]],
+    mix: Dict[str, int],
+    concurrency: int,
+    duration: float,
+    seed: int,
+) -> Tuple[Recorder, float]:
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int) -> None:
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            scenario = SCENARIOS[rng.choices(names, weights)[0]]
+            endpoint, event = scenario.build(ctx, rng)
+            _last_trace.trace = None
+            started = time.perf_counter()
+            response = handlers[scenario.route](event, None)
+            elapsed = time.perf_counter() - started
+            trace = _last_trace.trace
+            recorder.add(endpoint, Sample(
+                elapsed, response['statusCode'],
+                trace.count if trace else 0, trace.db_ms if trace else 0.0, trace.serialize_ms if trace else 0.0,
+            ))
+            changes = (response.get('headers') or {}).get('X-Changes-Cursor')
+            if changes:
+                ctx.changes_cursors[event['queryStringParameters']['id']] = changes
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker, i) for i in range(concurrency)]:
+            future.result()
+    return recorder, time.perf_counter() - started
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Dict[str, float]]:
+    report: Dict[str, Dict[str, float]] = {}
+    everything: List[Sample] = []
+    for endpoint, samples in sorted(recorder.samples.items()):
+        everything += samples
+        report[endpoint] = _summary(samples, elapsed)
+    if everything:
+        report['total'] = _summary(everything, elapsed)
+    return report
+
+
+def _summary(samples: List[Sample], elapsed: float) -> Dict[str, float]:
+    latencies = sorted(sample.seconds * 1000 for sample in samples)
+    statements = [sample.statements for sample in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample.status >= 400),
+        'rps': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'queries_per_request': sum(statements) / len(samples),
+        'max_queries': max(statements),
+        'db_ms': sum(sample.db_ms for sample in samples) / len(samples),
+        'serialize_ms': sum(sample.serialize_ms for sample in samples) / len(samples),
+    }
+
+
+def print_report(report: Dict[str, Dict[str, float]]) -> None:
+    print('%-14s %8s %6s %9s %9s %9s %9s %9s %7s %9s %9s' % (
+        'endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'max q', 'db ms', 'ser ms'
+    ))
+    for endpoint, row in report.items():
+        print('%-14s %8d %6d %9.1f %9.2f %9.2f %9.2f %9.2f %7d %9.2f %9.2f' % (
+            endpoint, row['requests'], row['errors'], row['rps'], row['p50_ms'], row['p95_ms'], row['p99_ms'],
+            row['queries_per_request'], row['max_queries'], row['db_ms'], row['serialize_ms'],
+        ))
+
+
+def regressions(report: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    '''Endpoints whose p95 grew by more than tolerance or that issue more queries than the baseline'''
+    found = []
+    for endpoint, row in report.items():
+        before = baseline.get(endpoint)
+        if before is None or endpoint == 'total':
+            continue
+        if row['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append('%s p95 %.2f ms -> %.2f ms' % (endpoint, before['p95_ms'], row['p95_ms']))
+        if row['queries_per_request'] > before['queries_per_request'] + 0.5:
+            found.append('%s queries/request %.2f -> %.2f' % (
+                endpoint, before['queries_per_request'], row['queries_per_request']
+            ))
+    return found
+
+
+def parse_mix(spec: Optional[str]) -> Dict[str, int]:
+    mix = {name: scenario.weight for name, scenario in SCENARIOS.items()}
+    for part in filter(None, (spec or '').split(',')):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise SystemExit('unknown scenario %r (known: %s)' % (name, ', '.join(SCENARIOS)))
+        mix[name] = int(weight)
+    return mix
+
+
+def prepare_database(args: argparse.Namespace) -> Tuple[Dict[str, int], List[str]]:
+    import forum_fixture
+
+    conn = forum_fixture.connect(args.dsn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('users') IS NOT NULL AS migrated")
+        migrated = cur.fetchone()['migrated']
+    conn.commit()
+    if not migrated:
+        print('applied %d migrations' % forum_fixture.apply_migrations(conn))
+
+    shape = forum_fixture.describe(conn)
+    if shape['users'] == 0:
+        scale = forum_fixture.Scale(
+            categories=args.categories, users=args.users, topics=args.topics,
+            posts=args.posts, likes=args.likes, hot_skew=args.skew,
+        )
+        timings = forum_fixture.seed(conn, scale)
+        print('seeded in %.1fs (%s)' % (sum(timings.values()), ', '.join('%s %.1fs' % t for t in timings.items())))
+        shape = forum_fixture.describe(conn)
+    else:
+        print('reusing existing data')
+    tokens = forum_fixture.create_sessions(conn, args.sessions)
+    conn.close()
+    return shape, tokens
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dsn', help='scratch database; seeded when empty, reused otherwise')
+    parser.add_argument('--pg-bin', help='directory with initdb/pg_ctl (default PG_BIN or PATH)')
+    parser.add_argument('--categories', type=int, default=8)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--topics', type=int, default=20000)
+    parser.add_argument('--posts', type=int, default=200000)
+    parser.add_argument('--likes', type=int, default=400000)
+    parser.add_argument('--skew', type=float, default=3.0, help='power-law exponent for hot topics and posts')
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--warmup', type=float, default=5.0)
+    parser.add_argument('--mix', help='scenario weights, e.g. topics:view=50,search=0')
+    parser.add_argument('--cache', choices=['memory', 'none'], default='memory')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--baseline', help='earlier --json report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 growth over --baseline')
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    # Handlers read their configuration at import time
+    os.environ['CACHE_BACKEND'] = args.cache
+    os.environ['QUERY_TRACE'] = '1'
+    os.environ.setdefault('QUERY_TRACE_LOG', '0')
+    # A handful of synthetic sessions would spend every rate-limit budget in seconds
+    os.environ.setdefault('RATE_LIMIT_BACKEND', 'none')
+    os.environ['DB_POOL_MAX_SIZE'] = str(max(args.concurrency, int(os.environ.get('DB_POOL_MAX_SIZE', '0'))))
+    sys.path.insert(0, BACKEND_DIR)
+    import forum_fixture
+
+    server = None
+    if not args.dsn:
+        server = forum_fixture.LocalPostgres(args.pg_bin)
+        args.dsn = server.start()
+        print('started local postgres at %s' % server.root)
+    try:
+        os.environ['DATABASE_URL'] = args.dsn
+        shape, tokens = prepare_database(args)
+        print('forum: %s' % ', '.join('%s=%d' % item for item in shape.items()))
+
+        install_trace_listener()
+        handlers = load_handlers(sorted({SCENARIOS[name].route for name, weight in mix.items() if weight > 0}))
+        ctx = Context(shape['categories'], shape['topics'], shape['posts'], args.skew, tokens, {})
+
+        if args.warmup > 0:
+            run_phase(ctx, handlers, mix, args.concurrency, args.warmup, args.seed + 10000)
+        recorder, elapsed = run_phase(ctx, handlers, mix, args.concurrency, args.duration, args.seed)
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = summarize(recorder, elapsed)
+    print('concurrency %d, %.1fs, cache %s' % (args.concurrency, elapsed, args.cache))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'concurrency': args.concurrency, 'shape': shape, 'endpoints': report}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f)['endpoints'], args.tolerance)
+        for line in found:
+            print('REGRESSION ' + line)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
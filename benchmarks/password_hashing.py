@@ -0,0 +1,60 @@
+'''
+Business: Benchmark login throughput for candidate password hashing parameters
+Args: --seconds per measurement, --threads for the concurrent run, --params to limit the sets
+Returns: table of logins/sec on one core and across the hashing pool per parameter set
+'''
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from shared import passwords
+
+PARAMETER_SETS: Dict[str, Dict[str, Any]] = {
+    'scrypt-n13-r8-p1': passwords.scrypt_params(2 ** 13, 8, 1),
+    'scrypt-n14-r8-p1': passwords.scrypt_params(2 ** 14, 8, 1),
+    'scrypt-n15-r8-p1': passwords.scrypt_params(2 ** 15, 8, 1),
+    'scrypt-n16-r8-p1': passwords.scrypt_params(2 ** 16, 8, 1),
+    'pbkdf2-sha256-310k': passwords.pbkdf2_params(310000),
+    'pbkdf2-sha256-600k': passwords.pbkdf2_params(600000),
+}
+
+
+def measure(stored: str, seconds: float, threads: int) -> Tuple[int, float]:
+    deadline = time.perf_counter() + seconds
+
+    def worker() -> int:
+        count = 0
+        while time.perf_counter() < deadline:
+            passwords.verify_password('correct horse battery staple', stored)
+            count += 1
+        return count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(lambda _: worker(), range(threads)))
+    return total, time.perf_counter() - started
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--params', nargs='*', choices=sorted(PARAMETER_SETS), default=sorted(PARAMETER_SETS))
+    args = parser.parse_args(argv)
+
+    print('%-22s %12s %14s %16s' % ('parameters', 'ms/login', 'logins/s/core', 'logins/s (%d thr)' % args.threads))
+    for name in args.params:
+        stored = passwords.hash_password('correct horse battery staple', PARAMETER_SETS[name])
+        single, single_elapsed = measure(stored, args.seconds, 1)
+        multi, multi_elapsed = measure(stored, args.seconds, args.threads)
+        per_core = single / single_elapsed
+        print('%-22s %12.1f %14.1f %16.1f' % (name, 1000.0 / per_core, per_core, multi / multi_elapsed))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
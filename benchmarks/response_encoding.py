@@ -0,0 +1,164 @@
+'''
+Business: Benchmark topic-view serialization: current dict/json path against the shared encoding module
+Args: --posts in the synthetic topic, --repeat runs per strategy, --dsn (default DATABASE_URL; omit for in-memory rows)
+Returns: table of ms per topic, posts/s and body size per strategy, plus gzip/br sizes and timings
+'''
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from shared import encoding
+
+TOPIC = {
+    'id': 1, 'category_id': 1, 'user_id': 1, 'title': 'Benchmark topic', 'content': 'Topic body',
+    'is_pinned': False, 'is_locked': False, 'views_count': 0, 'replies_count': 0,
+    'created_at': datetime(2024, 1, 1), 'updated_at': datetime(2024, 1, 1),
+}
+
+# Post-shaped rows generated server side: nothing is read from or written to forum tables
+POSTS_SQL = '''
+    SELECT
+        g AS id,
+        1 AS topic_id,
+        (g %% 97) + 1 AS user_id,
+        repeat('lorem ipsum dolor sit amet ', 8) || g AS content,
+        g %% 13 AS likes_count,
+        TIMESTAMP '2024-01-01' + g * INTERVAL '1 minute' AS created_at,
+        TIMESTAMP '2024-01-01' + g * INTERVAL '1 minute' AS updated_at,
+        'user' || ((g %% 97) + 1) AS author_name,
+        NULL::text AS author_avatar,
+        'user' AS author_role,
+        g %% 500 AS author_posts,
+        '[]'::json AS attachments
+    FROM generate_series(1, %s) g
+    ORDER BY g
+'''
+
+COLUMNS = [
+    'id', 'topic_id', 'user_id', 'content', 'likes_count', 'created_at', 'updated_at',
+    'author_name', 'author_avatar', 'author_role', 'author_posts', 'attachments',
+]
+
+
+def synthetic_rows(count: int) -> List[Tuple[Any, ...]]:
+    start = datetime(2024, 1, 1)
+    return [
+        (
+            g, 1, g % 97 + 1, 'lorem ipsum dolor sit amet ' * 8 + str(g), g % 13,
+            start + timedelta(minutes=g), start + timedelta(minutes=g),
+            'user%d' % (g % 97 + 1), None, 'user', g % 500, [],
+        )
+        for g in range(1, count + 1)
+    ]
+
+
+def legacy_body(posts: List[Dict[str, Any]]) -> str:
+    return json.dumps(dict(TOPIC, posts=[dict(p) for p in posts]), default=str)
+
+
+def make_strategies(conn: Any, posts: int, rows: Optional[List[Tuple[Any, ...]]]) -> Dict[str, Callable[[], str]]:
+    if conn is None:
+        dict_rows = [dict(zip(COLUMNS, row)) for row in rows]
+        return {
+            'legacy dict + json': lambda: legacy_body(dict_rows),
+            'stream + json': lambda: _with_backend('json', lambda: encoding.dumps_with_array(TOPIC, 'posts', iter(dict_rows))),
+            'stream + orjson': lambda: _with_backend('orjson', lambda: encoding.dumps_with_array(TOPIC, 'posts', iter(dict_rows))),
+        }
+
+    import psycopg2.extensions
+    import psycopg2.extras
+
+    def legacy() -> str:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(POSTS_SQL, (posts,))
+        body = legacy_body(cur.fetchall())
+        cur.close()
+        return body
+
+    def streamed(backend: str) -> Callable[[], str]:
+        def run() -> str:
+            cur = conn.cursor(name='bench_posts', cursor_factory=psycopg2.extensions.cursor)
+            cur.itersize = 100
+            cur.execute(POSTS_SQL, (posts,))
+            body = _with_backend(backend, lambda: encoding.dumps_with_array(TOPIC, 'posts', encoding.named_rows(cur)))
+            cur.close()
+            conn.commit()
+            return body
+        return run
+
+    return {
+        'legacy RealDict + json': legacy,
+        'tuple stream + json': streamed('json'),
+        'tuple stream + orjson': streamed('orjson'),
+    }
+
+
+def _with_backend(name: str, build: Callable[[], str]) -> str:
+    previous = encoding.BACKEND
+    encoding.use_backend(name)
+    try:
+        return build()
+    finally:
+        encoding.use_backend(previous)
+
+
+def measure(run: Callable[[], str], repeat: int) -> Tuple[float, str]:
+    best = float('inf')
+    body = ''
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = run()
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args(argv)
+
+    conn = None
+    rows = None
+    if args.dsn:
+        import psycopg2
+        conn = psycopg2.connect(args.dsn)
+        source = 'postgres (generate_series)'
+    else:
+        rows = synthetic_rows(args.posts)
+        source = 'in-memory rows'
+
+    strategies = make_strategies(conn, args.posts, rows)
+    if encoding.orjson is None:
+        strategies = {name: run for name, run in strategies.items() if 'orjson' not in name}
+
+    print('%d posts, %s, best of %d' % (args.posts, source, args.repeat))
+    print('%-26s %10s %12s %12s' % ('strategy', 'ms/topic', 'posts/s', 'body KiB'))
+    body = ''
+    baseline = None
+    for name, run in strategies.items():
+        elapsed, body = measure(run, args.repeat)
+        baseline = baseline or elapsed
+        print('%-26s %10.1f %12.0f %12.1f   x%.2f' % (
+            name, elapsed * 1000, args.posts / elapsed, len(body.encode()) / 1024.0, baseline / elapsed
+        ))
+
+    print()
+    print('%-26s %10s %12s' % ('compression', 'ms', 'KiB'))
+    for name in ['gzip'] + (['br'] if encoding.brotli is not None else []):
+        elapsed, compressed = measure(lambda: encoding.compress_body(body, name), args.repeat)
+        print('%-26s %10.1f %12.1f' % (name, elapsed * 1000, len(compressed) / 1024.0))
+
+    if conn is not None:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,3 @@
+-- Индексы для keyset-пагинации списка тем (is_pinned, updated_at, id)
+CREATE INDEX IF NOT EXISTS idx_topics_category_listing ON topics(category_id, is_pinned DESC, updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_topics_listing ON topics(is_pinned DESC, updated_at DESC, id DESC);
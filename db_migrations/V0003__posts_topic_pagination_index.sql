@@ -0,0 +1,2 @@
+-- Индекс для постраничной выдачи постов темы (topic_id, created_at, id)
+CREATE INDEX IF NOT EXISTS idx_posts_topic_created ON posts(topic_id, created_at, id);
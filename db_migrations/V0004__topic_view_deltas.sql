@@ -0,0 +1,7 @@
+-- Буфер просмотров тем: чтение темы больше не обновляет строку topics,
+-- приращения копятся здесь и применяются пакетно задачей flush_views
+CREATE UNLOGGED TABLE IF NOT EXISTS topic_view_deltas (
+    topic_id INTEGER NOT NULL,
+    views INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
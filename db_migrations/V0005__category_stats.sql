@@ -0,0 +1,82 @@
+-- Материализованная статистика категорий: счётчики поддерживаются триггерами,
+-- полная пересборка выполняется задачей rebuild_category_stats
+CREATE TABLE IF NOT EXISTS category_stats (
+    category_id INTEGER PRIMARY KEY REFERENCES forum_categories(id) ON DELETE CASCADE,
+    topics_count INTEGER NOT NULL DEFAULT 0,
+    total_posts INTEGER NOT NULL DEFAULT 0,
+    last_activity_at TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION category_stats_bump(p_category_id INTEGER, p_topics INTEGER, p_posts INTEGER, p_activity TIMESTAMP)
+RETURNS VOID AS $$
+BEGIN
+    IF p_category_id IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO category_stats (category_id, topics_count, total_posts, last_activity_at)
+    VALUES (p_category_id, GREATEST(p_topics, 0), GREATEST(p_posts, 0), p_activity)
+    ON CONFLICT (category_id) DO UPDATE SET
+        topics_count = category_stats.topics_count + p_topics,
+        total_posts = category_stats.total_posts + p_posts,
+        last_activity_at = GREATEST(category_stats.last_activity_at, EXCLUDED.last_activity_at);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION category_stats_on_topic() RETURNS TRIGGER AS $$
+DECLARE
+    moved_posts INTEGER;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM category_stats_bump(NEW.category_id, 1, 0, NEW.created_at);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM category_stats_bump(OLD.category_id, -1, 0, NULL);
+    ELSIF NEW.category_id IS DISTINCT FROM OLD.category_id THEN
+        SELECT COUNT(*) INTO moved_posts FROM posts WHERE topic_id = NEW.id;
+        PERFORM category_stats_bump(OLD.category_id, -1, -moved_posts, NULL);
+        PERFORM category_stats_bump(NEW.category_id, 1, moved_posts, NEW.updated_at);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION category_stats_on_post() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM category_stats_bump(
+            (SELECT category_id FROM topics WHERE id = NEW.topic_id), 0, 1, NEW.created_at
+        );
+    ELSE
+        PERFORM category_stats_bump(
+            (SELECT category_id FROM topics WHERE id = OLD.topic_id), 0, -1, NULL
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_category_stats_topics ON topics;
+CREATE TRIGGER trg_category_stats_topics
+    AFTER INSERT OR DELETE OR UPDATE OF category_id ON topics
+    FOR EACH ROW EXECUTE FUNCTION category_stats_on_topic();
+
+DROP TRIGGER IF EXISTS trg_category_stats_posts ON posts;
+CREATE TRIGGER trg_category_stats_posts
+    AFTER INSERT OR DELETE ON posts
+    FOR EACH ROW EXECUTE FUNCTION category_stats_on_post();
+
+-- Начальное заполнение из существующих данных
+INSERT INTO category_stats (category_id, topics_count, total_posts, last_activity_at)
+SELECT
+    fc.id,
+    COUNT(t.id),
+    COALESCE(SUM(pc.posts), 0),
+    GREATEST(MAX(t.created_at), MAX(pc.last_post_at))
+FROM forum_categories fc
+LEFT JOIN topics t ON t.category_id = fc.id
+LEFT JOIN (
+    SELECT topic_id, COUNT(*) AS posts, MAX(created_at) AS last_post_at
+    FROM posts
+    GROUP BY topic_id
+) pc ON pc.topic_id = t.id
+GROUP BY fc.id
+ON CONFLICT (category_id) DO NOTHING;
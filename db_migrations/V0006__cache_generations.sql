@@ -0,0 +1,6 @@
+-- Версии областей кэша: запись увеличивает версию, и закэшированные ответы
+-- со старой версией в ключе перестают использоваться
+CREATE TABLE IF NOT EXISTS cache_generations (
+    scope VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,2 @@
+-- Время последнего изменения области кэша (для заголовка Last-Modified)
+ALTER TABLE cache_generations ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP;
@@ -0,0 +1,12 @@
+-- Отложенные приращения денормализованных счётчиков (например, posts.likes_count):
+-- горячие строки не блокируются на каждой записи, задача apply_counter_deltas
+-- сворачивает приращения пакетно
+CREATE TABLE IF NOT EXISTS counter_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    counter VARCHAR(64) NOT NULL,
+    entity_id INTEGER NOT NULL,
+    delta INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_counter_deltas_counter_entity ON counter_deltas(counter, entity_id);
@@ -0,0 +1,2 @@
+-- Индекс для пакетной выборки вложений по постам страницы темы
+CREATE INDEX IF NOT EXISTS idx_attachments_post ON attachments(post_id);
@@ -0,0 +1,41 @@
+-- Полнотекстовый поиск по темам и постам: tsvector-колонки обновляются триггерами,
+-- поиск идёт по GIN-индексам
+ALTER TABLE topics ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+CREATE OR REPLACE FUNCTION topics_search_vector_update() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', COALESCE(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(NEW.content, '')), 'B');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION posts_search_vector_update() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('russian', COALESCE(NEW.content, ''));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_topics_search_vector ON topics;
+CREATE TRIGGER trg_topics_search_vector
+    BEFORE INSERT OR UPDATE OF title, content ON topics
+    FOR EACH ROW EXECUTE FUNCTION topics_search_vector_update();
+
+DROP TRIGGER IF EXISTS trg_posts_search_vector ON posts;
+CREATE TRIGGER trg_posts_search_vector
+    BEFORE INSERT OR UPDATE OF content ON posts
+    FOR EACH ROW EXECUTE FUNCTION posts_search_vector_update();
+
+UPDATE topics SET search_vector =
+    setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('russian', COALESCE(content, '')), 'B')
+WHERE search_vector IS NULL;
+
+UPDATE posts SET search_vector = to_tsvector('russian', COALESCE(content, ''))
+WHERE search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_topics_search ON topics USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_posts_search ON posts USING GIN (search_vector);
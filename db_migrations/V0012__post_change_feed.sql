@@ -0,0 +1,23 @@
+-- Лента изменений постов для инкрементального обновления тем:
+-- каждая вставка поста и изменение likes_count помечаются номером транзакции
+-- и будят слушателей канала темы через NOTIFY
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS created_txid BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS change_txid BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION posts_change_stamp() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        NEW.created_txid := txid_current();
+    END IF;
+    NEW.change_txid := txid_current();
+    PERFORM pg_notify('topic_changes_' || NEW.topic_id, '');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_posts_change_stamp ON posts;
+CREATE TRIGGER trg_posts_change_stamp
+    BEFORE INSERT OR UPDATE OF likes_count ON posts
+    FOR EACH ROW EXECUTE FUNCTION posts_change_stamp();
+
+CREATE INDEX IF NOT EXISTS idx_posts_topic_change ON posts(topic_id, change_txid, id);
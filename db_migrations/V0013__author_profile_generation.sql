@@ -0,0 +1,24 @@
+-- Поколение кэша профилей авторов: изменение имени, аватара или роли
+-- (а также удаление пользователя) сбрасывает кэш авторов во всех процессах
+-- и закэшированные страницы тем
+CREATE OR REPLACE FUNCTION users_bump_authors_generation() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE'
+        OR NEW.username IS DISTINCT FROM OLD.username
+        OR NEW.avatar_url IS DISTINCT FROM OLD.avatar_url
+        OR NEW.role IS DISTINCT FROM OLD.role
+    THEN
+        INSERT INTO cache_generations (scope, version, updated_at)
+        VALUES ('authors', 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (scope) DO UPDATE SET
+            version = cache_generations.version + 1,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_authors_generation ON users;
+CREATE TRIGGER trg_users_authors_generation
+    AFTER UPDATE OF username, avatar_url, role OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION users_bump_authors_generation();
@@ -0,0 +1,5 @@
+-- Частичные индексы для догоняющего заполнения поисковых векторов
+-- после массовой загрузки без триггеров (задача backfill_search_vectors);
+-- в обычном режиме они пустые
+CREATE INDEX IF NOT EXISTS idx_topics_search_pending ON topics (id) WHERE search_vector IS NULL;
+CREATE INDEX IF NOT EXISTS idx_posts_search_pending ON posts (id) WHERE search_vector IS NULL;
@@ -0,0 +1,77 @@
+-- Личные сообщения: ключ переписки (пара собеседников), индексы под keyset-пагинацию
+-- входящих, исходящих и переписки, счётчик непрочитанных на пользователя
+UPDATE messages SET is_read = FALSE WHERE is_read IS NULL;
+ALTER TABLE messages ALTER COLUMN is_read SET NOT NULL;
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS pair_low INTEGER
+    GENERATED ALWAYS AS (LEAST(from_user_id, to_user_id)) STORED;
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS pair_high INTEGER
+    GENERATED ALWAYS AS (GREATEST(from_user_id, to_user_id)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_messages_inbox ON messages(to_user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_outbox ON messages(from_user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(pair_low, pair_high, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_unread ON messages(to_user_id, from_user_id) WHERE NOT is_read;
+
+-- Индекс (to_user_id, is_read) покрывается idx_messages_inbox и idx_messages_unread
+DROP INDEX IF EXISTS idx_messages_to_user;
+
+CREATE TABLE IF NOT EXISTS message_unread_counts (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    unread INTEGER NOT NULL DEFAULT 0
+);
+
+-- Операторные триггеры с таблицами переходов: массовая отметка прочитанным
+-- меняет счётчик одним UPSERT на получателя, а не построчно
+CREATE OR REPLACE FUNCTION message_unread_counts_apply() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO message_unread_counts (user_id, unread)
+        SELECT to_user_id, COUNT(*) FROM new_rows
+        WHERE NOT is_read AND to_user_id IS NOT NULL
+        GROUP BY to_user_id
+        ON CONFLICT (user_id) DO UPDATE SET unread = message_unread_counts.unread + EXCLUDED.unread;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO message_unread_counts (user_id, unread)
+        SELECT user_id, SUM(delta) FROM (
+            SELECT to_user_id AS user_id, -1 AS delta FROM old_rows WHERE NOT is_read
+            UNION ALL
+            SELECT to_user_id, 1 FROM new_rows WHERE NOT is_read
+        ) changes
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        HAVING SUM(delta) <> 0
+        ON CONFLICT (user_id) DO UPDATE SET unread = message_unread_counts.unread + EXCLUDED.unread;
+    ELSE
+        UPDATE message_unread_counts c SET unread = c.unread - gone.unread
+        FROM (
+            SELECT to_user_id, COUNT(*) AS unread FROM old_rows
+            WHERE NOT is_read
+            GROUP BY to_user_id
+        ) gone
+        WHERE c.user_id = gone.to_user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_message_unread_insert ON messages;
+CREATE TRIGGER trg_message_unread_insert
+    AFTER INSERT ON messages REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION message_unread_counts_apply();
+
+DROP TRIGGER IF EXISTS trg_message_unread_update ON messages;
+CREATE TRIGGER trg_message_unread_update
+    AFTER UPDATE ON messages REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION message_unread_counts_apply();
+
+DROP TRIGGER IF EXISTS trg_message_unread_delete ON messages;
+CREATE TRIGGER trg_message_unread_delete
+    AFTER DELETE ON messages REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION message_unread_counts_apply();
+
+INSERT INTO message_unread_counts (user_id, unread)
+SELECT to_user_id, COUNT(*) FROM messages
+WHERE NOT is_read AND to_user_id IS NOT NULL
+GROUP BY to_user_id
+ON CONFLICT (user_id) DO UPDATE SET unread = EXCLUDED.unread;
@@ -0,0 +1,7 @@
+-- Общее хранилище token bucket для ограничения частоты запросов (RATE_LIMIT_BACKEND=postgres).
+-- UNLOGGED: без записи в WAL; после сбоя таблица очищается, что для лимитов безопасно
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    key VARCHAR(255) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,31 @@
+-- Рейтинг «горячих» тем: затухающая сумма просмотров, ответов и лайков.
+-- Хранится логарифм суммы весов, сдвинутых вперёд во времени (forward decay),
+-- поэтому порядок строк не меняется со временем и обновляются только темы
+-- с новой активностью (задача refresh_topic_scores)
+CREATE TABLE IF NOT EXISTS topic_scores (
+    topic_id INTEGER PRIMARY KEY REFERENCES topics(id) ON DELETE CASCADE,
+    category_id INTEGER NOT NULL,
+    score_log DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_topic_scores_hot ON topic_scores(score_log DESC, topic_id DESC);
+CREATE INDEX IF NOT EXISTS idx_topic_scores_category_hot ON topic_scores(category_id, score_log DESC, topic_id DESC);
+
+-- Граница уже учтённой активности (одна строка)
+CREATE TABLE IF NOT EXISTS topic_scores_state (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    counted_until TIMESTAMP
+);
+INSERT INTO topic_scores_state (id, counted_until) VALUES (1, NULL) ON CONFLICT (id) DO NOTHING;
+
+-- Просмотры без отметок времени: flush_views копирует сюда применённые приращения,
+-- refresh_topic_scores их забирает
+CREATE UNLOGGED TABLE IF NOT EXISTS topic_score_views (
+    topic_id INTEGER NOT NULL,
+    views INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Новые лайки за окно обновления
+CREATE INDEX IF NOT EXISTS idx_likes_created ON likes(created_at);
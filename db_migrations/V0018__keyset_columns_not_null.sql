@@ -0,0 +1,15 @@
+-- Столбцы ключей keyset-пагинации не должны быть NULL: сравнение кортежей
+-- с NULL ложно, и такие строки выпадали бы со всех страниц после первой
+UPDATE topics SET is_pinned = FALSE WHERE is_pinned IS NULL;
+UPDATE topics SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+UPDATE topics SET created_at = updated_at WHERE created_at IS NULL;
+ALTER TABLE topics ALTER COLUMN is_pinned SET DEFAULT FALSE;
+ALTER TABLE topics ALTER COLUMN is_pinned SET NOT NULL;
+ALTER TABLE topics ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE topics ALTER COLUMN updated_at SET NOT NULL;
+ALTER TABLE topics ALTER COLUMN created_at SET NOT NULL;
+
+-- Страницы постов темы идут по (created_at, id)
+UPDATE posts SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL;
+ALTER TABLE posts ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE posts ALTER COLUMN created_at SET NOT NULL;
@@ -0,0 +1,28 @@
+-- Отложенный режим счётчиков (POST_COUNTERS_MODE=deferred): запись, выставившая
+-- SET LOCAL forum.counters_mode = 'deferred', не обновляет строку category_stats,
+-- а кладёт приращение в counter_deltas; задача apply_counter_deltas сворачивает
+-- их пакетно вместе с остальными счётчиками
+CREATE OR REPLACE FUNCTION category_stats_bump(p_category_id INTEGER, p_topics INTEGER, p_posts INTEGER, p_activity TIMESTAMP)
+RETURNS VOID AS $$
+BEGIN
+    IF p_category_id IS NULL THEN
+        RETURN;
+    END IF;
+    IF current_setting('forum.counters_mode', true) = 'deferred' THEN
+        -- DO NOTHING не блокирует существующую строку
+        INSERT INTO category_stats (category_id) VALUES (p_category_id)
+        ON CONFLICT (category_id) DO NOTHING;
+        INSERT INTO counter_deltas (counter, entity_id, delta)
+        SELECT 'category_stats.topics_count', p_category_id, p_topics WHERE p_topics <> 0
+        UNION ALL
+        SELECT 'category_stats.total_posts', p_category_id, p_posts WHERE p_posts <> 0;
+        RETURN;
+    END IF;
+    INSERT INTO category_stats (category_id, topics_count, total_posts, last_activity_at)
+    VALUES (p_category_id, GREATEST(p_topics, 0), GREATEST(p_posts, 0), p_activity)
+    ON CONFLICT (category_id) DO UPDATE SET
+        topics_count = category_stats.topics_count + p_topics,
+        total_posts = category_stats.total_posts + p_posts,
+        last_activity_at = GREATEST(category_stats.last_activity_at, EXCLUDED.last_activity_at);
+END;
+$$ LANGUAGE plpgsql;
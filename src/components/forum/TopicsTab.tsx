@@ -23,6 +23,9 @@ const TopicsTab = ({ currentUserId, getRoleBadge }: TopicsTabProps) => {
   const [replyContent, setReplyContent] = useState('');
   const [uploadedImages, setUploadedImages] = useState<string[]>([]);
   const [likingPost, setLikingPost] = useState<number | null>(null);
+  const [topicsCursor, setTopicsCursor] = useState<string | null>(null);
+  const [postsCursor, setPostsCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     loadTopics();
@@ -30,8 +33,9 @@ const TopicsTab = ({ currentUserId, getRoleBadge }: TopicsTabProps) => {
 
   const loadTopics = async () => {
     try {
-      const data = await apiClient.getTopics();
-      setTopics(data);
+      const page = await apiClient.getTopics();
+      setTopics(page.items);
+      setTopicsCursor(page.nextCursor);
     } catch (error) {
       toast.error('Ошибка загрузки тем');
     } finally {
@@ -39,15 +43,48 @@ const TopicsTab = ({ currentUserId, getRoleBadge }: TopicsTabProps) => {
     }
   };
 
+  const loadMoreTopics = async () => {
+    if (!topicsCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await apiClient.getTopics(undefined, topicsCursor);
+      setTopics((current) => [...current, ...page.items]);
+      setTopicsCursor(page.nextCursor);
+    } catch (error) {
+      toast.error('Ошибка загрузки тем');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const loadTopicDetails = async (id: number) => {
     try {
-      const data = await apiClient.getTopic(id);
-      setSelectedTopic(data);
+      const page = await apiClient.getTopic(id);
+      setSelectedTopic(page.topic);
+      setPostsCursor(page.nextCursor);
     } catch (error) {
       toast.error('Ошибка загрузки темы');
     }
   };
 
+  const loadMorePosts = async () => {
+    if (!selectedTopic || !postsCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await apiClient.getTopic(selectedTopic.id, postsCursor);
+      setSelectedTopic((current) => current && {
+        ...current,
+        posts: [...(current.posts || []), ...(page.topic.posts || [])],
+        liked_post_ids: [...(current.liked_post_ids || []), ...(page.topic.liked_post_ids || [])],
+      });
+      setPostsCursor(page.nextCursor);
+    } catch (error) {
+      toast.error('Ошибка загрузки ответов');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleReply = async () => {
     if (!currentUserId || !selectedTopic) {
       toast.error('Войдите, чтобы ответить');
@@ -171,6 +208,14 @@ const TopicsTab = ({ currentUserId, getRoleBadge }: TopicsTabProps) => {
         ))}
       </div>
 
+      {topicsCursor && (
+        <div className="flex justify-center">
+          <Button variant="outline" onClick={loadMoreTopics} disabled={loadingMore}>
+            Загрузить ещё
+          </Button>
+        </div>
+      )}
+
       <Dialog open={!!selectedTopic} onOpenChange={() => setSelectedTopic(null)}>
         <DialogContent className="max-w-4xl max-h-[80vh] overflow-y-auto">
           <DialogHeader>
@@ -205,7 +250,7 @@ const TopicsTab = ({ currentUserId, getRoleBadge }: TopicsTabProps) => {
 
               {selectedTopic.posts && selectedTopic.posts.length > 0 && (
                 <div className="space-y-4">
-                  <h3 className="font-semibold text-lg">Ответы ({selectedTopic.posts.length})</h3>
+                  <h3 className="font-semibold text-lg">Ответы ({selectedTopic.replies_count})</h3>
                   {selectedTopic.posts.map((post: Post) => (
                     <Card key={post.id}>
                       <CardContent className="p-6">
@@ -242,6 +287,13 @@ const TopicsTab = ({ currentUserId, getRoleBadge }: TopicsTabProps) => {
                       </CardContent>
                     </Card>
                   ))}
+                  {postsCursor && (
+                    <div className="flex justify-center">
+                      <Button variant="outline" onClick={loadMorePosts} disabled={loadingMore}>
+                        Показать ещё ответы
+                      </Button>
+                    </div>
+                  )}
                 </div>
               )}
 
@@ -24,6 +24,7 @@ export interface Forum {
   gradient: string;
   topics_count: number;
   total_posts: number;
+  last_activity_at?: string | null;
 }
 
 export interface Topic {
@@ -42,6 +43,16 @@ export interface Topic {
   author_avatar?: string;
   author_role?: string;
   posts?: Post[];
+  liked_post_ids?: number[];
+  hot_score?: number;
+}
+
+export interface Attachment {
+  id: number;
+  file_url: string;
+  file_type?: string;
+  file_name?: string;
+  file_size?: number;
 }
 
 export interface Post {
@@ -55,24 +66,70 @@ export interface Post {
   author_name?: string;
   author_avatar?: string;
   author_role?: string;
+  attachments?: Attachment[];
+}
+
+// One keyset page; pass nextCursor back to get the following one
+export interface Page<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+export interface TopicPage {
+  topic: Topic;
+  // Cursor for the next page of topic.posts
+  nextCursor: string | null;
+}
+
+export interface TopicChanges {
+  posts: Post[];
+  likes: { id: number; likes_count: number }[];
+  cursor: string;
+  has_more: boolean;
 }
 
 class ApiClient {
-  private async request(url: string, options: RequestInit = {}) {
+  // Position of our last write; reads that may hit a replica send it back
+  private readAfter: string | null = null;
+
+  private async request(url: string, options: RequestInit = {}, readYourWrites = false) {
+    const { data } = await this.send(url, options, readYourWrites);
+    return data;
+  }
+
+  private async requestPage(url: string, readYourWrites = false) {
+    const { data, response } = await this.send(url, {}, readYourWrites);
+    return { data, nextCursor: response.headers.get('X-Next-Cursor') };
+  }
+
+  private async send(url: string, options: RequestInit, readYourWrites: boolean) {
+    const token = localStorage.getItem('forum_token');
     const response = await fetch(url, {
       ...options,
       headers: {
         'Content-Type': 'application/json',
+        ...(token ? { 'X-Auth-Token': token } : {}),
+        ...(readYourWrites && this.readAfter ? { 'X-Read-After': this.readAfter } : {}),
         ...options.headers,
       },
     });
 
+    const writePosition = response.headers.get('X-Read-After');
+    if (writePosition) {
+      this.readAfter = writePosition;
+    }
+
     if (!response.ok) {
       const error = await response.json();
+      if (response.status === 401 && token && error.error === 'Invalid or expired session') {
+        // Expired, revoked or issued before server-side sessions: sign in again
+        localStorage.removeItem('forum_token');
+        localStorage.removeItem('forum_user');
+      }
       throw new Error(error.error || 'Request failed');
     }
 
-    return response.json();
+    return { data: await response.json(), response };
   }
 
   async register(username: string, email: string, password: string) {
@@ -89,8 +146,15 @@ class ApiClient {
     });
   }
 
+  async logout() {
+    return this.request(API_URLS.auth, {
+      method: 'POST',
+      body: JSON.stringify({ action: 'logout' }),
+    });
+  }
+
   async getForums(): Promise<Forum[]> {
-    return this.request(API_URLS.forums);
+    return this.request(API_URLS.forums, {}, true);
   }
 
   async createForum(name: string, description: string, icon: string, gradient: string) {
@@ -100,13 +164,32 @@ class ApiClient {
     });
   }
 
-  async getTopics(categoryId?: number): Promise<Topic[]> {
-    const params = categoryId ? `?category_id=${categoryId}` : '';
-    return this.request(API_URLS.topics + params);
+  async getTopics(categoryId?: number, cursor?: string): Promise<Page<Topic>> {
+    const params = new URLSearchParams();
+    if (categoryId) params.set('category_id', String(categoryId));
+    if (cursor) params.set('cursor', cursor);
+    const query = params.toString();
+    const { data, nextCursor } = await this.requestPage(API_URLS.topics + (query ? `?${query}` : ''), true);
+    return { items: data, nextCursor };
   }
 
-  async getTopic(id: number): Promise<Topic> {
-    return this.request(`${API_URLS.topics}?id=${id}`);
+  async getHotTopics(categoryId?: number, cursor?: string): Promise<Page<Topic>> {
+    const category = categoryId ? `&category_id=${categoryId}` : '';
+    const page = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+    const { data, nextCursor } = await this.requestPage(`${API_URLS.topics}?sort=hot${category}${page}`, true);
+    return { items: data, nextCursor };
+  }
+
+  // The session token identifies the viewer for liked_post_ids
+  async getTopic(id: number, cursor?: string): Promise<TopicPage> {
+    const page = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+    const { data, nextCursor } = await this.requestPage(`${API_URLS.topics}?id=${id}${page}`, true);
+    return { topic: data, nextCursor };
+  }
+
+  async getTopicChanges(id: number, since: string, waitSeconds = 0): Promise<TopicChanges> {
+    const wait = waitSeconds > 0 ? `&wait=${waitSeconds}` : '';
+    return this.request(`${API_URLS.topics}?id=${id}&since=${encodeURIComponent(since)}${wait}`);
   }
 
   async createTopic(userId: number, categoryId: number, title: string, content: string) {
@@ -123,6 +206,10 @@ class ApiClient {
     });
   }
 
+  async getLikedPosts(userId: number, topicId: number): Promise<{ liked: number[] }> {
+    return this.request(`${API_URLS.likes}?user_id=${userId}&topic_id=${topicId}`);
+  }
+
   async toggleLike(userId: number, postId: number) {
     return this.request(API_URLS.likes, {
       method: 'POST',
@@ -0,0 +1,132 @@
+'''
+Business: Bulk export/import of forum data (users, categories, topics, posts, likes, attachments) via COPY
+Args: export|import DIR, --dsn (default DATABASE_URL), --tables subset, --gzip on export, --chunk-mb/--defer-search on import
+Returns: one CSV per table in DIR (export) or a loaded database (import), with rows/s per table
+'''
+import argparse
+import gzip
+import os
+import sys
+import time
+from typing import Any, BinaryIO, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from shared import bulk
+
+
+def connect(dsn: str) -> Any:
+    import psycopg2
+    import psycopg2.extras
+    return psycopg2.connect(dsn, cursor_factory=psycopg2.extras.RealDictCursor)
+
+
+def data_file(directory: str, table: str) -> str:
+    for name in (table + '.csv', table + '.csv.gz'):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    return ''
+
+
+def open_data(path: str, mode: str) -> BinaryIO:
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+def report(result: bulk.TableResult) -> None:
+    print('%-18s %12d rows %9.1fs %12.0f rows/s' % (result.table, result.rows, result.seconds, result.rows_per_second))
+
+
+def export_data(args: argparse.Namespace) -> None:
+    os.makedirs(args.directory, exist_ok=True)
+    conn = connect(args.dsn)
+    # One snapshot for all tables, so the files reference each other consistently
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    cur = conn.cursor()
+    try:
+        for table in args.tables:
+            path = os.path.join(args.directory, table + ('.csv.gz' if args.gzip else '.csv'))
+            started = time.perf_counter()
+            with open_data(path, 'wb') as out:
+                rows = bulk.export_table(cur, table, out)
+            report(bulk.TableResult(table, rows, time.perf_counter() - started))
+    finally:
+        cur.close()
+        conn.rollback()
+        conn.close()
+
+
+def import_data(args: argparse.Namespace) -> None:
+    files = {table: data_file(args.directory, table) for table in args.tables}
+    tables = [table for table in args.tables if files[table]]
+    if not tables:
+        raise SystemExit('no <table>.csv or <table>.csv.gz files in %s' % args.directory)
+
+    conn = connect(args.dsn)
+    cur = conn.cursor()
+    started_all = time.perf_counter()
+    try:
+        cur.execute('SET LOCAL synchronous_commit = off')
+        cur.execute('SET LOCAL maintenance_work_mem = %s', (args.maintenance_work_mem,))
+        bulk.ensure_empty(cur, tables)
+        deferred = bulk.defer_maintenance(cur, tables, args.defer_search)
+
+        def progress(table: str, rows: int) -> None:
+            elapsed = time.perf_counter() - started
+            sys.stderr.write('\r%-18s %12d rows %12.0f rows/s' % (table, rows, rows / elapsed if elapsed else 0))
+            sys.stderr.flush()
+
+        for table in tables:
+            started = time.perf_counter()
+            with open_data(files[table], 'rb') as stream:
+                rows = bulk.import_table(cur, table, stream, args.chunk_mb * 1024 * 1024, progress)
+            sys.stderr.write('\r')
+            report(bulk.TableResult(table, rows, time.perf_counter() - started))
+
+        timings = bulk.finish_import(cur, tables)
+        timings.update(bulk.restore_maintenance(cur, deferred))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    started = time.perf_counter()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        for table in tables:
+            cur.execute('VACUUM ANALYZE ' + table)
+    conn.close()
+    timings['vacuum_analyze'] = time.perf_counter() - started
+
+    print('deferred work: %s' % ', '.join('%s %.1fs' % item for item in timings.items()))
+    if args.defer_search:
+        print('search vectors are empty: the backfill_search_vectors maintenance job fills them')
+    print('total %.1fs' % (time.perf_counter() - started_all))
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('directory')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--tables', nargs='*', choices=list(bulk.TABLES), default=list(bulk.TABLES))
+    parser.add_argument('--gzip', action='store_true', help='export to <table>.csv.gz')
+    parser.add_argument('--chunk-mb', type=int, default=bulk.CHUNK_BYTES // (1024 * 1024))
+    parser.add_argument('--defer-search', action='store_true', help='skip search vectors during import (backfilled later)')
+    parser.add_argument('--maintenance-work-mem', default='512MB', help='for the index rebuilds after import')
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error('--dsn or DATABASE_URL is required')
+    # Keep parents before children whatever order --tables was given in
+    args.tables = [table for table in bulk.TABLES if table in args.tables]
+
+    if args.command == 'export':
+        export_data(args)
+    else:
+        import_data(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,115 @@
+'''
+Business: Copy backend/shared into every cloud function directory, since each function is deployed on its own
+Args: --check to only report stale or missing copies (exit status 1), --backend DIR (default ../backend)
+Returns: the vendored modules per function; the api router also gets a copy of every route it dispatches to
+'''
+import argparse
+import os
+import re
+import sys
+from typing import Dict, List, Set
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+SHARED_IMPORT = re.compile(r'^\s*from shared import (.+)$', re.MULTILINE)
+ROUTE_NAME = re.compile(r"^    '(\w+)': Route\(", re.MULTILINE)
+
+
+def shared_imports(path: str) -> Set[str]:
+    with open(path, encoding='utf-8') as source:
+        text = source.read()
+    return {name.strip() for names in SHARED_IMPORT.findall(text) for name in names.split(',')}
+
+
+def closure(backend: str, names: Set[str]) -> Set[str]:
+    '''The named shared modules and everything they import from shared'''
+    found: Set[str] = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        found.add(name)
+        pending += shared_imports(os.path.join(backend, 'shared', name + '.py'))
+    return found
+
+
+def functions(backend: str) -> List[str]:
+    return sorted(
+        name for name in os.listdir(backend)
+        if name != 'shared' and os.path.isfile(os.path.join(backend, name, 'index.py'))
+    )
+
+
+def routes(backend: str) -> List[str]:
+    with open(os.path.join(backend, 'shared', 'http.py'), encoding='utf-8') as source:
+        names = ROUTE_NAME.findall(source.read())
+    return [name for name in names if os.path.isfile(os.path.join(backend, name, 'index.py'))]
+
+
+def plan(backend: str) -> Dict[str, str]:
+    '''Vendored path -> source path, for every file that should exist'''
+    copies: Dict[str, str] = {}
+    for function in functions(backend):
+        entry_points = [os.path.join(backend, function, 'index.py')]
+        if function == 'api':
+            for route in routes(backend):
+                source = os.path.join(backend, route, 'index.py')
+                copies[os.path.join(backend, 'api', 'routes', route, 'index.py')] = source
+                entry_points.append(source)
+        modules = closure(backend, set().union(*(shared_imports(path) for path in entry_points)))
+        for module in sorted(modules) + ['__init__']:
+            copies[os.path.join(backend, function, 'shared', module + '.py')] = \
+                os.path.join(backend, 'shared', module + '.py')
+    return copies
+
+
+def vendored_files(backend: str) -> Set[str]:
+    '''Python files currently inside vendored directories'''
+    found: Set[str] = set()
+    for function in functions(backend):
+        for root in (os.path.join(backend, function, 'shared'), os.path.join(backend, function, 'routes')):
+            for directory, _, files in os.walk(root):
+                found.update(os.path.join(directory, name) for name in files if name.endswith('.py'))
+    return found
+
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as source:
+        return source.read()
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--backend', default=BACKEND_DIR)
+    args = parser.parse_args(argv)
+    backend = os.path.normpath(args.backend)
+
+    copies = plan(backend)
+    stale = [path for path, source in sorted(copies.items()) if not os.path.exists(path) or read(path) != read(source)]
+    extra = sorted(vendored_files(backend) - set(copies))
+
+    if args.check:
+        for path in stale:
+            print('stale   %s' % os.path.relpath(path, backend))
+        for path in extra:
+            print('extra   %s' % os.path.relpath(path, backend))
+        if stale or extra:
+            print('run tools/vendor_shared.py to refresh the vendored copies')
+            return 1
+        return 0
+
+    for path in stale:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as target:
+            target.write(read(copies[path]))
+        print('copied  %s' % os.path.relpath(path, backend))
+    for path in extra:
+        os.remove(path)
+        print('removed %s' % os.path.relpath(path, backend))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))